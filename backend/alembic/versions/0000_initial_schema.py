@@ -0,0 +1,54 @@
+"""sessions and messages
+
+Revision ID: 0000
+Revises:
+Create Date: 2026-10-19 08:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0000'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # databases set up before migrations existed already have both tables
+    existing = sa.inspect(op.get_bind()).get_table_names()
+    if 'sessions' not in existing:
+        op.create_table(
+            'sessions',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('initial_prompt', sa.String(), nullable=True),
+            sa.Column('status', sa.String(), nullable=True),
+            sa.Column('provider', sa.String(), nullable=True),
+            sa.Column('created_at', sa.DateTime(timezone=True),
+                      server_default=sa.func.now(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index(op.f('ix_sessions_id'), 'sessions', ['id'], unique=False)
+    if 'messages' not in existing:
+        op.create_table(
+            'messages',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('session_id', sa.Integer(), nullable=True),
+            sa.Column('role', sa.String(), nullable=True),
+            sa.Column('content', sa.JSON(), nullable=True),
+            sa.Column('base64_image', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(timezone=True),
+                      server_default=sa.func.now(), nullable=True),
+            sa.ForeignKeyConstraint(['session_id'], ['sessions.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index(op.f('ix_messages_id'), 'messages', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_messages_id'), table_name='messages')
+    op.drop_table('messages')
+    op.drop_index(op.f('ix_sessions_id'), table_name='sessions')
+    op.drop_table('sessions')
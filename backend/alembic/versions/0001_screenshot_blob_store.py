@@ -0,0 +1,76 @@
+"""move screenshots to the blob store
+
+Revision ID: 0001
+Revises: 0000
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.service.blob_store import blob_store
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = '0000'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 100
+
+messages = sa.table(
+    'messages',
+    sa.column('id', sa.Integer),
+    sa.column('base64_image', sa.Text),
+    sa.column('image_hash', sa.String),
+    sa.column('image_content_type', sa.String),
+)
+
+
+def upgrade() -> None:
+    op.add_column('messages', sa.Column(
+        'image_hash', sa.String(length=64), nullable=True))
+    op.add_column('messages', sa.Column(
+        'image_content_type', sa.String(), nullable=True))
+    op.create_index(op.f('ix_messages_image_hash'),
+                    'messages', ['image_hash'], unique=False)
+
+    # Backfill in batches so large tables never load every screenshot at once
+    conn = op.get_bind()
+    while True:
+        rows = conn.execute(
+            sa.select(messages.c.id, messages.c.base64_image)
+            .where(messages.c.base64_image.is_not(None))
+            .order_by(messages.c.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        for row in rows:
+            image_ref = blob_store.put_base64(row.base64_image)
+            conn.execute(
+                sa.update(messages)
+                .where(messages.c.id == row.id)
+                .values(image_hash=image_ref.hash,
+                        image_content_type=image_ref.content_type,
+                        base64_image=None)
+            )
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    rows = conn.execute(
+        sa.select(messages.c.id, messages.c.image_hash)
+        .where(messages.c.image_hash.is_not(None))
+    ).fetchall()
+    for row in rows:
+        conn.execute(
+            sa.update(messages)
+            .where(messages.c.id == row.id)
+            .values(base64_image=blob_store.get_base64(row.image_hash))
+        )
+
+    op.drop_index(op.f('ix_messages_image_hash'), table_name='messages')
+    op.drop_column('messages', 'image_content_type')
+    op.drop_column('messages', 'image_hash')
@@ -0,0 +1,35 @@
+"""registry of agent workers
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'workers',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('hostname', sa.String(), nullable=False),
+        sa.Column('pid', sa.Integer(), nullable=False),
+        sa.Column('display_capacity', sa.Integer(), nullable=False),
+        sa.Column('running', sa.Integer(), nullable=False),
+        sa.Column('started_at', sa.DateTime(timezone=True),
+                  server_default=sa.func.now(), nullable=True),
+        sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('workers')
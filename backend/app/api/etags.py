@@ -0,0 +1,69 @@
+from fastapi import Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncConnection
+import hashlib
+
+from app.db import crud
+from app.service import session_events
+from app.service.session_notifier import SessionState, session_notifier
+
+# clients may cache poll responses but must revalidate them every time
+POLL_CACHE_CONTROL = "no-cache"
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    # If-None-Match uses weak comparison, so W/ prefixes are ignored
+    candidates = {tag.strip().removeprefix("W/")
+                  for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in candidates or "*" in candidates
+
+
+async def read_session_state(conn: AsyncConnection, session_id: int) -> SessionState | None:
+    """Version of a session straight from the database"""
+    poll_state = await crud.get_session_poll_state(conn=conn, session_id=session_id)
+    if poll_state is None:
+        return None
+    return SessionState(last_message_id=poll_state["last_message_id"], status=poll_state["status"])
+
+
+async def get_session_state(conn: AsyncConnection, session_id: int) -> SessionState | None:
+    """Version of a session from the in-memory notifier, seeded with one cheap query if unknown"""
+    if not session_events.events_reach_this_process():
+        # nothing would ever update the notifier, so a cached version goes stale
+        return await read_session_state(conn, session_id)
+    state = session_notifier.get(session_id)
+    if state is None:
+        state = await read_session_state(conn, session_id)
+        if state is None:
+            return None
+        state = session_notifier.seed(session_id, state.last_message_id, state.status)
+    return state
+
+
+def session_etag(request: Request, session_id: int, state: SessionState) -> str:
+    # the same session version can back different pages, so the query is part of the tag
+    query = "&".join(sorted(f"{key}={value}" for key,
+                     value in request.query_params.multi_items()))
+    version = f"{request.url.path}?{query}|{state.last_message_id}|{state.status}"
+    digest = hashlib.sha1(version.encode()).hexdigest()[:16]
+    return f'W/"{session_id}-{state.last_message_id or 0}-{digest}"'
+
+
+async def check_session_not_modified(
+    conn: AsyncConnection, session_id: int, request: Request, response: Response
+) -> Response | None:
+    """
+    Returns a 304 response if the client already has the current version of the
+    session, otherwise sets the ETag on `response` and returns None.
+    """
+    state = await get_session_state(conn, session_id)
+    if state is None:
+        return None
+    etag = session_etag(request, session_id, state)
+    headers = {"ETag": etag, "Cache-Control": POLL_CACHE_CONTROL}
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,39 @@
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from fastapi.responses import FileResponse
+import asyncio
+import re
+
+from app.api.etags import etag_matches
+from app.service.blob_store import blob_store, sniff_content_type
+
+router = APIRouter()
+
+# blobs are content addressed, so a given URL never changes
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+IMAGE_HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+@router.get("/{image_hash}")
+async def get_image(image_hash: str, request: Request):
+    """Serve a stored screenshot as raw bytes with long-lived caching headers"""
+    if not IMAGE_HASH_PATTERN.match(image_hash):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail="Image not found")
+
+    etag = f'"{image_hash}"'
+    headers = {"ETag": etag, "Cache-Control": IMAGE_CACHE_CONTROL}
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    path = blob_store.backend.local_path(image_hash)
+    if path is not None:
+        with path.open("rb") as f:
+            content_type = sniff_content_type(f.read(16))
+        # FileResponse streams the file from disk in chunks
+        return FileResponse(path, media_type=content_type, headers=headers)
+
+    data = await asyncio.to_thread(blob_store.get, image_hash)
+    if data is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail="Image not found")
+    return Response(content=data, media_type=sniff_content_type(data), headers=headers)
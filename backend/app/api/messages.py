@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, status, HTTPException
+from fastapi import APIRouter, Depends, Query, Request, Response, status, HTTPException
 from app.api.schemas import MessageCreate, Message
 from app.db.database import get_db_connection
 from app.db import crud
+from app.api.etags import check_session_not_modified
+from app.service.session_events import publish_message
 from sqlalchemy.ext.asyncio import AsyncConnection
-from typing import List
+from typing import List, Optional
 router = APIRouter()
 
 # create message
@@ -18,14 +20,24 @@ async def create_message(
     if not new_message:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                             detail="Failed to create the message")
+    await publish_message(conn, message.session_id, new_message)
     return new_message
 
 
 @router.get("/session/{session_id}", response_model=List[Message])
 async def get_messages_by_session_id(
     session_id: int,
+    request: Request,
+    response: Response,
+    after_id: Optional[int] = None,
+    before_id: Optional[int] = None,
+    limit: int = Query(crud.MESSAGE_PAGE_SIZE, ge=1,
+                       le=crud.MAX_MESSAGE_PAGE_SIZE),
     conn: AsyncConnection = Depends(get_db_connection)
 ):
-    messages = await crud.get_messages_by_session_id(conn=conn, session_id=session_id)
+    if not_modified := await check_session_not_modified(conn, session_id, request, response):
+        return not_modified
+    messages = await crud.get_messages_by_session_id(
+        conn=conn, session_id=session_id, after_id=after_id, before_id=before_id, limit=limit)
     # Return empty array instead of 404 for sessions with no messages yet
     return messages or []
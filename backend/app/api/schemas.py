@@ -1,6 +1,6 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, computed_field
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 
 class SessionCreate(BaseModel):
@@ -13,6 +13,8 @@ class SessionCreate(BaseModel):
     thinking_budget: Optional[int] = None
     only_n_most_recent_images: Optional[int] = None
     tool_version: Optional[str] = None
+    priority: int = Field(
+        0, description="Higher priority sessions are started first when workers are busy")
 
 
 class Session(BaseModel):
@@ -37,5 +39,30 @@ class Message(BaseModel):
     session_id: int
     role: str
     content: dict
+    # only set on rows written before screenshots moved to the blob store
     base64_image: Optional[str] = None
+    image_hash: Optional[str] = None
     created_at: datetime
+
+    @computed_field
+    @property
+    def image_url(self) -> Optional[str]:
+        return f"/images/{self.image_hash}" if self.image_hash else None
+
+
+class SessionUpdates(BaseModel):
+    session_id: int
+    status: Optional[str] = None
+    messages: List[Message]
+    last_message_id: Optional[int] = None
+    timed_out: bool = False
+
+
+class SessionSnapshot(BaseModel):
+    session_id: int
+    status: str
+    messages: List[Message]
+    message_count: int
+    last_message_id: Optional[int] = None
+    next_poll_ms: Optional[int] = Field(
+        None, description="Suggested delay before the next poll; null once the session has finished")
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+from fastapi import WebSocket
+
+from app.db import crud
+from app.db.database import db_connection
+from app.service.session_events import message_event_data
+from app.service.stream_manager import Subscriber
+from app.service.thumbnails import get_thumbnail
+
+logger = logging.getLogger(__name__)
+
+SESSION_NOT_FOUND_CLOSE_CODE = 4404
+
+
+class SessionChannel:
+    """
+    Pushes one session to one WebSocket viewer. The database is the source of truth:
+    the channel replays everything after the client's cursor from it, then forwards
+    live stream events, and goes back to the database whenever it falls behind.
+
+    Text frames are JSON events:
+        {"type": "status", "status": ...}
+        {"type": "message", "message": {...}}
+        {"type": "screenshot", "message_id": ..., "image_hash": ..., "image_url": ...}
+
+    With thumbnails enabled each screenshot event is followed by a binary frame
+    holding the 64 character image hash followed by a JPEG thumbnail.
+    """
+
+    def __init__(self, websocket: WebSocket, session_id: int, after_id: int | None, thumbnails: bool):
+        self.websocket = websocket
+        self.session_id = session_id
+        # id of the newest message the client has
+        self.cursor = after_id
+        self.thumbnails = thumbnails
+        self.status: str | None = None
+
+    async def send_status(self, status: str):
+        if status == self.status:
+            return
+        self.status = status
+        await self.websocket.send_json({"type": "status", "status": status})
+
+    async def send_message(self, message: dict):
+        if self.cursor is not None and message["id"] <= self.cursor:
+            # already replayed from the database
+            return
+        await self.websocket.send_json({"type": "message", "message": message})
+        self.cursor = message["id"]
+
+        if image_hash := message.get("image_hash"):
+            await self.websocket.send_json({
+                "type": "screenshot",
+                "message_id": message["id"],
+                "image_hash": image_hash,
+                "image_url": message.get("image_url"),
+            })
+            if self.thumbnails:
+                thumbnail = await asyncio.to_thread(get_thumbnail, image_hash)
+                if thumbnail is not None:
+                    await self.websocket.send_bytes(image_hash.encode() + thumbnail)
+
+    async def resync(self) -> bool:
+        """Send the current status and every message after the cursor. False if the session is gone."""
+        async with db_connection() as conn:
+            poll_state = await crud.get_session_poll_state(conn=conn, session_id=self.session_id)
+        if poll_state is None:
+            return False
+
+        while True:
+            # a page at a time, without holding a connection while the client reads
+            async with db_connection() as conn:
+                page = await crud.get_messages_by_session_id(
+                    conn=conn, session_id=self.session_id, after_id=self.cursor)
+            for message in page:
+                await self.send_message(message_event_data(message))
+            if len(page) < crud.MESSAGE_PAGE_SIZE:
+                break
+        await self.send_status(poll_state["status"])
+        return True
+
+    async def pump(self, subscriber: Subscriber):
+        """Forward live events until the session's stream ends."""
+        while (event := await subscriber.get()) is not None:
+            if event.type == "message":
+                await self.send_message(event.data)
+            elif event.type == "status":
+                await self.send_status(event.data["status"])
+            elif event.type == "lagged":
+                await self.resync()
+
+    async def listen(self):
+        """Returns once the client goes away."""
+        while True:
+            message = await self.websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
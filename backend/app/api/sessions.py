@@ -1,31 +1,54 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Request
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status, Request, Response, WebSocket
 from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncConnection
-from typing import List
+from typing import List, Optional
 
 # Use the planned schema path
-from app.api.schemas import SessionCreate, Session
-from app.db import crud
+from app.api.schemas import SessionCreate, Session, Message, SessionUpdates, SessionSnapshot
+from app.db import crud, jobs
+from app.api.etags import check_session_not_modified, read_session_state
 # Use our safe dependency function
-from app.db.database import get_db_connection
+from app.db.database import get_db_connection, db_connection
+from app.api.session_channel import SessionChannel, SESSION_NOT_FOUND_CLOSE_CODE
+import asyncio
 import logging
-# Removed stream_manager import - using polling instead
-from app.service.agent_service import run_agent_session
+from app.service import session_events
+from app.service.process_pool import session_runner
+from app.service.session_notifier import DROPPED, SessionState, session_notifier
+from app.service.stream_manager import StreamEvent, stream_manager, stream_generator, parse_last_event_id
 
 router = APIRouter()
 
 logger = logging.getLogger(__name__)
 
+LONG_POLL_TIMEOUT = 25.0
+MAX_LONG_POLL_TIMEOUT = 60.0
+# how often a long poll re-reads the database when session events can't reach this process
+DATABASE_POLL_INTERVAL = 1.0
+
+# suggested snapshot poll intervals, in milliseconds
+POLL_INTERVAL_BACKLOG_MS = 250
+POLL_INTERVAL_BY_STATUS_MS = {"queued": 2000, "running": 1000}
+FINISHED_STATUSES = ("completed", "error")
+
+
+def suggest_poll_interval(status: str, has_more: bool) -> Optional[int]:
+    if status in FINISHED_STATUSES and not has_more:
+        return None
+    if has_more:
+        return POLL_INTERVAL_BACKLOG_MS
+    return POLL_INTERVAL_BY_STATUS_MS.get(status, 1000)
+
 
 @router.post("/", response_model=Session, status_code=status.HTTP_201_CREATED)
 async def create_new_session(
     session_in: SessionCreate,
-    background_tasks: BackgroundTasks,
     # Use our dependency for safe connection handling
     conn: AsyncConnection = Depends(get_db_connection)
 ):
 
-    new_session = await crud.create_session(conn=conn, session_data=session_in)
+    # the session and its job are committed together
+    new_session = await crud.create_session(conn=conn, session_data=session_in, commit=False)
     if not new_session:
         # Use HTTPException for unexpected server errors
         raise HTTPException(
@@ -33,23 +56,33 @@ async def create_new_session(
             detail="Failed to create the task."
         )
 
-    # Start the background task to run the agent session
-    background_tasks.add_task(
-        run_agent_session,
+    # Queue the agent run; a worker from the pool picks it up
+    await jobs.enqueue_session(
+        conn,
         session_id=new_session["id"],
-        initial_prompt=session_in.initial_prompt,
         provider=session_in.provider,
-        model=session_in.model,
-        system_prompt_suffix=session_in.system_prompt_suffix or "",
-        max_tokens=session_in.max_tokens,
-        thinking_budget=session_in.thinking_budget,
-        only_n_most_recent_images=session_in.only_n_most_recent_images or 3
+        payload={
+            "initial_prompt": session_in.initial_prompt,
+            "model": session_in.model,
+            "system_prompt_suffix": session_in.system_prompt_suffix or "",
+            "max_tokens": session_in.max_tokens,
+            "thinking_budget": session_in.thinking_budget,
+            "only_n_most_recent_images": session_in.only_n_most_recent_images or 3,
+        },
+        priority=session_in.priority,
     )
+    session_runner.wake()
 
     # Return the data directly. FastAPI will serialize it.
     return new_session
 
 
+@router.get("/streams/metrics")
+async def get_stream_metrics():
+    """Subscriber counts, queue depths and dropped/coalesced events of the live streams"""
+    return stream_manager.metrics()
+
+
 @router.get("/", response_model=List[Session])
 async def read_sessions(
     skip: int = 0,
@@ -73,22 +106,35 @@ async def read_session(
     return db_session
 
 
-@router.get("/{session_id}/messages")
+@router.get("/{session_id}/messages", response_model=List[Message])
 async def get_session_messages(
     session_id: int,
+    request: Request,
+    response: Response,
+    after_id: Optional[int] = None,
+    before_id: Optional[int] = None,
+    limit: int = Query(crud.MESSAGE_PAGE_SIZE, ge=1,
+                       le=crud.MAX_MESSAGE_PAGE_SIZE),
     conn: AsyncConnection = Depends(get_db_connection)
 ):
-    """Get all messages for a session - used for polling-based updates"""
-    messages = await crud.get_messages_by_session_id(conn=conn, session_id=session_id)
+    """Get a page of messages for a session, oldest first - pass the last seen id as after_id to poll for new ones"""
+    if not_modified := await check_session_not_modified(conn, session_id, request, response):
+        return not_modified
+    messages = await crud.get_messages_by_session_id(
+        conn=conn, session_id=session_id, after_id=after_id, before_id=before_id, limit=limit)
     return messages
 
 
 @router.get("/{session_id}/status")
 async def get_session_status(
     session_id: int,
+    request: Request,
+    response: Response,
     conn: AsyncConnection = Depends(get_db_connection)
 ):
     """Get session status - used for polling-based updates"""
+    if not_modified := await check_session_not_modified(conn, session_id, request, response):
+        return not_modified
     session = await crud.get_session_by_id(conn=conn, session_id=session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
@@ -97,3 +143,167 @@ async def get_session_status(
         "status": session["status"],
         "created_at": session["created_at"]
     }
+
+
+async def _poll_database(
+    session_id: int, after_id: Optional[int], last_status: Optional[str], timeout: float
+) -> Optional[SessionState]:
+    """Long poll by re-reading the session every DATABASE_POLL_INTERVAL. None on timeout."""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        async with db_connection() as conn:
+            state = await read_session_state(conn, session_id)
+        if state is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+        if state.is_newer_than(after_id, last_status):
+            return state
+        remaining = deadline - asyncio.get_running_loop().time()
+        if remaining <= 0:
+            return None
+        await asyncio.sleep(min(DATABASE_POLL_INTERVAL, remaining))
+
+
+@router.get("/{session_id}/updates", response_model=SessionUpdates)
+async def wait_for_session_updates(
+    session_id: int,
+    after_id: Optional[int] = None,
+    last_status: Optional[str] = Query(None, alias="status"),
+    timeout: float = Query(LONG_POLL_TIMEOUT, ge=0, le=MAX_LONG_POLL_TIMEOUT),
+):
+    """Long-poll for updates - parks until there are messages after after_id or the status differs from status, or the timeout passes"""
+    # No connection is held while parked; the database is only read to seed an
+    # unknown session and to load the new messages once something changed
+    if not session_events.events_reach_this_process():
+        state = await _poll_database(session_id, after_id, last_status, timeout)
+    else:
+        deadline = asyncio.get_running_loop().time() + timeout
+        state = DROPPED
+        # seeded again at once if the notifier drops the session while we wait
+        while state is DROPPED:
+            if session_notifier.get(session_id) is None:
+                async with db_connection() as conn:
+                    poll_state = await crud.get_session_poll_state(conn=conn, session_id=session_id)
+                if poll_state is None:
+                    raise HTTPException(status_code=404, detail="Session not found")
+                session_notifier.seed(
+                    session_id, poll_state["last_message_id"], poll_state["status"])
+
+            remaining = max(deadline - asyncio.get_running_loop().time(), 0)
+            state = await session_notifier.wait(session_id, after_id, last_status, remaining)
+    if state is None:
+        return SessionUpdates(session_id=session_id, status=last_status, messages=[],
+                              last_message_id=after_id, timed_out=True)
+
+    new_messages = []
+    if state.last_message_id is not None and (after_id is None or state.last_message_id > after_id):
+        async with db_connection() as conn:
+            new_messages = await crud.get_messages_by_session_id(
+                conn=conn, session_id=session_id, after_id=after_id)
+    return SessionUpdates(
+        session_id=session_id,
+        status=state.status,
+        messages=new_messages,
+        last_message_id=new_messages[-1]["id"] if new_messages else after_id,
+    )
+
+
+@router.get("/{session_id}/snapshot", response_model=SessionSnapshot)
+async def get_session_snapshot(
+    session_id: int,
+    request: Request,
+    response: Response,
+    after_id: Optional[int] = None,
+    limit: int = Query(crud.MESSAGE_PAGE_SIZE, ge=1,
+                       le=crud.MAX_MESSAGE_PAGE_SIZE),
+    conn: AsyncConnection = Depends(get_db_connection)
+):
+    """Status, messages after after_id and a suggested poll interval in a single round trip"""
+    if not_modified := await check_session_not_modified(conn, session_id, request, response):
+        return not_modified
+    snapshot = await crud.get_session_snapshot(
+        conn=conn, session_id=session_id, after_id=after_id, limit=limit)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    new_messages = snapshot["messages"]
+    has_more = len(new_messages) == limit
+    return SessionSnapshot(
+        session_id=session_id,
+        status=snapshot["status"],
+        messages=new_messages,
+        message_count=snapshot["message_count"],
+        last_message_id=new_messages[-1]["id"] if new_messages else after_id,
+        next_poll_ms=suggest_poll_interval(snapshot["status"], has_more),
+    )
+
+
+async def _replay_finished_session(session_id: int, status: str):
+    """A finished session has no live stream: its messages from the database, its final status, then the end."""
+    after_id = None
+    while True:
+        async with db_connection() as conn:
+            page = await crud.get_messages_by_session_id(conn=conn, session_id=session_id, after_id=after_id)
+        if not page:
+            break
+        for message in page:
+            yield StreamEvent(id=None, type="message", data=session_events.message_event_data(message)).to_sse()
+        after_id = page[-1]["id"]
+    yield StreamEvent(id=None, type="status", data={"status": status}).to_sse()
+
+
+@router.get("/{session_id}/stream")
+async def stream_session_events(
+    session_id: int,
+    request: Request,
+    last_event_id: Optional[str] = Header(None),
+):
+    """Server-sent events for a session - message and status events as they are persisted, replayed from Last-Event-ID on reconnect"""
+    async with db_connection() as conn:
+        poll_state = await crud.get_session_poll_state(conn=conn, session_id=session_id)
+    if poll_state is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if poll_state["status"] in FINISHED_STATUSES:
+        events = _replay_finished_session(session_id, poll_state["status"])
+    else:
+        stream_manager.create_stream(session_id)
+        events = stream_generator(session_id, request, parse_last_event_id(last_event_id))
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        # keep reverse proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/{session_id}/ws")
+async def session_socket(
+    websocket: WebSocket,
+    session_id: int,
+    after_id: Optional[int] = None,
+    thumbnails: bool = False,
+):
+    """Live session channel - replays messages after after_id, then pushes message, status and screenshot events"""
+    await websocket.accept()
+    # subscribe before reading the database so nothing committed in between is missed
+    subscriber = stream_manager.subscribe(session_id)
+    channel = SessionChannel(websocket, session_id, after_id, thumbnails)
+    try:
+        if not await channel.resync():
+            await websocket.close(code=SESSION_NOT_FOUND_CLOSE_CODE, reason="Session not found")
+            return
+        if channel.status in FINISHED_STATUSES:
+            await websocket.close()
+            return
+
+        pump = asyncio.create_task(channel.pump(subscriber))
+        listen = asyncio.create_task(channel.listen())
+        done, pending = await asyncio.wait({pump, listen}, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        if pump in done and pump.exception() is None:
+            # the session finished and its stream has ended
+            await websocket.close()
+        elif pump in done:
+            logger.info("Session %s socket closed: %s", session_id, pump.exception())
+    finally:
+        stream_manager.unsubscribe(session_id, subscriber)
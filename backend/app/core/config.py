@@ -15,6 +15,84 @@ class Settings(BaseSettings):
     # API Provider selection
     API_PROVIDER: str = "anthropic"  # anthropic, bedrock, vertex
 
+    # Screenshot blob storage
+    BLOB_STORE_BACKEND: str = "local"
+    BLOB_STORE_PATH: str = "./data/blobs"
+    # BLOB_STORE_PATH is storage the API and every standalone worker mount (e.g. NFS);
+    # JOB_EXECUTION_MODE=external refuses to start without it
+    BLOB_STORE_SHARED: bool = False
+
+    # Live session event streams
+    STREAM_QUEUE_SIZE: int = 256  # per subscriber, before slow consumers lose events
+    STREAM_REPLAY_SIZE: int = 512  # recent events kept per session for reconnects
+    STREAM_SLOW_CONSUMER_POLICY: str = "coalesce"  # coalesce, drop_oldest
+    STREAM_KEEPALIVE_SECONDS: float = 15.0
+    # how session events reach the other workers: auto (postgres LISTEN/NOTIFY when
+    # DATABASE_URL is postgres, otherwise in-process), postgres, local
+    EVENT_RELAY_BACKEND: str = "auto"
+
+    # Database connection pool (sizes are ignored for SQLite)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # checkouts that wait at least this long are counted as slow in the pool metrics
+    DB_SLOW_CHECKOUT_SECONDS: float = 0.1
+
+    # Session job queue and the worker pool that runs agent sessions
+    JOB_WORKERS: int = 4  # sessions this process runs at once
+    # e.g. {"anthropic": 2}; providers not listed are only bounded by JOB_WORKERS
+    JOB_PROVIDER_CONCURRENCY: dict[str, int] = {}
+    JOB_VISIBILITY_TIMEOUT_SECONDS: float = 60.0  # lease, renewed while the run is alive
+    JOB_POLL_INTERVAL_SECONDS: float = 1.0
+    JOB_MAX_ATTEMPTS: int = 2
+    # inline: sessions share the API's event loop; process: a supervisor runs
+    # JOB_PROCESSES worker processes, each running up to JOB_WORKERS sessions;
+    # external: standalone workers run them, the API only queues
+    JOB_EXECUTION_MODE: str = "inline"
+    JOB_PROCESSES: int = 2
+
+    # Standalone agent workers (python worker.py); set JOB_EXECUTION_MODE=external
+    # on the API so it only queues sessions. A worker runs one session per desktop:
+    # DISPLAY_POOL_SIZE of them, or one on the shared display
+    WORKER_HEARTBEAT_SECONDS: float = 10.0
+    # a worker silent for this long is reported dead and its row is removed
+    WORKER_STALE_SECONDS: float = 60.0
+
+    # Virtual displays: with DISPLAY_POOL_SIZE > 0 each session gets its own Xvfb
+    # desktop (window manager, taskbar and x11vnc on port 5900 + display number),
+    # at most this many per process; 0 shares the container's display :DISPLAY_NUM
+    DISPLAY_POOL_SIZE: int = 0
+    # desktops take display numbers from here up, skipping the shared display and any
+    # whose VNC port is taken, so they never land on :DISPLAY_NUM or VNC_PORT
+    DISPLAY_POOL_FIRST_DISPLAY: int = 10
+    WIDTH: int = 1024
+    HEIGHT: int = 768
+    DISPLAY_START_TIMEOUT_SECONDS: float = 10.0
+    # desktops kept started and idle for the next sessions, and how often they are checked
+    DISPLAY_POOL_WARM: int = 1
+    DISPLAY_POOL_HEALTH_SECONDS: float = 10.0
+
+    # The container's shared display and the VNC server and noVNC proxy that
+    # serve it, run and restarted by the API process
+    DISPLAY_NUM: int = 1
+    VNC_PORT: int = 5900
+    NOVNC_PORT: int = 6080
+    NOVNC_PATH: str = "/opt/noVNC"
+    # /vnc/screenshot: a capture younger than this is served to every viewer as is
+    SCREENSHOT_MAX_AGE_SECONDS: float = 0.5
+    # /vnc/stream: how often a watched screen is checked for changes, the most a
+    # viewer may ask for, and the JPEG quality viewers get unless they ask otherwise
+    STREAM_FPS: float = 5.0
+    STREAM_JPEG_QUALITY: int = 70
+
+    # Write-behind message persistence: agent messages from all sessions are
+    # group-committed in batches instead of one INSERT and commit each
+    MESSAGE_WRITE_INTERVAL_MS: float = 5.0
+    MESSAGE_WRITE_BATCH_SIZE: int = 100
+    MESSAGE_WRITE_QUEUE_SIZE: int = 1000
+
     class Config:
         env_file = '.env'
         extra = 'ignore'
@@ -1,19 +1,29 @@
 from sqlalchemy.ext.asyncio import AsyncConnection
 from app.db.models import sessions, messages
-from sqlalchemy import insert, select, update
+from sqlalchemy import func, insert, select, update
 from typing import Dict, List
+from dataclasses import dataclass
+from datetime import datetime
+import asyncio
 
 from app.api.schemas import SessionCreate, MessageCreate
+from app.service.blob_store import blob_store
 
 
-async def create_session(conn: AsyncConnection, session_data: SessionCreate) -> Dict | None:
+# run settings such as model and max_tokens travel with the session's job, not the row
+SESSION_COLUMNS = {"initial_prompt", "status", "provider"}
+
+
+async def create_session(conn: AsyncConnection, session_data: SessionCreate, commit: bool = True) -> Dict | None:
     # build the query
     stmt = insert(sessions).values(
-        **session_data.model_dump()).returning(sessions)
+        **session_data.model_dump(include=SESSION_COLUMNS)).returning(sessions)
     result = await conn.execute(stmt)
     # fetch the result
     new_session = result.fetchone()
-    await conn.commit()
+    # callers that add more rows to the same transaction commit themselves
+    if commit:
+        await conn.commit()
     # convert the result to a dictionary and return it if it exists
     return new_session._asdict() if new_session else None
 
@@ -47,12 +57,60 @@ async def update_session_status(conn: AsyncConnection, session_id: int, status:
     return None
 
 
-# messages management
+async def get_session_poll_state(conn: AsyncConnection, session_id: int) -> Dict | None:
+    # status and newest message id of a session in a single round trip
+    last_message_id = select(func.max(messages.c.id)).where(
+        messages.c.session_id == session_id).scalar_subquery()
+    query = select(sessions.c.status, last_message_id.label("last_message_id")).where(
+        sessions.c.id == session_id)
+    result = await conn.execute(query)
+    row = result.fetchone()
+    return row._asdict() if row else None
+
 
+# messages management
 
-async def create_message(conn: AsyncConnection, message_data: MessageCreate) -> Dict | None:
+MESSAGE_PAGE_SIZE = 100
+MAX_MESSAGE_PAGE_SIZE = 500
+
+
+async def _message_values(message_data: MessageCreate) -> Dict:
+    # screenshots go to the blob store, the row only keeps a reference
+    values = message_data.model_dump()
+    base64_image = values.pop("base64_image", None)
+    # every row gets the same keys, so batches can go in one multi-row INSERT
+    values["image_hash"] = None
+    values["image_content_type"] = None
+    if base64_image:
+        image_ref = await blob_store.put_base64_async(base64_image)
+        values["image_hash"] = image_ref.hash
+        values["image_content_type"] = image_ref.content_type
+    return values
+
+
+@dataclass(frozen=True)
+class CreatedMessage:
+    """
+    A newly written message: the values we sent plus the key and timestamp the
+    database generated. Screenshots are never read back, only their reference.
+    """
+    id: int
+    session_id: int
+    role: str
+    content: dict
+    image_hash: str | None
+    image_content_type: str | None
+    created_at: datetime
+
+
+# the only columns a message INSERT needs back
+_GENERATED_MESSAGE_COLUMNS = (messages.c.id, messages.c.created_at)
+
+
+async def create_message(conn: AsyncConnection, message_data: MessageCreate) -> CreatedMessage | None:
+    values = await _message_values(message_data)
     stmt = insert(messages).values(
-        **message_data.model_dump()).returning(messages)
+        **values).returning(*_GENERATED_MESSAGE_COLUMNS)
 
     result = await conn.execute(stmt)
 
@@ -60,12 +118,104 @@ async def create_message(conn: AsyncConnection, message_data: MessageCreate) ->
 
     await conn.commit()
 
+    return CreatedMessage(id=message_row.id, created_at=message_row.created_at, **values) if message_row else None
+
+
+async def create_messages(conn: AsyncConnection, messages_data: List[MessageCreate]) -> List[CreatedMessage]:
+    """Insert a batch of messages with one multi-row INSERT and a single commit, in order."""
+    values = await asyncio.gather(*(_message_values(message_data) for message_data in messages_data))
+    stmt = insert(messages).returning(
+        *_GENERATED_MESSAGE_COLUMNS, sort_by_parameter_order=True)
+
+    result = await conn.execute(stmt, list(values))
+
+    message_rows = result.fetchall()
+
+    await conn.commit()
+
+    return [CreatedMessage(id=message_row.id, created_at=message_row.created_at, **row_values)
+            for message_row, row_values in zip(message_rows, values)]
+
+
+async def get_message_by_id(conn: AsyncConnection, message_id: int) -> Dict | None:
+    query = select(messages).where(messages.c.id == message_id)
+    result = await conn.execute(query)
+    message_row = result.fetchone()
     return message_row._asdict() if message_row else None
 
 
-async def get_messages_by_session_id(conn: AsyncConnection, session_id: int, skip: int = 0, limit: int = 10) -> List[Dict] | None:
-    query = select(messages).where(messages.c.session_id == session_id).order_by(
-        messages.c.created_at.desc()).limit(limit).offset(skip)
+async def get_messages_by_session_id(
+    conn: AsyncConnection,
+    session_id: int,
+    after_id: int | None = None,
+    before_id: int | None = None,
+    limit: int = MESSAGE_PAGE_SIZE,
+) -> List[Dict] | None:
+    # keyset pagination on the (session_id, id) index, always returned oldest first:
+    # after_id pages forward from a cursor, before_id pages backward from one
+    query = select(messages).where(messages.c.session_id == session_id)
+    if after_id is not None:
+        query = query.where(messages.c.id > after_id)
+    if before_id is not None:
+        query = query.where(messages.c.id < before_id).order_by(
+            messages.c.id.desc()).limit(limit)
+    else:
+        query = query.order_by(messages.c.id.asc()).limit(limit)
     result = await conn.execute(query)
     message_rows = result.fetchall()
+    if before_id is not None:
+        message_rows = reversed(message_rows)
     return [message_row._asdict() for message_row in message_rows]
+
+
+async def session_has_user_message(conn: AsyncConnection, session_id: int) -> bool:
+    query = select(messages.c.id).where(
+        messages.c.session_id == session_id, messages.c.role == "user").limit(1)
+    result = await conn.execute(query)
+    return result.first() is not None
+
+
+# columns returned to pollers; legacy inline screenshots are never shipped
+MESSAGE_SUMMARY_COLUMNS = [
+    column for column in messages.c if column.name != "base64_image"]
+
+
+async def get_session_snapshot(
+    conn: AsyncConnection,
+    session_id: int,
+    after_id: int | None = None,
+    limit: int = MESSAGE_PAGE_SIZE,
+) -> Dict | None:
+    # one statement: the session row left-joined to its messages after the cursor,
+    # with the total message count as a scalar subquery
+    message_count = select(func.count(messages.c.id)).where(
+        messages.c.session_id == session_id).scalar_subquery()
+    join_condition = messages.c.session_id == sessions.c.id
+    if after_id is not None:
+        join_condition = join_condition & (messages.c.id > after_id)
+    query = (
+        select(
+            sessions.c.status.label("session_status"),
+            message_count.label("message_count"),
+            *MESSAGE_SUMMARY_COLUMNS,
+        )
+        .select_from(sessions.outerjoin(messages, join_condition))
+        .where(sessions.c.id == session_id)
+        .order_by(messages.c.id.asc())
+        .limit(limit)
+    )
+    result = await conn.execute(query)
+    rows = result.fetchall()
+    if not rows:
+        return None
+
+    new_messages = [
+        {column.name: getattr(row, column.name)
+         for column in MESSAGE_SUMMARY_COLUMNS}
+        for row in rows if row.id is not None
+    ]
+    return {
+        "status": rows[0].session_status,
+        "message_count": rows[0].message_count,
+        "messages": new_messages,
+    }
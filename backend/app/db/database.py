@@ -1,18 +1,96 @@
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine
 from app.core.config import settings
 from .models import meta
 
 from contextlib import asynccontextmanager
+from dataclasses import dataclass
 from typing import AsyncGenerator
 from sqlalchemy.ext.asyncio import AsyncConnection
+import time
 
-engine = create_async_engine(settings.DATABASE_URL)
+
+def pool_options(database_url: str) -> dict:
+    options = {
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+    }
+    # SQLite keeps SQLAlchemy's own pool choice, which may not take sizes
+    if make_url(database_url).get_backend_name() != "sqlite":
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        )
+    return options
+
+
+engine = create_async_engine(
+    settings.DATABASE_URL, **pool_options(settings.DATABASE_URL))
 db_metadata = meta
 
 
-async def get_db_connection() -> AsyncGenerator[AsyncConnection, None]:
+@dataclass
+class CheckoutMetrics:
+    """How long callers waited for a pooled connection."""
+
+    checkouts: int = 0
+    slow_checkouts: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+    in_use: int = 0
+
+    def record(self, wait: float):
+        self.checkouts += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        if wait >= settings.DB_SLOW_CHECKOUT_SECONDS:
+            self.slow_checkouts += 1
+
+
+checkout_metrics = CheckoutMetrics()
+
+
+def pool_metrics() -> dict:
+    pool = engine.pool
+    return {
+        "pool": pool.status(),
+        "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+        "in_use": checkout_metrics.in_use,
+        "checkouts": checkout_metrics.checkouts,
+        "slow_checkouts": checkout_metrics.slow_checkouts,
+        "avg_wait_ms": round(1000 * checkout_metrics.total_wait / checkout_metrics.checkouts, 3)
+        if checkout_metrics.checkouts else 0.0,
+        "max_wait_ms": round(1000 * checkout_metrics.max_wait, 3),
+    }
+
+
+async def _checkout() -> AsyncConnection:
+    started = time.perf_counter()
     conn = await engine.connect()
+    checkout_metrics.record(time.perf_counter() - started)
+    checkout_metrics.in_use += 1
+    return conn
+
+
+async def _release(conn: AsyncConnection):
+    checkout_metrics.in_use -= 1
+    await conn.close()
+
+
+async def get_db_connection() -> AsyncGenerator[AsyncConnection, None]:
+    conn = await _checkout()
+    try:
+        yield conn
+    finally:
+        await _release(conn)
+
+
+@asynccontextmanager
+async def db_connection() -> AsyncGenerator[AsyncConnection, None]:
+    """Connection scoped to a block, for handlers that must not hold one while waiting."""
+    conn = await _checkout()
     try:
         yield conn
     finally:
-        await conn.close()
+        await _release(conn)
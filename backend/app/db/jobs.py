@@ -0,0 +1,186 @@
+"""Durable queue of agent session runs."""
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+from sqlalchemy import and_, delete, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.db.models import session_jobs, workers
+
+
+@dataclass(frozen=True)
+class SessionJob:
+    id: int
+    session_id: int
+    provider: str
+    priority: int
+    payload: Dict
+    attempts: int
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _claimable(now: datetime):
+    # queued, or running under a lease nobody renewed (the worker died)
+    return or_(
+        session_jobs.c.state == "queued",
+        and_(session_jobs.c.state == "running",
+             session_jobs.c.locked_until < now),
+    )
+
+
+async def enqueue_session(
+    conn: AsyncConnection, session_id: int, provider: str, payload: Dict, priority: int = 0
+) -> int:
+    stmt = insert(session_jobs).values(
+        session_id=session_id, provider=provider, priority=priority, payload=payload,
+        state="queued", attempts=0).returning(session_jobs.c.id)
+    result = await conn.execute(stmt)
+    job_id = result.scalar_one()
+    await conn.commit()
+    return job_id
+
+
+async def claim_session_job(
+    conn: AsyncConnection,
+    worker_id: str,
+    visibility_timeout: float,
+    max_attempts: int,
+    excluded_providers: List[str] = (),
+) -> SessionJob | None:
+    """
+    Lease the highest priority claimable job, oldest first. On Postgres competing
+    workers skip rows another worker has locked; elsewhere the conditional UPDATE
+    makes sure only one of them wins.
+    """
+    now = _now()
+    candidate = (
+        select(session_jobs.c.id)
+        .where(_claimable(now), session_jobs.c.attempts < max_attempts)
+        .order_by(session_jobs.c.priority.desc(), session_jobs.c.id)
+        .limit(1)
+    )
+    if excluded_providers:
+        candidate = candidate.where(
+            session_jobs.c.provider.not_in(excluded_providers))
+    if conn.dialect.name == "postgresql":
+        candidate = candidate.with_for_update(skip_locked=True)
+
+    job_id = (await conn.execute(candidate)).scalar()
+    if job_id is None:
+        await conn.commit()
+        return None
+
+    stmt = (
+        update(session_jobs)
+        .where(session_jobs.c.id == job_id, _claimable(now))
+        .values(state="running", locked_by=worker_id,
+                locked_until=now + timedelta(seconds=visibility_timeout),
+                attempts=session_jobs.c.attempts + 1)
+        .returning(session_jobs.c.id, session_jobs.c.session_id, session_jobs.c.provider,
+                   session_jobs.c.priority, session_jobs.c.payload, session_jobs.c.attempts)
+    )
+    row = (await conn.execute(stmt)).first()
+    await conn.commit()
+    return SessionJob(**row._asdict()) if row else None
+
+
+async def extend_lease(conn: AsyncConnection, job_id: int, worker_id: str, visibility_timeout: float) -> bool:
+    """Renew a running job's lease. False if the lease was lost to another worker."""
+    stmt = (
+        update(session_jobs)
+        .where(session_jobs.c.id == job_id, session_jobs.c.locked_by == worker_id,
+               session_jobs.c.state == "running")
+        .values(locked_until=_now() + timedelta(seconds=visibility_timeout))
+    )
+    result = await conn.execute(stmt)
+    await conn.commit()
+    return result.rowcount == 1
+
+
+async def finish_job(conn: AsyncConnection, job_id: int, worker_id: str, state: str = "done") -> None:
+    stmt = (
+        update(session_jobs)
+        .where(session_jobs.c.id == job_id, session_jobs.c.locked_by == worker_id)
+        .values(state=state, locked_until=None)
+    )
+    await conn.execute(stmt)
+    await conn.commit()
+
+
+async def release_job(conn: AsyncConnection, job_id: int, worker_id: str) -> bool:
+    """
+    Hand a running job back to the queue, e.g. on shutdown. The interrupted run
+    doesn't count as an attempt. False if the job was no longer ours.
+    """
+    stmt = (
+        update(session_jobs)
+        .where(session_jobs.c.id == job_id, session_jobs.c.locked_by == worker_id,
+               session_jobs.c.state == "running")
+        .values(state="queued", locked_by=None, locked_until=None,
+                attempts=session_jobs.c.attempts - 1)
+    )
+    result = await conn.execute(stmt)
+    await conn.commit()
+    return result.rowcount == 1
+
+
+async def fail_exhausted_jobs(conn: AsyncConnection, max_attempts: int) -> List[int]:
+    """Give up on abandoned jobs that used all their attempts. Returns their session ids."""
+    stmt = (
+        update(session_jobs)
+        .where(_claimable(_now()), session_jobs.c.attempts >= max_attempts)
+        .values(state="failed", locked_until=None)
+        .returning(session_jobs.c.session_id)
+    )
+    session_ids = list((await conn.execute(stmt)).scalars())
+    await conn.commit()
+    return session_ids
+
+
+# workers
+
+async def register_worker(
+    conn: AsyncConnection, worker_id: str, hostname: str, pid: int, display_capacity: int
+) -> None:
+    stmt = insert(workers).values(
+        id=worker_id, hostname=hostname, pid=pid, display_capacity=display_capacity,
+        running=0, heartbeat_at=_now())
+    await conn.execute(stmt)
+    await conn.commit()
+
+
+async def heartbeat_worker(conn: AsyncConnection, worker_id: str, running: int) -> bool:
+    """Record that the worker is alive. False if its row is gone, e.g. pruned as stale."""
+    stmt = (
+        update(workers)
+        .where(workers.c.id == worker_id)
+        .values(heartbeat_at=_now(), running=running)
+    )
+    result = await conn.execute(stmt)
+    await conn.commit()
+    return result.rowcount == 1
+
+
+async def unregister_worker(conn: AsyncConnection, worker_id: str) -> None:
+    await conn.execute(delete(workers).where(workers.c.id == worker_id))
+    await conn.commit()
+
+
+async def prune_workers(conn: AsyncConnection, stale_after: float) -> int:
+    """Remove workers that stopped heartbeating. Their jobs are reclaimed when the lease runs out."""
+    cutoff = _now() - timedelta(seconds=stale_after)
+    result = await conn.execute(delete(workers).where(workers.c.heartbeat_at < cutoff))
+    await conn.commit()
+    return result.rowcount
+
+
+async def list_workers(conn: AsyncConnection, stale_after: float) -> List[Dict]:
+    cutoff = _now() - timedelta(seconds=stale_after)
+    query = select(workers, (workers.c.heartbeat_at >= cutoff).label("alive")).order_by(workers.c.started_at)
+    result = await conn.execute(query)
+    return [row._asdict() for row in result.fetchall()]
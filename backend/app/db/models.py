@@ -1,4 +1,4 @@
-from sqlalchemy import (JSON, DateTime, ForeignKey, MetaData, String, Text,
+from sqlalchemy import (JSON, DateTime, ForeignKey, Index, MetaData, String, Text,
                         Table, Column, Integer, true)
 from sqlalchemy.sql import func
 
@@ -22,6 +22,45 @@ messages = Table(
     Column('session_id', Integer, ForeignKey("sessions.id")),
     Column('role', String),
     Column('content', JSON),
+    # legacy inline screenshots; new images live in the blob store
     Column('base64_image', Text, nullable=True),
-    Column('created_at', DateTime(timezone=True), server_default=func.now())
+    Column('image_hash', String(64), nullable=True, index=True),
+    Column('image_content_type', String, nullable=True),
+    Column('created_at', DateTime(timezone=True), server_default=func.now()),
+    # serves keyset pagination of a session's messages by id
+    Index('ix_messages_session_id_id', 'session_id', 'id'),
+)
+
+# durable queue of agent runs, claimed by worker pools
+session_jobs = Table(
+    'session_jobs',
+    meta,
+    Column('id', Integer, primary_key=True),
+    Column('session_id', Integer, ForeignKey("sessions.id"), unique=True),
+    Column('provider', String, nullable=False),
+    Column('priority', Integer, nullable=False, default=0),
+    # queued, running, done, failed
+    Column('state', String, nullable=False, default="queued"),
+    # keyword arguments for run_agent_session
+    Column('payload', JSON, nullable=False),
+    Column('attempts', Integer, nullable=False, default=0),
+    Column('locked_by', String, nullable=True),
+    # a running job whose lease has expired is visible to other workers again
+    Column('locked_until', DateTime(timezone=True), nullable=True),
+    Column('created_at', DateTime(timezone=True), server_default=func.now()),
+    Index('ix_session_jobs_claim', 'state', 'priority', 'id'),
+)
+
+# agent worker processes, with the desktops they can offer; rows whose heartbeat
+# stopped belong to workers that died, and their jobs come back on lease expiry
+workers = Table(
+    'workers',
+    meta,
+    Column('id', String, primary_key=True),
+    Column('hostname', String, nullable=False),
+    Column('pid', Integer, nullable=False),
+    Column('display_capacity', Integer, nullable=False),
+    Column('running', Integer, nullable=False, default=0),
+    Column('started_at', DateTime(timezone=True), server_default=func.now()),
+    Column('heartbeat_at', DateTime(timezone=True), nullable=False),
 )
@@ -3,14 +3,20 @@ VNC management routes for model interaction
 """
 
 import asyncio
-import subprocess
-import psutil
+from dataclasses import asdict
 from datetime import datetime
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Query, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import AsyncIterator, Optional, Dict, List, Literal
 import logging
 
+from app.core.config import settings
+from app.service.computer_use.tools import XdotoolInput
+from app.service.display_pool import display_pool
+from app.service.screen_frames import FrameSource, screen_frames
+from app.service.vnc_supervisor import vnc_supervisor
+
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/vnc", tags=["vnc"])
@@ -42,6 +48,24 @@ class VNCSession(BaseModel):
     last_activity: Optional[str] = None
 
 
+class VNCInputEvent(BaseModel):
+    type: Literal["move", "click", "mouse_down", "mouse_up", "key", "type", "scroll"]
+    x: Optional[int] = None
+    y: Optional[int] = None
+    button: Optional[int] = None
+    repeat: Optional[int] = None
+    key: Optional[str] = None
+    text: Optional[str] = None
+    direction: Optional[Literal["up", "down", "left", "right"]] = None
+    amount: Optional[int] = None
+
+
+class VNCInteraction(BaseModel):
+    events: List[VNCInputEvent]
+    # the shared display when not given, e.g. a session's leased desktop otherwise
+    display: Optional[int] = None
+
+
 # Global VNC session storage (in production, use a database)
 vnc_sessions: Dict[str, VNCSession] = {}
 
@@ -49,101 +73,59 @@ vnc_sessions: Dict[str, VNCSession] = {}
 @router.get("/status", response_model=VNCStatus)
 async def get_vnc_status():
     """Get current VNC server status"""
-    try:
-        # Check if noVNC is running on port 6080
-        novnc_running = False
-        novnc_pid = None
-
-        for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-            try:
-                if proc.info['cmdline'] and any('novnc' in str(cmd).lower() for cmd in proc.info['cmdline']):
-                    novnc_running = True
-                    novnc_pid = proc.info['pid']
-                    break
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                continue
-
-        # Check if x11vnc is running on port 5900
-        x11vnc_running = False
-        x11vnc_pid = None
-
-        for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-            try:
-                if proc.info['cmdline'] and any('x11vnc' in str(cmd).lower() for cmd in proc.info['cmdline']):
-                    x11vnc_running = True
-                    x11vnc_pid = proc.info['pid']
-                    break
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                continue
-
-        is_running = novnc_running and x11vnc_running
-        url = f"http://localhost:6080/vnc.html?autoconnect=true&resize=scale&quality=6"
-
-        return VNCStatus(
-            is_running=is_running,
-            port=8080,  # Docker maps 6080 to 8080
-            pid=novnc_pid,
-            host="localhost",
-            url=url.replace(":6080", ":8080"),  # Use mapped port
-            error=None if is_running else "VNC services not running"
-        )
-
-    except Exception as e:
-        logger.error(f"Error checking VNC status: {e}")
-        return VNCStatus(
-            is_running=False,
-            port=8080,  # Docker maps 6080 to 8080
-            pid=None,
-            host="localhost",
-            url="",
-            error=str(e)
-        )
+    novnc = vnc_supervisor.novnc
+    is_running = vnc_supervisor.is_running
+    error = vnc_supervisor.x11vnc.error or novnc.error
+    return VNCStatus(
+        is_running=is_running,
+        port=8080,  # Docker maps 6080 to 8080
+        pid=novnc.pid,
+        host="localhost",
+        url="http://localhost:8080/vnc.html?autoconnect=true&resize=scale&quality=6",
+        error=None if is_running else error or "VNC services not running"
+    )
+
+
+@router.get("/processes")
+async def get_vnc_processes():
+    """The VNC server and noVNC proxy: pids, ports, restarts and whether they are run by someone else"""
+    return vnc_supervisor.status()
+
+
+@router.get("/displays")
+async def get_vnc_displays():
+    """Desktops leased to running sessions in this process, with their VNC ports, and the idle warm ones"""
+    return {
+        "shared": display_pool.shared,
+        "size": display_pool.size,
+        "warm": display_pool.warm,
+        "idle": display_pool.idle,
+        "leases": [
+            {"session_id": session_id, "display": display.name, "vnc_port": display.vnc_port,
+             "width": display.width, "height": display.height}
+            for session_id, display in display_pool.leases.items()
+        ],
+    }
 
 
 @router.post("/start")
 async def start_vnc(background_tasks: BackgroundTasks):
     """Start VNC services"""
-    try:
-        # Check if already running
-        status = await get_vnc_status()
-        if status.is_running:
-            return {"message": "VNC services already running", "status": status}
-
-        # Start VNC services in background
-        background_tasks.add_task(start_vnc_services)
+    status = await get_vnc_status()
+    if status.is_running:
+        return {"message": "VNC services already running", "status": status}
 
-        return {"message": "Starting VNC services...", "status": "starting"}
+    # Start VNC services in background
+    background_tasks.add_task(start_vnc_services)
 
-    except Exception as e:
-        logger.error(f"Error starting VNC: {e}")
-        raise HTTPException(
-            status_code=500, detail=f"Failed to start VNC: {str(e)}")
+    return {"message": "Starting VNC services...", "status": "starting"}
 
 
 @router.post("/stop")
 async def stop_vnc():
     """Stop VNC services"""
     try:
-        stopped_services = []
-
-        # Stop noVNC
-        for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-            try:
-                if proc.info['cmdline'] and any('novnc' in str(cmd).lower() for cmd in proc.info['cmdline']):
-                    proc.terminate()
-                    stopped_services.append("noVNC")
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                continue
-
-        # Stop x11vnc
-        for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-            try:
-                if proc.info['cmdline'] and any('x11vnc' in str(cmd).lower() for cmd in proc.info['cmdline']):
-                    proc.terminate()
-                    stopped_services.append("x11vnc")
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                continue
-
+        stopped_services = await vnc_supervisor.stop()
         return {"message": f"Stopped VNC services: {', '.join(stopped_services)}"}
 
     except Exception as e:
@@ -155,22 +137,8 @@ async def stop_vnc():
 @router.post("/restart")
 async def restart_vnc(background_tasks: BackgroundTasks):
     """Restart VNC services"""
-    try:
-        # Stop first
-        await stop_vnc()
-
-        # Wait a moment
-        await asyncio.sleep(2)
-
-        # Start again
-        background_tasks.add_task(start_vnc_services)
-
-        return {"message": "Restarting VNC services..."}
-
-    except Exception as e:
-        logger.error(f"Error restarting VNC: {e}")
-        raise HTTPException(
-            status_code=500, detail=f"Failed to restart VNC: {str(e)}")
+    background_tasks.add_task(vnc_supervisor.restart)
+    return {"message": "Restarting VNC services..."}
 
 
 @router.get("/sessions")
@@ -222,101 +190,103 @@ async def delete_vnc_session(session_id: str):
 
 
 async def start_vnc_services():
-    """Start VNC services in background"""
-    try:
-        # Start x11vnc
-        subprocess.Popen([
-            "x11vnc",
-            "-display", ":1",
-            "-forever",
-            "-shared",
-            "-wait", "50",
-            "-rfbport", "5900",
-            "-nopw"
-        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-
-        # Wait a moment for x11vnc to start
-        await asyncio.sleep(2)
-
-        # Start noVNC
-        subprocess.Popen([
-            "/opt/noVNC/utils/novnc_proxy",
-            "--vnc", "localhost:5900",
-            "--listen", "6080",
-            "--web", "/opt/noVNC"
-        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-
-        logger.info("VNC services started successfully")
+    """Start VNC services unless they are already up"""
+    if not await vnc_supervisor.start():
+        logger.error("VNC services are not running: %s", vnc_supervisor.status())
 
-    except Exception as e:
-        logger.error(f"Error starting VNC services: {e}")
+
+def _display_num(display: Optional[int]) -> int:
+    """The shared display when not given, else a desktop leased to a session here."""
+    if display is None or display == settings.DISPLAY_NUM:
+        return settings.DISPLAY_NUM
+    if any(leased.number == display for leased in display_pool.leases.values()):
+        return display
+    raise HTTPException(status_code=404, detail=f"Display :{display} is not in use")
 
 
 @router.get("/screenshot")
-async def get_vnc_screenshot():
-    """Get a screenshot of the VNC session"""
+async def get_vnc_screenshot(
+    format: Literal["base64", "png"] = "base64",
+    display: Optional[int] = None,
+    max_age: Optional[float] = None,
+):
+    """
+    Get a screenshot of the VNC session, or of a leased display. Viewers asking
+    within the freshness window share one capture.
+    """
+    display_num = _display_num(display)
     try:
-        import base64
-        from PIL import Image
-        import io
-
-        # Take screenshot using scrot
-        result = subprocess.run([
-            "scrot", "-o", "/tmp/vnc_screenshot.png"
-        ], capture_output=True, text=True)
-
-        if result.returncode != 0:
-            raise HTTPException(
-                status_code=500, detail="Failed to take screenshot")
-
-        # Read and encode the screenshot
-        with open("/tmp/vnc_screenshot.png", "rb") as f:
-            image_data = f.read()
-
-        base64_image = base64.b64encode(image_data).decode()
-
-        return {
-            "screenshot": f"data:image/png;base64,{base64_image}",
-            "timestamp": datetime.now().isoformat()
-        }
-
+        frame = await screen_frames.source(f":{display_num}").frame(max_age)
     except Exception as e:
         logger.error(f"Error taking VNC screenshot: {e}")
         raise HTTPException(
             status_code=500, detail=f"Failed to take screenshot: {str(e)}")
 
+    timestamp = frame.captured_at.isoformat()
+    loop = asyncio.get_running_loop()
+    if format == "png":
+        png = await loop.run_in_executor(None, lambda: frame.png)
+        return Response(content=png, media_type="image/png",
+                        headers={"Cache-Control": "no-store", "X-Captured-At": timestamp})
+    encoded = await loop.run_in_executor(None, lambda: frame.base64)
+    return {
+        "screenshot": f"data:image/png;base64,{encoded}",
+        "timestamp": timestamp
+    }
+
+
+MJPEG_BOUNDARY = "frame"
+
+
+async def mjpeg_parts(source: FrameSource, fps: float, quality: int) -> AsyncIterator[bytes]:
+    """multipart/x-mixed-replace parts, one JPEG per screen change"""
+    loop = asyncio.get_running_loop()
+    async for frame in source.changes(fps):
+        jpeg = await loop.run_in_executor(None, frame.jpeg, quality)
+        yield (
+            f"--{MJPEG_BOUNDARY}\r\n"
+            f"Content-Type: image/jpeg\r\n"
+            f"Content-Length: {len(jpeg)}\r\n"
+            f"X-Captured-At: {frame.captured_at.isoformat()}\r\n\r\n"
+        ).encode() + jpeg + b"\r\n"
+
+
+@router.get("/stream")
+async def stream_vnc_screen(
+    display: Optional[int] = None,
+    fps: float = Query(settings.STREAM_FPS, gt=0, le=settings.STREAM_FPS),
+    quality: int = Query(settings.STREAM_JPEG_QUALITY, ge=1, le=95),
+):
+    """
+    Watch a display as an MJPEG stream, e.g. in an <img> tag. A frame is sent only
+    when the screen changes, and all viewers of a display share one capture loop.
+    """
+    display_num = _display_num(display)
+    source = screen_frames.source(f":{display_num}")
+    return StreamingResponse(
+        mjpeg_parts(source, fps, quality),
+        media_type=f"multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}",
+        headers={"Cache-Control": "no-store"},
+    )
+
 
 @router.post("/interact")
-async def vnc_interact(action: str, data: Dict[str, Any]):
-    """Send interaction commands to VNC session"""
+async def vnc_interact(interaction: VNCInteraction):
+    """Send a batch of mouse and keyboard events to a display, in order, with each one's latency"""
+    display_num = _display_num(interaction.display)
+    backend = XdotoolInput.shared(f"DISPLAY=:{display_num} ")
+    events = [event.model_dump(exclude_none=True) for event in interaction.events]
     try:
-        if action == "click":
-            x = data.get("x", 0)
-            y = data.get("y", 0)
-            button = data.get("button", 1)
-
-            subprocess.run([
-                "xdotool", "mousemove", str(x), str(y)
-            ])
-            subprocess.run([
-                "xdotool", "click", str(button)
-            ])
-
-        elif action == "type":
-            text = data.get("text", "")
-            subprocess.run([
-                "xdotool", "type", text
-            ])
-
-        elif action == "key":
-            key = data.get("key", "")
-            subprocess.run([
-                "xdotool", "key", key
-            ])
-
-        return {"message": f"VNC interaction '{action}' executed successfully"}
-
+        results = await backend.send(events)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         logger.error(f"Error executing VNC interaction: {e}")
         raise HTTPException(
             status_code=500, detail=f"Failed to execute VNC interaction: {str(e)}")
+
+    return {
+        "completed": sum(result.ok for result in results),
+        "total": len(events),
+        "results": [asdict(result) for result in results],
+    }
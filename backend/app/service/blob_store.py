@@ -0,0 +1,144 @@
+"""Content-addressed storage for screenshots and other binary blobs."""
+
+import asyncio
+import base64
+import hashlib
+import os
+import tempfile
+from abc import ABCMeta, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+
+from app.core.config import settings
+
+CONTENT_TYPE_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF8", "image/gif"),
+    (b"RIFF", "image/webp"),
+)
+
+
+def sniff_content_type(data: bytes) -> str:
+    for signature, content_type in CONTENT_TYPE_SIGNATURES:
+        if data.startswith(signature):
+            return content_type
+    return "application/octet-stream"
+
+
+@dataclass(frozen=True)
+class BlobRef:
+    """Reference to a stored blob, as recorded on a message row."""
+
+    hash: str
+    content_type: str
+    size: int
+
+
+class BlobBackend(metaclass=ABCMeta):
+    """Abstract storage backend keyed by SHA-256 hex digest."""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def write(self, key: str, data: bytes) -> None:
+        ...
+
+    @abstractmethod
+    def read(self, key: str) -> bytes | None:
+        ...
+
+    def local_path(self, key: str) -> Path | None:
+        """Filesystem path of the blob if the backend keeps it on local disk."""
+        return None
+
+
+class LocalBlobBackend(BlobBackend):
+    """Stores blobs as files under `root`, fanned out by the first two hex digits."""
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    def write(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write to a temp file first so readers never see a partial blob
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_name, path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+    def read(self, key: str) -> bytes | None:
+        try:
+            return self._path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def local_path(self, key: str) -> Path | None:
+        path = self._path(key)
+        return path if path.exists() else None
+
+
+class BlobStore:
+    """
+    Deduplicating blob store. Identical images are written once no matter how many
+    messages or sessions reference them.
+    """
+
+    def __init__(self, backend: BlobBackend):
+        self.backend = backend
+
+    def put(self, data: bytes) -> BlobRef:
+        key = hashlib.sha256(data).hexdigest()
+        if not self.backend.exists(key):
+            self.backend.write(key, data)
+        return BlobRef(hash=key, content_type=sniff_content_type(data), size=len(data))
+
+    def put_base64(self, encoded: str) -> BlobRef:
+        return self.put(base64.b64decode(encoded))
+
+    def get(self, key: str) -> bytes | None:
+        return self.backend.read(key)
+
+    def get_base64(self, key: str) -> str | None:
+        data = self.get(key)
+        return base64.b64encode(data).decode() if data is not None else None
+
+    async def put_base64_async(self, encoded: str) -> BlobRef:
+        """Decode, hash and write off the event loop."""
+        return await asyncio.to_thread(self.put_base64, encoded)
+
+    async def get_base64_async(self, key: str) -> str | None:
+        return await asyncio.to_thread(self.get_base64, key)
+
+
+def create_blob_store() -> BlobStore:
+    if settings.BLOB_STORE_BACKEND == "local":
+        return BlobStore(LocalBlobBackend(settings.BLOB_STORE_PATH))
+    raise ValueError(f"Unknown blob store backend: {settings.BLOB_STORE_BACKEND}")
+
+
+def require_shared_blob_store():
+    """
+    Standalone workers write the screenshots the API serves, so with
+    JOB_EXECUTION_MODE=external both have to see the same store.
+    """
+    if not settings.BLOB_STORE_SHARED:
+        raise RuntimeError(
+            "JOB_EXECUTION_MODE=external needs a blob store shared by the API and every worker: "
+            "put BLOB_STORE_PATH on storage they all mount and set BLOB_STORE_SHARED=true")
+
+
+blob_store = create_blob_store()
@@ -31,6 +31,7 @@ from anthropic.types.beta import (
 
 from .tools import (
     TOOL_GROUPS_BY_VERSION,
+    Display,
     ToolCollection,
     ToolResult,
     ToolVersion,
@@ -106,16 +107,19 @@ async def sampling_loop(
     tool_version: ToolVersion,
     thinking_budget: int | None = None,
     token_efficient_tools_beta: bool = False,
+    display: Display | None = None,
 ):
     """
     Agentic sampling loop for the assistant/tool interaction of computer use.
     """
     tool_group = TOOL_GROUPS_BY_VERSION[tool_version]
-    tool_collection = ToolCollection(
-        *(ToolCls() for ToolCls in tool_group.tools))
+    tool_collection = ToolCollection.for_display(tool_group.tools, display)
+    system_prompt = SYSTEM_PROMPT
+    if display is not None:
+        system_prompt = system_prompt.replace("DISPLAY=:1", f"DISPLAY={display.name}")
     system = BetaTextBlockParam(
         type="text",
-        text=f"{SYSTEM_PROMPT}{' ' + system_prompt_suffix if system_prompt_suffix else ''}",
+        text=f"{system_prompt}{' ' + system_prompt_suffix if system_prompt_suffix else ''}",
     )
 
     while True:
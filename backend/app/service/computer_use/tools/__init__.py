@@ -2,8 +2,16 @@ from .base import CLIResult, ToolResult
 from .bash import BashTool20241022, BashTool20250124
 from .collection import ToolCollection
 from .computer import ComputerTool20241022, ComputerTool20250124
-from .edit import EditTool20241022, EditTool20250124, EditTool20250429, EditTool20250728
+from .display import Display
+from .edit import (
+    EditTool20241022,
+    EditTool20250124,
+    EditTool20250429,
+    EditTool20250728,
+    MultiEditTool,
+)
 from .groups import TOOL_GROUPS_BY_VERSION, ToolVersion
+from .input import InputEvent, InputResult, XdotoolInput
 
 __ALL__ = [
     BashTool20241022,
@@ -11,12 +19,17 @@ __ALL__ = [
     CLIResult,
     ComputerTool20241022,
     ComputerTool20250124,
+    Display,
     EditTool20241022,
     EditTool20250124,
     EditTool20250429,
     EditTool20250728,
+    InputEvent,
+    InputResult,
+    MultiEditTool,
     ToolCollection,
     ToolResult,
     ToolVersion,
     TOOL_GROUPS_BY_VERSION,
+    XdotoolInput,
 ]
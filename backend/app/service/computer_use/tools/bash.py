@@ -3,6 +3,7 @@ import os
 from typing import Any, Literal
 
 from .base import BaseAnthropicTool, CLIResult, ToolError, ToolResult
+from .display import Display
 
 
 class _BashSession:
@@ -16,9 +17,11 @@ class _BashSession:
     _timeout: float = 120.0  # seconds
     _sentinel: str = "<<exit>>"
 
-    def __init__(self):
+    def __init__(self, display: Display | None = None):
         self._started = False
         self._timed_out = False
+        # GUI apps started from the shell open on the session's display
+        self._env = display.env() if display is not None else None
 
     async def start(self):
         if self._started:
@@ -32,6 +35,7 @@ class _BashSession:
             stdin=asyncio.subprocess.PIPE,
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE,
+            env=self._env,
         )
 
         self._started = True
@@ -111,9 +115,11 @@ class BashTool20250124(BaseAnthropicTool):
 
     api_type: Literal["bash_20250124"] = "bash_20250124"
     name: Literal["bash"] = "bash"
+    uses_display = True
 
-    def __init__(self):
+    def __init__(self, display: Display | None = None):
         self._session = None
+        self._display = display
         super().__init__()
 
     def to_params(self) -> Any:
@@ -128,13 +134,13 @@ class BashTool20250124(BaseAnthropicTool):
         if restart:
             if self._session:
                 self._session.stop()
-            self._session = _BashSession()
+            self._session = _BashSession(self._display)
             await self._session.start()
 
             return ToolResult(system="tool has been restarted.")
 
         if self._session is None:
-            self._session = _BashSession()
+            self._session = _BashSession(self._display)
             await self._session.start()
 
         if command is not None:
@@ -10,6 +10,8 @@ from .base import (
     ToolFailure,
     ToolResult,
 )
+from .display import Display
+from .edit import MultiEditTool, MultiStrReplaceMixin
 
 
 class ToolCollection:
@@ -18,6 +20,23 @@ class ToolCollection:
     def __init__(self, *tools: BaseAnthropicTool):
         self.tools = tools
         self.tool_map = {tool.to_params()["name"]: tool for tool in tools}
+        # multi_str_replace runs on this collection's editor, sharing its edit history
+        editor = next((tool for tool in tools if isinstance(tool, MultiStrReplaceMixin)), None)
+        for tool in tools:
+            if isinstance(tool, MultiEditTool) and tool.editor is None:
+                tool.editor = editor
+
+    @classmethod
+    def for_display(
+        cls, tool_types: list[type[BaseAnthropicTool]], display: Display | None = None
+    ) -> "ToolCollection":
+        """Create the tools, handing the desktop ones the session's display."""
+        return cls(
+            *(
+                ToolCls(display=display) if getattr(ToolCls, "uses_display", False) else ToolCls()
+                for ToolCls in tool_types
+            )
+        )
 
     def to_params(
         self,
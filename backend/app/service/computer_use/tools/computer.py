@@ -11,11 +11,12 @@ from uuid import uuid4
 from anthropic.types.beta import BetaToolComputerUse20241022Param, BetaToolUnionParam
 
 from .base import BaseAnthropicTool, ToolError, ToolResult
+from .display import Display
+from .input import TYPING_DELAY_MS, XdotoolInput
 from .run import run
 
 OUTPUT_DIR = "/tmp/outputs"
 
-TYPING_DELAY_MS = 12
 TYPING_GROUP_SIZE = 50
 
 Action_20241022 = Literal[
@@ -93,6 +94,7 @@ class BaseComputerTool:
     width: int
     height: int
     display_num: int | None
+    uses_display = True
 
     _screenshot_delay = 2.0
     _scaling_enabled = True
@@ -108,20 +110,29 @@ class BaseComputerTool:
             "display_number": self.display_num,
         }
 
-    def __init__(self):
+    def __init__(self, display: Display | None = None):
         super().__init__()
 
-        self.width = int(os.getenv("WIDTH") or 0)
-        self.height = int(os.getenv("HEIGHT") or 0)
-        assert self.width and self.height, "WIDTH, HEIGHT must be set"
-        if (display_num := os.getenv("DISPLAY_NUM")) is not None:
-            self.display_num = int(display_num)
-            self._display_prefix = f"DISPLAY=:{self.display_num} "
+        if display is not None:
+            # a display leased to this session
+            self.width = display.width
+            self.height = display.height
+            self.display_num = display.number
+            self._display_prefix = f"DISPLAY={display.name} "
         else:
-            self.display_num = None
-            self._display_prefix = ""
+            self.width = int(os.getenv("WIDTH") or 0)
+            self.height = int(os.getenv("HEIGHT") or 0)
+            assert self.width and self.height, "WIDTH, HEIGHT must be set"
+            if (display_num := os.getenv("DISPLAY_NUM")) is not None:
+                self.display_num = int(display_num)
+                self._display_prefix = f"DISPLAY=:{self.display_num} "
+            else:
+                self.display_num = None
+                self._display_prefix = ""
 
-        self.xdotool = f"{self._display_prefix}xdotool"
+        # shared with operator input to the same display
+        self.input = XdotoolInput.shared(self._display_prefix)
+        self.xdotool = self.input.command
 
     async def __call__(
         self,
@@ -140,14 +151,11 @@ class BaseComputerTool:
             x, y = self.validate_and_get_coordinates(coordinate)
 
             if action == "mouse_move":
-                command_parts = [self.xdotool, f"mousemove --sync {x} {y}"]
-                return await self.shell(" ".join(command_parts))
+                return await self.input_shell(f"mousemove --sync {x} {y}")
             elif action == "left_click_drag":
-                command_parts = [
-                    self.xdotool,
-                    f"mousedown 1 mousemove --sync {x} {y} mouseup 1",
-                ]
-                return await self.shell(" ".join(command_parts))
+                return await self.input_shell(
+                    f"mousedown 1 mousemove --sync {x} {y} mouseup 1"
+                )
 
         if action in ("key", "type"):
             if text is None:
@@ -158,22 +166,17 @@ class BaseComputerTool:
                 raise ToolError(output=f"{text} must be a string")
 
             if action == "key":
-                command_parts = [self.xdotool, f"key -- {text}"]
-                return await self.shell(" ".join(command_parts))
+                return await self.input_shell(f"key -- {text}")
             elif action == "type":
-                results: list[ToolResult] = []
-                for chunk in chunks(text, TYPING_GROUP_SIZE):
-                    command_parts = [
-                        self.xdotool,
-                        f"type --delay {TYPING_DELAY_MS} -- {shlex.quote(chunk)}",
-                    ]
-                    results.append(
-                        await self.shell(" ".join(command_parts), take_screenshot=False)
-                    )
+                # the whole text in one go, so operator input can't land inside it
+                results = await self.input.run_all([
+                    f"type --delay {TYPING_DELAY_MS} -- {shlex.quote(chunk)}"
+                    for chunk in chunks(text, TYPING_GROUP_SIZE)
+                ])
                 screenshot_base64 = (await self.screenshot()).base64_image
                 return ToolResult(
-                    output="".join(result.output or "" for result in results),
-                    error="".join(result.error or "" for result in results),
+                    output="".join(stdout or "" for _, stdout, _ in results),
+                    error="".join(stderr or "" for _, _, stderr in results),
                     base64_image=screenshot_base64,
                 )
 
@@ -193,9 +196,8 @@ class BaseComputerTool:
             if action == "screenshot":
                 return await self.screenshot()
             elif action == "cursor_position":
-                command_parts = [self.xdotool, "getmouselocation --shell"]
-                result = await self.shell(
-                    " ".join(command_parts),
+                result = await self.input_shell(
+                    "getmouselocation --shell",
                     take_screenshot=False,
                 )
                 output = result.output or ""
@@ -206,8 +208,7 @@ class BaseComputerTool:
                 )
                 return result.replace(output=f"X={x},Y={y}")
             else:
-                command_parts = [self.xdotool, f"click {CLICK_BUTTONS[action]}"]
-                return await self.shell(" ".join(command_parts))
+                return await self.input_shell(f"click {CLICK_BUTTONS[action]}")
 
         raise ToolError(f"Invalid action: {action}")
 
@@ -250,6 +251,14 @@ class BaseComputerTool:
     async def shell(self, command: str, take_screenshot=True) -> ToolResult:
         """Run a shell command and return the output, error, and optionally a screenshot."""
         _, stdout, stderr = await run(command)
+        return await self._result(stdout, stderr, take_screenshot)
+
+    async def input_shell(self, args: str, take_screenshot=True) -> ToolResult:
+        """Run xdotool with the given arguments through the display's input backend."""
+        _, stdout, stderr = await self.input.run(args)
+        return await self._result(stdout, stderr, take_screenshot)
+
+    async def _result(self, stdout: str, stderr: str, take_screenshot: bool) -> ToolResult:
         base64_image = None
 
         if take_screenshot:
@@ -316,11 +325,9 @@ class ComputerTool20250124(BaseComputerTool, BaseAnthropicTool):
         if action in ("left_mouse_down", "left_mouse_up"):
             if coordinate is not None:
                 raise ToolError(f"coordinate is not accepted for {action=}.")
-            command_parts = [
-                self.xdotool,
-                f"{'mousedown' if action == 'left_mouse_down' else 'mouseup'} 1",
-            ]
-            return await self.shell(" ".join(command_parts))
+            return await self.input_shell(
+                f"{'mousedown' if action == 'left_mouse_down' else 'mouseup'} 1"
+            )
         if action == "scroll":
             if scroll_direction is None or scroll_direction not in get_args(
                 ScrollDirection
@@ -341,14 +348,14 @@ class ComputerTool20250124(BaseComputerTool, BaseAnthropicTool):
                 "right": 7,
             }[scroll_direction]
 
-            command_parts = [self.xdotool, mouse_move_part]
+            command_parts = [mouse_move_part]
             if text:
                 command_parts.append(f"keydown {text}")
             command_parts.append(f"click --repeat {scroll_amount} {scroll_button}")
             if text:
                 command_parts.append(f"keyup {text}")
 
-            return await self.shell(" ".join(command_parts))
+            return await self.input_shell(" ".join(command_parts))
 
         if action in ("hold_key", "wait"):
             if duration is None or not isinstance(duration, (int, float)):
@@ -363,12 +370,11 @@ class ComputerTool20250124(BaseComputerTool, BaseAnthropicTool):
                     raise ToolError(f"text is required for {action}")
                 escaped_keys = shlex.quote(text)
                 command_parts = [
-                    self.xdotool,
                     f"keydown {escaped_keys}",
                     f"sleep {duration}",
                     f"keyup {escaped_keys}",
                 ]
-                return await self.shell(" ".join(command_parts))
+                return await self.input_shell(" ".join(command_parts))
 
             if action == "wait":
                 await asyncio.sleep(duration)
@@ -388,14 +394,14 @@ class ComputerTool20250124(BaseComputerTool, BaseAnthropicTool):
                 x, y = self.validate_and_get_coordinates(coordinate)
                 mouse_move_part = f"mousemove --sync {x} {y}"
 
-            command_parts = [self.xdotool, mouse_move_part]
+            command_parts = [mouse_move_part]
             if key:
                 command_parts.append(f"keydown {key}")
             command_parts.append(f"click {CLICK_BUTTONS[action]}")
             if key:
                 command_parts.append(f"keyup {key}")
 
-            return await self.shell(" ".join(command_parts))
+            return await self.input_shell(" ".join(command_parts))
 
         return await super().__call__(
             action=action, text=text, coordinate=coordinate, key=key, **kwargs
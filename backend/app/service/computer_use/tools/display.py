@@ -0,0 +1,28 @@
+import os
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Display:
+    """An X display the tools drive, with the VNC port that serves it if there is one."""
+
+    number: int
+    width: int
+    height: int
+    vnc_port: int | None = None
+    # home directory of a leased desktop, also holding its TMPDIR; None shares the process's
+    home: str | None = None
+
+    @property
+    def name(self) -> str:
+        return f":{self.number}"
+
+    def env(self) -> dict[str, str]:
+        """Environment for processes that should draw on this display."""
+        env = {**os.environ, "DISPLAY": self.name}
+        if self.home is not None:
+            # files, browser profiles and caches stay with the desktop and are wiped with it
+            env.update(HOME=self.home, TMPDIR=os.path.join(self.home, "tmp"))
+            for name in ("XDG_CONFIG_HOME", "XDG_CACHE_HOME", "XDG_DATA_HOME", "XDG_STATE_HOME"):
+                env.pop(name, None)
+        return env
@@ -1,14 +1,17 @@
-from collections import defaultdict
+import asyncio
 from pathlib import Path
 from typing import Any, Literal, get_args
 
 from .base import BaseAnthropicTool, CLIResult, ToolError, ToolResult
-from .run import maybe_truncate, run
+from .history import FileHistory
+from .listing import list_directory
+from .run import maybe_truncate
 
 Command_20250124 = Literal[
     "view",
     "create",
     "str_replace",
+    "multi_str_replace",
     "insert",
     "undo_edit",
 ]
@@ -17,12 +20,180 @@ Command_20250429 = Literal[
     "view",
     "create",
     "str_replace",
+    "multi_str_replace",
     "insert",
 ]
 SNIPPET_LINES: int = 4
 
 
-class EditTool20250124(BaseAnthropicTool):
+def apply_unique_replacements(
+    file_content: str, edits: list[tuple[str, str]], path: Path
+) -> tuple[str, list[tuple[int, int]]]:
+    """
+    Apply several (old_str, new_str) replacements to file_content in one pass.
+
+    Every old_str is matched against the original content, must occur exactly once
+    and must not overlap another edit. Returns the new content and, for each edit in
+    file order, the line it starts on in the new content and how many lines it spans.
+    """
+    spans: list[tuple[int, int, str]] = []
+    for old_str, new_str in edits:
+        occurrences = file_content.count(old_str)
+        if occurrences == 0:
+            raise ToolError(
+                f"No replacement was performed, old_str `{old_str}` did not appear verbatim in {path}."
+            )
+        elif occurrences > 1:
+            lines = [
+                idx + 1
+                for idx, line in enumerate(file_content.split("\n"))
+                if old_str in line
+            ]
+            raise ToolError(
+                f"No replacement was performed. Multiple occurrences of old_str `{old_str}` in lines {lines}. Please ensure it is unique"
+            )
+        start = file_content.index(old_str)
+        spans.append((start, start + len(old_str), new_str))
+
+    spans.sort(key=lambda span: span[0])
+    for (_, prev_end, _), (start, _, _) in zip(spans, spans[1:]):
+        if start < prev_end:
+            line = file_content.count("\n", 0, start) + 1
+            raise ToolError(
+                f"No replacement was performed. The edit starting at line {line} overlaps another edit in {path}."
+            )
+
+    parts: list[str] = []
+    positions: list[tuple[int, int]] = []
+    cursor = 0
+    new_line = 0
+    for start, end, new_str in spans:
+        unchanged = file_content[cursor:start]
+        new_line += unchanged.count("\n")
+        parts.append(unchanged)
+        parts.append(new_str)
+        positions.append((new_line, new_str.count("\n")))
+        new_line += new_str.count("\n")
+        cursor = end
+    parts.append(file_content[cursor:])
+    return "".join(parts), positions
+
+
+class MultiStrReplaceMixin:
+    """
+    The multi_str_replace command, shared by the editor tools. Relies on the
+    editor's read_file, write_file, _make_output and _file_history.
+    """
+
+    _file_history: FileHistory
+
+    def multi_str_replace(self, path: Path, edits: list[dict[str, str]]):
+        """Implement the multi_str_replace command, which applies several unique replacements with a single read and write"""
+        pairs: list[tuple[str, str]] = []
+        for edit in edits:
+            if (
+                not isinstance(edit, dict)
+                or not isinstance(edit.get("old_str"), str)
+                or not isinstance(edit.get("new_str", ""), (str, type(None)))
+            ):
+                raise ToolError(
+                    "Invalid `edits`. Each edit should be an object with an `old_str` string and an optional `new_str` string."
+                )
+            new_str = edit.get("new_str")
+            pairs.append(
+                (
+                    edit["old_str"].expandtabs(),
+                    new_str.expandtabs() if new_str is not None else "",
+                )
+            )
+
+        file_content = self.read_file(path).expandtabs()
+        new_file_content, positions = apply_unique_replacements(
+            file_content, pairs, path
+        )
+
+        self.write_file(path, new_file_content)
+        self._file_history.push(path, file_content)
+
+        # Merge the snippet windows of nearby edits so each region is shown once
+        windows: list[list[int]] = []
+        for replacement_line, new_lines in positions:
+            start_line = max(0, replacement_line - SNIPPET_LINES)
+            end_line = replacement_line + SNIPPET_LINES + new_lines
+            if windows and start_line <= windows[-1][1] + 1:
+                windows[-1][1] = max(windows[-1][1], end_line)
+            else:
+                windows.append([start_line, end_line])
+
+        new_file_lines = new_file_content.split("\n")
+        success_msg = f"The file {path} has been edited with {len(pairs)} replacements. "
+        for start_line, end_line in windows:
+            snippet = "\n".join(new_file_lines[start_line : end_line + 1])
+            success_msg += self._make_output(
+                snippet, f"a snippet of {path}", start_line + 1
+            )
+        success_msg += "Review the changes and make sure they are as expected. Edit the file again if necessary."
+
+        return CLIResult(output=success_msg)
+
+
+class MultiEditTool(BaseAnthropicTool):
+    """
+    Offers the editors' multi_str_replace command to the model. The parameters of
+    the Anthropic-defined editor tools can't be extended, so this is a custom tool
+    that runs the command on the editor of the same ToolCollection, whose history
+    (and undo_edit) then covers the batch.
+    """
+
+    name: Literal["multi_str_replace"] = "multi_str_replace"
+
+    def __init__(self, editor: MultiStrReplaceMixin | None = None):
+        self.editor = editor
+        super().__init__()
+
+    def to_params(self) -> Any:
+        return {
+            "name": self.name,
+            "description": (
+                "Apply several exact string replacements to one file in a single step. "
+                "Each old_str must appear exactly once in the file and must not overlap another edit; "
+                "if any edit is invalid the file is left unchanged. Prefer this over several "
+                "str_replace calls when changing more than one place in a file."
+            ),
+            "input_schema": {
+                "type": "object",
+                "properties": {
+                    "path": {
+                        "type": "string",
+                        "description": "Absolute path to the file to edit.",
+                    },
+                    "edits": {
+                        "type": "array",
+                        "minItems": 1,
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "old_str": {"type": "string"},
+                                "new_str": {
+                                    "type": "string",
+                                    "description": "Replacement text; omit to delete old_str.",
+                                },
+                            },
+                            "required": ["old_str"],
+                        },
+                    },
+                },
+                "required": ["path", "edits"],
+            },
+        }
+
+    async def __call__(self, *, path: str, edits: list[dict[str, str]] | None = None, **kwargs):
+        if self.editor is None:
+            raise ToolError(f"The {self.name} tool has no file editor to run on")
+        return await self.editor(command="multi_str_replace", path=path, edits=edits)
+
+
+class EditTool20250124(MultiStrReplaceMixin, BaseAnthropicTool):
     """
     An filesystem editor tool that allows the agent to view, create, and edit files.
     The tool parameters are defined by Anthropic and are not editable.
@@ -31,10 +202,10 @@ class EditTool20250124(BaseAnthropicTool):
     api_type: Literal["text_editor_20250124"] = "text_editor_20250124"
     name: Literal["str_replace_editor"] = "str_replace_editor"
 
-    _file_history: dict[Path, list[str]]
+    _file_history: FileHistory
 
     def __init__(self):
-        self._file_history = defaultdict(list)
+        self._file_history = FileHistory()
         super().__init__()
 
     def to_params(self) -> Any:
@@ -53,6 +224,7 @@ class EditTool20250124(BaseAnthropicTool):
         old_str: str | None = None,
         new_str: str | None = None,
         insert_line: int | None = None,
+        edits: list[dict[str, str]] | None = None,
         **kwargs,
     ):
         _path = Path(path)
@@ -63,7 +235,7 @@ class EditTool20250124(BaseAnthropicTool):
             if file_text is None:
                 raise ToolError("Parameter `file_text` is required for command: create")
             self.write_file(_path, file_text)
-            self._file_history[_path].append(file_text)
+            self._file_history.push(_path, file_text)
             return ToolResult(output=f"File created successfully at: {_path}")
         elif command == "str_replace":
             if old_str is None:
@@ -79,6 +251,12 @@ class EditTool20250124(BaseAnthropicTool):
             if new_str is None:
                 raise ToolError("Parameter `new_str` is required for command: insert")
             return self.insert(_path, insert_line, new_str)
+        elif command == "multi_str_replace":
+            if not edits:
+                raise ToolError(
+                    "Parameter `edits` is required for command: multi_str_replace"
+                )
+            return self.multi_str_replace(_path, edits)
         elif command == "undo_edit":
             return self.undo_edit(_path)
         raise ToolError(
@@ -119,9 +297,8 @@ class EditTool20250124(BaseAnthropicTool):
                     "The `view_range` parameter is not allowed when `path` points to a directory."
                 )
 
-            _, stdout, stderr = await run(
-                rf"find {path} -maxdepth 2 -not -path '*/\.*'"
-            )
+            listing = await asyncio.to_thread(list_directory, str(path))
+            stdout, stderr = listing.output, listing.error
             if not stderr:
                 stdout = f"Here's the files and directories up to 2 levels deep in {path}, excluding hidden items:\n{stdout}\n"
             return CLIResult(output=stdout, error=stderr)
@@ -189,7 +366,7 @@ class EditTool20250124(BaseAnthropicTool):
         self.write_file(path, new_file_content)
 
         # Save the content to history
-        self._file_history[path].append(file_content)
+        self._file_history.push(path, file_content)
 
         # Create a snippet of the edited section
         replacement_line = file_content.split(old_str)[0].count("\n")
@@ -234,7 +411,7 @@ class EditTool20250124(BaseAnthropicTool):
         snippet = "\n".join(snippet_lines)
 
         self.write_file(path, new_file_text)
-        self._file_history[path].append(file_text)
+        self._file_history.push(path, file_text)
 
         success_msg = f"The file {path} has been edited. "
         success_msg += self._make_output(
@@ -247,10 +424,10 @@ class EditTool20250124(BaseAnthropicTool):
 
     def undo_edit(self, path: Path):
         """Implement the undo_edit command."""
-        if not self._file_history[path]:
+        old_text = self._file_history.pop(path)
+        if old_text is None:
             raise ToolError(f"No edit history found for {path}.")
 
-        old_text = self._file_history[path].pop()
         self.write_file(path, old_text)
 
         return CLIResult(
@@ -295,7 +472,7 @@ class EditTool20250124(BaseAnthropicTool):
         )
 
 
-class EditTool20250429(BaseAnthropicTool):
+class EditTool20250429(MultiStrReplaceMixin, BaseAnthropicTool):
     """
     An filesystem editor tool that allows the agent to view, create, and edit files.
     The tool parameters are defined by Anthropic and are not editable.
@@ -304,10 +481,10 @@ class EditTool20250429(BaseAnthropicTool):
     api_type: Literal["str_replace_based_edit_tool"] = "str_replace_based_edit_tool"
     name: Literal["str_replace_based_edit_tool"] = "str_replace_based_edit_tool"
 
-    _file_history: dict[Path, list[str]]
+    _file_history: FileHistory
 
     def __init__(self):
-        self._file_history = defaultdict(list)
+        self._file_history = FileHistory()
         super().__init__()
 
     def to_params(self) -> Any:
@@ -326,6 +503,7 @@ class EditTool20250429(BaseAnthropicTool):
         old_str: str | None = None,
         new_str: str | None = None,
         insert_line: int | None = None,
+        edits: list[dict[str, str]] | None = None,
         **kwargs,
     ):
         _path = Path(path)
@@ -336,7 +514,7 @@ class EditTool20250429(BaseAnthropicTool):
             if file_text is None:
                 raise ToolError("Parameter `file_text` is required for command: create")
             self.write_file(_path, file_text)
-            self._file_history[_path].append(file_text)
+            self._file_history.push(_path, file_text)
             return ToolResult(output=f"File created successfully at: {_path}")
         elif command == "str_replace":
             if old_str is None:
@@ -352,6 +530,12 @@ class EditTool20250429(BaseAnthropicTool):
             if new_str is None:
                 raise ToolError("Parameter `new_str` is required for command: insert")
             return self.insert(_path, insert_line, new_str)
+        elif command == "multi_str_replace":
+            if not edits:
+                raise ToolError(
+                    "Parameter `edits` is required for command: multi_str_replace"
+                )
+            return self.multi_str_replace(_path, edits)
         # Note: undo_edit command was removed in this version
         raise ToolError(
             f'Unrecognized command {command}. The allowed commands for the {self.name} tool are: {", ".join(get_args(Command_20250429))}'
@@ -391,9 +575,8 @@ class EditTool20250429(BaseAnthropicTool):
                     "The `view_range` parameter is not allowed when `path` points to a directory."
                 )
 
-            _, stdout, stderr = await run(
-                rf"find {path} -maxdepth 2 -not -path '*/\.*'"
-            )
+            listing = await asyncio.to_thread(list_directory, str(path))
+            stdout, stderr = listing.output, listing.error
             if not stderr:
                 stdout = f"Here's the files and directories up to 2 levels deep in {path}, excluding hidden items:\n{stdout}\n"
             return CLIResult(output=stdout, error=stderr)
@@ -461,7 +644,7 @@ class EditTool20250429(BaseAnthropicTool):
         self.write_file(path, new_file_content)
 
         # Save the content to history
-        self._file_history[path].append(file_content)
+        self._file_history.push(path, file_content)
 
         # Create a snippet of the edited section
         replacement_line = file_content.split(old_str)[0].count("\n")
@@ -506,7 +689,7 @@ class EditTool20250429(BaseAnthropicTool):
         snippet = "\n".join(snippet_lines)
 
         self.write_file(path, new_file_text)
-        self._file_history[path].append(file_text)
+        self._file_history.push(path, file_text)
 
         success_msg = f"The file {path} has been edited. "
         success_msg += self._make_output(
@@ -4,7 +4,13 @@ from typing import Literal
 from .base import BaseAnthropicTool
 from .bash import BashTool20241022, BashTool20250124
 from .computer import ComputerTool20241022, ComputerTool20250124
-from .edit import EditTool20241022, EditTool20250124, EditTool20250429, EditTool20250728
+from .edit import (
+    EditTool20241022,
+    EditTool20250124,
+    EditTool20250429,
+    EditTool20250728,
+    MultiEditTool,
+)
 
 ToolVersion = Literal[
     "computer_use_20250124", "computer_use_20241022", "computer_use_20250429"
@@ -24,17 +30,17 @@ class ToolGroup:
 TOOL_GROUPS: list[ToolGroup] = [
     ToolGroup(
         version="computer_use_20241022",
-        tools=[ComputerTool20241022, EditTool20241022, BashTool20241022],
+        tools=[ComputerTool20241022, EditTool20241022, MultiEditTool, BashTool20241022],
         beta_flag="computer-use-2024-10-22",
     ),
     ToolGroup(
         version="computer_use_20250124",
-        tools=[ComputerTool20250124, EditTool20250124, BashTool20250124],
+        tools=[ComputerTool20250124, EditTool20250124, MultiEditTool, BashTool20250124],
         beta_flag="computer-use-2025-01-24",
     ),
     ToolGroup(
         version="computer_use_20250429",
-        tools=[ComputerTool20250124, EditTool20250429, BashTool20250124],
+        tools=[ComputerTool20250124, EditTool20250429, MultiEditTool, BashTool20250124],
         beta_flag="computer-use-2025-01-24",
     ),
 ]
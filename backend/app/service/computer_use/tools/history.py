@@ -0,0 +1,155 @@
+"""Memory-bounded undo history for the edit tool."""
+
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+MAX_HISTORY_BYTES: int = 64 * 1024 * 1024
+COMPRESSION_LEVEL: int = 1
+# rough per-entry bookkeeping cost, so many tiny edits still count against the cap
+ENTRY_OVERHEAD: int = 64
+
+
+def _pack(text: str) -> bytes:
+    return zlib.compress(text.encode("utf-8", "surrogatepass"), COMPRESSION_LEVEL)
+
+
+def _unpack(blob: bytes) -> str:
+    return zlib.decompress(blob).decode("utf-8", "surrogatepass")
+
+
+def _common_prefix_len(a: str, b: str) -> int:
+    """Length of the longest common prefix, found by galloping slice comparisons."""
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _common_suffix_len(a: str, b: str, limit: int) -> int:
+    """Length of the longest common suffix, never longer than `limit`."""
+    len_a, len_b = len(a), len(b)
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len_a - mid : len_a - lo] == b[len_b - mid : len_b - lo]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+@dataclass(slots=True)
+class _Entry:
+    """
+    A single previous version of a file.
+
+    The newest entry of a path holds a compressed snapshot. Every older entry is a
+    reverse delta against the entry above it: the text is rebuilt by keeping the
+    first `prefix` and last `suffix` characters of the newer version and putting
+    `blob` in between.
+    """
+
+    blob: bytes
+    is_snapshot: bool
+    prefix: int = 0
+    suffix: int = 0
+
+    @property
+    def size(self) -> int:
+        return len(self.blob) + ENTRY_OVERHEAD
+
+    @classmethod
+    def snapshot(cls, text: str) -> "_Entry":
+        return cls(blob=_pack(text), is_snapshot=True)
+
+    @classmethod
+    def delta(cls, older: str, newer: str) -> "_Entry":
+        prefix = _common_prefix_len(older, newer)
+        limit = min(len(older), len(newer)) - prefix
+        suffix = _common_suffix_len(older, newer, limit)
+        middle = older[prefix : len(older) - suffix]
+        return cls(blob=_pack(middle), is_snapshot=False, prefix=prefix, suffix=suffix)
+
+    def text(self, newer: str | None = None) -> str:
+        if self.is_snapshot:
+            return _unpack(self.blob)
+        assert newer is not None
+        return (
+            newer[: self.prefix] + _unpack(self.blob) + newer[len(newer) - self.suffix :]
+        )
+
+
+class FileHistory:
+    """
+    Per-path undo stacks that keep one compressed snapshot per file plus reverse
+    deltas, under a global byte budget. When the budget is exceeded the oldest
+    entries of the least recently edited paths are dropped first.
+    """
+
+    _stacks: "OrderedDict[Path, list[_Entry]]"
+
+    def __init__(self, max_bytes: int = MAX_HISTORY_BYTES):
+        self._stacks = OrderedDict()
+        self._max_bytes = max_bytes
+        self._size = 0
+
+    @property
+    def size(self) -> int:
+        """Approximate number of bytes held by the history."""
+        return self._size
+
+    def depth(self, path: Path) -> int:
+        """Number of undo steps currently available for `path`."""
+        return len(self._stacks.get(path, ()))
+
+    def push(self, path: Path, text: str):
+        """Record `text` as the version of `path` to restore on the next undo."""
+        stack = self._stacks.setdefault(path, [])
+        self._stacks.move_to_end(path)
+        if stack:
+            top = stack[-1]
+            self._swap(stack, -1, _Entry.delta(top.text(), text))
+        entry = _Entry.snapshot(text)
+        stack.append(entry)
+        self._size += entry.size
+        self._evict(keep=path)
+
+    def pop(self, path: Path) -> str | None:
+        """Remove and return the most recent version of `path`, if any."""
+        stack = self._stacks.get(path)
+        if not stack:
+            return None
+        self._stacks.move_to_end(path)
+        top = stack.pop()
+        self._size -= top.size
+        text = top.text()
+        if stack:
+            self._swap(stack, -1, _Entry.snapshot(stack[-1].text(text)))
+        else:
+            del self._stacks[path]
+        return text
+
+    def clear(self):
+        self._stacks.clear()
+        self._size = 0
+
+    def _swap(self, stack: list[_Entry], index: int, entry: _Entry):
+        self._size += entry.size - stack[index].size
+        stack[index] = entry
+
+    def _evict(self, keep: Path):
+        while self._size > self._max_bytes and self._stacks:
+            path, stack = next(iter(self._stacks.items()))
+            if path == keep and len(stack) == 1:
+                # never drop the edit that was just recorded
+                break
+            oldest = stack.pop(0)
+            self._size -= oldest.size
+            if not stack:
+                del self._stacks[path]
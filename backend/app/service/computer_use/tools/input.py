@@ -0,0 +1,134 @@
+"""Mouse and keyboard input for a display, shared by the computer tool and operators."""
+
+import asyncio
+import shlex
+import time
+from dataclasses import dataclass
+from typing import Literal, TypedDict
+
+from .run import run
+
+TYPING_DELAY_MS = 12
+
+InputEventType = Literal["move", "click", "mouse_down", "mouse_up", "key", "type", "scroll"]
+
+SCROLL_BUTTONS = {"up": 4, "down": 5, "left": 6, "right": 7}
+
+
+class InputEvent(TypedDict, total=False):
+    type: InputEventType
+    x: int
+    y: int
+    button: int
+    repeat: int
+    key: str
+    text: str
+    direction: Literal["up", "down", "left", "right"]
+    amount: int
+
+
+@dataclass(frozen=True)
+class InputResult:
+    type: str
+    ok: bool
+    latency_ms: float
+    error: str | None = None
+
+
+def xdotool_args(event: InputEvent) -> str:
+    """The xdotool command line for one event; moving and clicking is one command."""
+    kind = event.get("type")
+    move = ""
+    if "x" in event or "y" in event:
+        if not isinstance(event.get("x"), int) or not isinstance(event.get("y"), int):
+            raise ValueError(f"{kind} needs both x and y")
+        move = f"mousemove --sync {event['x']} {event['y']} "
+    button = int(event.get("button", 1))
+    if kind == "move":
+        if not move:
+            raise ValueError("move needs x and y")
+        return move.strip()
+    if kind == "click":
+        repeat = int(event.get("repeat", 1))
+        return f"{move}click --repeat {repeat} --delay 10 {button}"
+    if kind in ("mouse_down", "mouse_up"):
+        return f"{move}{kind.replace('_', '')} {button}"
+    if kind == "scroll":
+        if event.get("direction") not in SCROLL_BUTTONS:
+            raise ValueError("scroll direction must be 'up', 'down', 'left' or 'right'")
+        amount = int(event.get("amount", 1))
+        return f"{move}click --repeat {amount} {SCROLL_BUTTONS[event['direction']]}"
+    if kind == "key":
+        if not event.get("key"):
+            raise ValueError("key needs a key")
+        return f"key -- {shlex.quote(event['key'])}"
+    if kind == "type":
+        if "text" not in event:
+            raise ValueError("type needs text")
+        return f"type --delay {TYPING_DELAY_MS} -- {shlex.quote(event['text'])}"
+    raise ValueError(f"Invalid input event type: {kind}")
+
+
+class XdotoolInput:
+    """
+    Sends input to one display with xdotool. There is one instance per display
+    in each process, shared by the agent's computer tool and by operators over
+    /vnc/interact, and it runs one command at a time. When sessions run in the
+    API process (JOB_EXECUTION_MODE "inline") input from the two therefore never
+    interleaves halfway through a drag or a typed word. With worker processes
+    ("process" or "external") the agent has its own instance: each xdotool
+    command is still whole, but an operator batch can land between two of the
+    agent's. Commands run as subprocesses, off the event loop.
+    """
+
+    _by_prefix: dict[str, "XdotoolInput"] = {}
+
+    def __init__(self, display_prefix: str = ""):
+        self.command = f"{display_prefix}xdotool"
+        self._lock: asyncio.Lock | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    @classmethod
+    def shared(cls, display_prefix: str) -> "XdotoolInput":
+        """The input backend of a display, e.g. shared("DISPLAY=:1 ")."""
+        if display_prefix not in cls._by_prefix:
+            cls._by_prefix[display_prefix] = cls(display_prefix)
+        return cls._by_prefix[display_prefix]
+
+    def _guard(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def run(self, args: str, timeout: float | None = 120.0) -> tuple[int, str, str]:
+        """Run `xdotool <args>` in turn with other input to the display."""
+        async with self._guard():
+            return await run(f"{self.command} {args}", timeout=timeout)
+
+    async def run_all(self, commands: list[str], timeout: float | None = 120.0) -> list[tuple[int, str, str]]:
+        """Run several xdotool commands back to back, with no other input between them."""
+        async with self._guard():
+            return [await run(f"{self.command} {args}", timeout=timeout) for args in commands]
+
+    async def send(self, events: list[InputEvent]) -> list[InputResult]:
+        """
+        Run a batch of events in order. Invalid events are rejected before any
+        input is sent; the batch stops at the first event xdotool fails on.
+        """
+        commands = [xdotool_args(event) for event in events]
+        results = []
+        async with self._guard():
+            for event, args in zip(events, commands):
+                started = time.perf_counter()
+                returncode, _, stderr = await run(f"{self.command} {args}")
+                results.append(InputResult(
+                    type=event["type"],
+                    ok=returncode == 0,
+                    latency_ms=round((time.perf_counter() - started) * 1000, 3),
+                    error=(stderr or f"xdotool exited with {returncode}") if returncode else None,
+                ))
+                if returncode:
+                    break
+        return results
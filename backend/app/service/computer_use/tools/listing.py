@@ -0,0 +1,126 @@
+"""In-process directory listing for the edit tool's `view` command."""
+
+import heapq
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from .run import MAX_RESPONSE_LEN, maybe_truncate
+
+MAX_DEPTH: int = 2
+MAX_ENTRIES: int = 2000
+CACHE_TTL: float = 5.0  # seconds
+CACHE_SIZE: int = 32
+
+
+@dataclass(frozen=True)
+class Listing:
+    output: str
+    error: str
+    # (directory, st_mtime_ns) for every directory whose children were read
+    signature: tuple[tuple[str, int], ...]
+
+
+_cache: "OrderedDict[tuple[str, int, int, int | None], tuple[float, Listing]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _walk(root: str, max_depth: int, max_entries: int, truncate_after: int | None):
+    """
+    Pre-order walk that mirrors `find {root} -maxdepth {max_depth} -not -path '*/\\.*'`,
+    stopping as soon as the entry cap or the output budget is reached.
+    """
+    lines = [root]
+    length = len(root) + 1
+    errors: list[str] = []
+    signature: list[tuple[str, int]] = []
+    entries = 0
+    clipped = False
+
+    def visit(directory: str, depth: int):
+        nonlocal length, entries, clipped
+        try:
+            signature.append((directory, os.stat(directory).st_mtime_ns))
+            with os.scandir(directory) as it:
+                # only what can still be listed is kept and sorted, plus one to
+                # tell that the cap cut this directory short
+                children = heapq.nsmallest(
+                    max_entries - entries + 1,
+                    (entry for entry in it if not entry.name.startswith(".")),
+                    key=lambda entry: entry.name,
+                )
+        except OSError as e:
+            errors.append(f"cannot open directory '{directory}': {e.strerror}")
+            return
+
+        for entry in children:
+            if entries >= max_entries or (truncate_after and length > truncate_after):
+                clipped = True
+                return
+            lines.append(entry.path)
+            length += len(entry.path) + 1
+            entries += 1
+            if depth < max_depth:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    visit(entry.path, depth + 1)
+                    if clipped:
+                        return
+
+    visit(root, 1)
+    output = "\n".join(lines)
+    if clipped and entries >= max_entries:
+        output += f"\n<NOTE>Listing stopped after {max_entries} entries.</NOTE>"
+    return (
+        maybe_truncate(output, truncate_after=truncate_after),
+        "\n".join(errors),
+        tuple(signature),
+    )
+
+
+def _is_fresh(listing: Listing) -> bool:
+    try:
+        return all(
+            os.stat(directory).st_mtime_ns == mtime_ns
+            for directory, mtime_ns in listing.signature
+        )
+    except OSError:
+        return False
+
+
+def list_directory(
+    path: str,
+    max_depth: int = MAX_DEPTH,
+    max_entries: int = MAX_ENTRIES,
+    truncate_after: int | None = MAX_RESPONSE_LEN,
+) -> Listing:
+    """
+    List files and directories up to `max_depth` levels below `path`, skipping hidden
+    items. Results are reused for up to CACHE_TTL seconds while none of the listed
+    directories has been modified.
+    """
+    key = (path, max_depth, max_entries, truncate_after)
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached and cached[0] > now and _is_fresh(cached[1]):
+        return cached[1]
+
+    output, error, signature = _walk(path, max_depth, max_entries, truncate_after)
+    listing = Listing(output=output, error=error, signature=signature)
+    with _cache_lock:
+        _cache[key] = (now + CACHE_TTL, listing)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return listing
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
@@ -4,6 +4,9 @@ import asyncio
 
 TRUNCATED_MESSAGE: str = "<response clipped><NOTE>To save on context only part of this file has been shown to you. You should retry this tool after you have searched inside the file with `grep -n` in order to find the line numbers of what you are looking for.</NOTE>"
 MAX_RESPONSE_LEN: int = 16000
+READ_CHUNK_SIZE: int = 64 * 1024
+# a UTF-8 character is at most this many bytes
+MAX_BYTES_PER_CHAR: int = 4
 
 
 def maybe_truncate(content: str, truncate_after: int | None = MAX_RESPONSE_LEN):
@@ -15,22 +18,65 @@ def maybe_truncate(content: str, truncate_after: int | None = MAX_RESPONSE_LEN):
     )
 
 
+async def _read_bounded(
+    stream: asyncio.StreamReader, limit: int | None
+) -> tuple[bytes, int]:
+    """Drain a stream, keeping at most `limit` bytes. Returns the kept bytes and the total size."""
+    kept = bytearray()
+    total = 0
+    while chunk := await stream.read(READ_CHUNK_SIZE):
+        total += len(chunk)
+        if limit is None:
+            kept += chunk
+        elif len(kept) < limit:
+            kept += chunk[: limit - len(kept)]
+    return bytes(kept), total
+
+
+def _decode_bounded(data: bytes, total: int, truncate_after: int | None) -> str:
+    """Decode output collected by _read_bounded, noting the full size if bytes were dropped."""
+    if total == len(data):
+        return maybe_truncate(data.decode(), truncate_after=truncate_after)
+    # the kept bytes may end in the middle of a character
+    content = data.decode(errors="ignore")
+    return (
+        content[:truncate_after]
+        + TRUNCATED_MESSAGE
+        + f"<NOTE>The full output was {total} bytes.</NOTE>"
+    )
+
+
 async def run(
     cmd: str,
     timeout: float | None = 120.0,  # seconds
     truncate_after: int | None = MAX_RESPONSE_LEN,
 ):
-    """Run a shell command asynchronously with a timeout."""
+    """
+    Run a shell command asynchronously with a timeout.
+
+    Output is read incrementally and only the bytes needed to fill `truncate_after`
+    characters are retained, so very chatty commands do not buffer everything in memory.
+    """
     process = await asyncio.create_subprocess_shell(
         cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
     )
+    assert process.stdout
+    assert process.stderr
+    limit = truncate_after * MAX_BYTES_PER_CHAR if truncate_after else None
 
     try:
-        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout)
+        (stdout, stdout_total), (stderr, stderr_total), _ = await asyncio.wait_for(
+            asyncio.gather(
+                _read_bounded(process.stdout, limit),
+                _read_bounded(process.stderr, limit),
+                process.wait(),
+            ),
+            timeout=timeout,
+        )
         return (
             process.returncode or 0,
-            maybe_truncate(stdout.decode(), truncate_after=truncate_after),
-            maybe_truncate(stderr.decode(), truncate_after=truncate_after),
+            _decode_bounded(stdout, stdout_total, truncate_after),
+            _decode_bounded(stderr, stderr_total, truncate_after),
         )
     except asyncio.TimeoutError as exc:
         try:
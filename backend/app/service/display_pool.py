@@ -0,0 +1,415 @@
+"""Virtual X displays leased to agent sessions."""
+
+import asyncio
+import logging
+import os
+import shutil
+import socket
+import tempfile
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import AsyncIterator
+
+import psutil
+
+from app.core.config import settings
+from app.service.computer_use.tools import Display
+
+logger = logging.getLogger(__name__)
+
+SCRIPTS_DIR = Path(__file__).resolve().parents[2] / "scripts"
+# VNC convention: display :n is served on 5900 + n
+VNC_BASE_PORT = 5900
+PROCESS_STOP_SECONDS = 5.0
+# display numbers tried before giving up, e.g. when other processes race us for them
+DISPLAY_START_ATTEMPTS = 3
+
+
+@dataclass
+class Desktop:
+    """A running display and the processes behind it, Xvfb first."""
+
+    # None until Xvfb has reported its display number
+    display: Display | None
+    processes: list[asyncio.subprocess.Process] = field(default_factory=list)
+    # the VNC server, also in processes; restarted on reset
+    vnc: asyncio.subprocess.Process | None = None
+
+
+class DisplayTaken(RuntimeError):
+    pass
+
+
+def _read_display_number(fd: int) -> int:
+    with os.fdopen(fd, "rb") as pipe:
+        line = pipe.readline()
+    if not line.strip():
+        raise DisplayTaken("Xvfb exited before reporting its display")
+    return int(line)
+
+
+def _port_in_use(port: int) -> bool:
+    with socket.socket() as probe:
+        try:
+            probe.bind(("127.0.0.1", port))
+        except OSError:
+            return True
+    return False
+
+
+def free_display_number(first: int, *, taken: set[int] = frozenset()) -> int:
+    """
+    Lowest display number from `first` up that no X server holds and whose VNC port
+    is free, never the shared display or the one whose port is the shared VNC_PORT.
+    """
+    number = first
+    while True:
+        port = VNC_BASE_PORT + number
+        if not (
+            number in taken
+            or number == settings.DISPLAY_NUM
+            or port == settings.VNC_PORT
+            or Path(f"/tmp/.X{number}-lock").exists()
+            or Path(f"/tmp/.X11-unix/X{number}").exists()
+            or _port_in_use(port)
+        ):
+            return number
+        number += 1
+
+
+def _listens_on(pid: int, port: int) -> bool:
+    try:
+        connections = psutil.Process(pid).net_connections(kind="tcp")
+    except psutil.Error:
+        return False
+    return any(c.status == psutil.CONN_LISTEN and c.laddr.port == port for c in connections)
+
+
+def _make_home(number: int) -> str:
+    home = tempfile.mkdtemp(prefix=f"desktop-{number}-")
+    os.mkdir(os.path.join(home, "tmp"))
+    return home
+
+
+def _wipe_home(home: str):
+    """Empty a desktop's home, leaving the directory and its tmp in place."""
+    with os.scandir(home) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path)
+            else:
+                os.unlink(entry.path)
+    os.mkdir(os.path.join(home, "tmp"))
+
+
+def _display_clients(display_name: str, own_pids: set[int]) -> list[psutil.Process]:
+    """Processes drawing on the display other than the desktop itself, e.g. the session's shell and apps."""
+    clients = []
+    for process in psutil.process_iter(["environ"]):
+        # None for processes we may not inspect
+        environ = process.info["environ"] or {}
+        if environ.get("DISPLAY") == display_name and process.pid not in own_pids:
+            clients.append(process)
+    return clients
+
+
+class DesktopLauncher:
+    """Starts desktops like the container's own: Xvfb, mutter, tint2 and x11vnc."""
+
+    def __init__(
+        self,
+        width: int = settings.WIDTH,
+        height: int = settings.HEIGHT,
+        start_timeout: float = settings.DISPLAY_START_TIMEOUT_SECONDS,
+        first_display: int = settings.DISPLAY_POOL_FIRST_DISPLAY,
+    ):
+        self.width = width
+        self.height = height
+        self._start_timeout = start_timeout
+        self._first_display = first_display
+
+    async def start(self) -> Desktop:
+        tried: set[int] = set()
+        for attempt in range(DISPLAY_START_ATTEMPTS):
+            number = free_display_number(self._first_display, taken=tried)
+            tried.add(number)
+            try:
+                return await self._start(number)
+            except DisplayTaken:
+                # another process on the host got there first
+                if attempt == DISPLAY_START_ATTEMPTS - 1:
+                    raise
+                logger.info("Display :%s was taken, trying another", number)
+
+    async def _start(self, number: int) -> Desktop:
+        read_fd, write_fd = os.pipe()
+        try:
+            # Xvfb fails if the display was taken since we looked, e.g. by a
+            # desktop of another worker, and writes the number once it accepts clients
+            xvfb = await asyncio.create_subprocess_exec(
+                "Xvfb", f":{number}", "-displayfd", str(write_fd), "-ac",
+                "-screen", "0", f"{self.width}x{self.height}x24",
+                "-retro", "-dpi", "96", "-nolisten", "tcp",
+                pass_fds=(write_fd,),
+                stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL,
+            )
+        except BaseException:
+            os.close(read_fd)
+            raise
+        finally:
+            os.close(write_fd)
+
+        desktop = Desktop(display=None, processes=[xvfb])
+        try:
+            number = await asyncio.wait_for(
+                asyncio.get_running_loop().run_in_executor(None, _read_display_number, read_fd),
+                timeout=self._start_timeout)
+            home = await asyncio.get_running_loop().run_in_executor(None, _make_home, number)
+            desktop.display = Display(number=number, width=self.width, height=self.height,
+                                      vnc_port=VNC_BASE_PORT + number, home=home)
+            for command in (
+                ["mutter", "--replace", "--sm-disable"],
+                ["tint2", "-c", str(SCRIPTS_DIR / "tint2rc")],
+            ):
+                desktop.processes.append(await self._spawn(desktop, command))
+            await self._start_vnc(desktop)
+        except BaseException:
+            await self.stop(desktop)
+            raise
+        logger.info("Started desktop %s (VNC port %s)", desktop.display.name, desktop.display.vnc_port)
+        return desktop
+
+    async def _spawn(self, desktop: Desktop, command: list[str]) -> asyncio.subprocess.Process:
+        return await asyncio.create_subprocess_exec(
+            *command, env={**desktop.display.env(), "XDG_SESSION_TYPE": "x11"},
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+
+    async def _start_vnc(self, desktop: Desktop):
+        desktop.vnc = await self._spawn(desktop, [
+            "x11vnc", "-display", desktop.display.name, "-forever", "-shared",
+            "-wait", "50", "-rfbport", str(desktop.display.vnc_port), "-nopw"])
+        desktop.processes.append(desktop.vnc)
+        await self._wait_for_port(desktop.display.vnc_port)
+        # something else answering on the port would hand out someone else's desktop
+        if not await asyncio.get_running_loop().run_in_executor(
+                None, _listens_on, desktop.vnc.pid, desktop.display.vnc_port):
+            raise RuntimeError(
+                f"VNC port {desktop.display.vnc_port} is not served by the desktop's x11vnc")
+
+    async def _wait_for_port(self, port: int):
+        deadline = asyncio.get_running_loop().time() + self._start_timeout
+        while True:
+            try:
+                _, writer = await asyncio.open_connection("127.0.0.1", port)
+            except OSError:
+                if asyncio.get_running_loop().time() > deadline:
+                    raise RuntimeError(f"x11vnc did not listen on port {port}")
+                await asyncio.sleep(0.1)
+                continue
+            writer.close()
+            return
+
+    def is_healthy(self, desktop: Desktop) -> bool:
+        return all(process.returncode is None for process in desktop.processes)
+
+    async def reset(self, desktop: Desktop) -> bool:
+        """
+        Undo what the last session left behind: close the programs it opened on the
+        display, empty its home and tmp, and restart the VNC server, which drops the
+        last session's viewers and the clipboard they shared. False if the desktop
+        is not reusable.
+        """
+        loop = asyncio.get_running_loop()
+        own = {process.pid for process in desktop.processes}
+        clients = await loop.run_in_executor(None, _display_clients, desktop.display.name, own)
+        for client in clients:
+            client.terminate()
+        _, alive = await loop.run_in_executor(
+            None, lambda: psutil.wait_procs(clients, timeout=PROCESS_STOP_SECONDS))
+        for client in alive:
+            client.kill()
+        if desktop.display.home is not None:
+            await loop.run_in_executor(None, _wipe_home, desktop.display.home)
+        if desktop.vnc is not None:
+            await self._stop_process(desktop.vnc)
+            desktop.processes.remove(desktop.vnc)
+            desktop.vnc = None
+            await self._start_vnc(desktop)
+        return self.is_healthy(desktop)
+
+    async def stop(self, desktop: Desktop):
+        # clients first, the X server last
+        for process in reversed(desktop.processes):
+            await self._stop_process(process)
+        if desktop.display is not None and desktop.display.home is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                None, lambda: shutil.rmtree(desktop.display.home, ignore_errors=True))
+
+    async def _stop_process(self, process: asyncio.subprocess.Process):
+        if process.returncode is not None:
+            return
+        process.terminate()
+        try:
+            await asyncio.wait_for(process.wait(), PROCESS_STOP_SECONDS)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+
+
+class DisplayPool:
+    """
+    Gives every agent session a desktop of its own, so sessions on one host don't
+    fight over one mouse and screen. At most `size` desktops run in this process;
+    further sessions wait for a lease to end.
+
+    Up to `warm` desktops are kept started and idle by a background replenisher, so
+    a session gets one without waiting for X, the window manager and VNC to come
+    up. Each desktop has its own HOME and TMPDIR. A returned desktop has the
+    programs the session opened on it closed, its home emptied and its VNC server
+    restarted, and is reused if it is still healthy, otherwise it is torn down
+    and replaced.
+
+    With a size of 0 sessions share the container's display and `lease` yields None.
+    """
+
+    def __init__(
+        self,
+        size: int = settings.DISPLAY_POOL_SIZE,
+        launcher: DesktopLauncher | None = None,
+        warm: int = settings.DISPLAY_POOL_WARM,
+        health_interval: float = settings.DISPLAY_POOL_HEALTH_SECONDS,
+    ):
+        self.size = size
+        self.warm = min(warm, size)
+        self._launcher = launcher or DesktopLauncher()
+        self._health_interval = health_interval
+        self._slots: asyncio.Semaphore | None = None
+        self._started: asyncio.Condition | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._idle: deque[Desktop] = deque()
+        self._starting = 0
+        self._launching = 0
+        self._replenish = asyncio.Event()
+        self._replenisher: asyncio.Task | None = None
+        self.leases: dict[int, Display] = {}
+
+    @property
+    def shared(self) -> bool:
+        return self.size == 0
+
+    @property
+    def idle(self) -> int:
+        return len(self._idle)
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.size)
+            self._started = asyncio.Condition()
+        return self._slots
+
+    async def start(self):
+        """Start the replenisher that keeps `warm` desktops ready."""
+        if self.shared or self.warm == 0:
+            return
+        self._semaphore()
+        self._replenish = asyncio.Event()
+        self._replenisher = asyncio.create_task(self._replenish_forever())
+
+    async def stop(self):
+        if self._replenisher is not None:
+            self._replenisher.cancel()
+            await asyncio.gather(self._replenisher, return_exceptions=True)
+            self._replenisher = None
+        while self._idle:
+            await self._launcher.stop(self._idle.popleft())
+
+    @asynccontextmanager
+    async def lease(self, session_id: int) -> AsyncIterator[Display | None]:
+        if self.shared:
+            yield None
+            return
+        async with self._semaphore():
+            desktop = await self._claim()
+            self._replenish.set()
+            self.leases[session_id] = desktop.display
+            try:
+                yield desktop.display
+            finally:
+                del self.leases[session_id]
+                await self._give_back(desktop)
+
+    async def _claim(self) -> Desktop:
+        """
+        An idle desktop, else a new one. When a new one would take this process
+        over `size` because the replenisher is already starting one, wait for that.
+        """
+        while (desktop := await self._take_idle()) is None:
+            if self._running() < self.size:
+                self._launching += 1
+                try:
+                    return await self._launcher.start()
+                finally:
+                    self._launching -= 1
+            async with self._started:
+                await self._started.wait()
+        return desktop
+
+    async def _take_idle(self) -> Desktop | None:
+        while self._idle:
+            desktop = self._idle.popleft()
+            if self._launcher.is_healthy(desktop):
+                return desktop
+            logger.warning("Idle desktop %s died, discarding it", desktop.display.name)
+            await self._launcher.stop(desktop)
+        return None
+
+    async def _give_back(self, desktop: Desktop):
+        if len(self._idle) < self.warm and self._replenisher is not None:
+            try:
+                if await self._launcher.reset(desktop):
+                    self._idle.append(desktop)
+                    return
+            except Exception:
+                logger.exception("Could not reset desktop %s", desktop.display.name)
+        await self._launcher.stop(desktop)
+        self._replenish.set()
+
+    def _running(self) -> int:
+        return len(self.leases) + self._launching + len(self._idle) + self._starting
+
+    def _wanted(self) -> bool:
+        return len(self._idle) + self._starting < self.warm and self._running() < self.size
+
+    async def _replenish_forever(self):
+        while True:
+            for desktop in list(self._idle):
+                if not self._launcher.is_healthy(desktop):
+                    logger.warning("Idle desktop %s died, replacing it", desktop.display.name)
+                    self._idle.remove(desktop)
+                    await self._launcher.stop(desktop)
+            while self._wanted():
+                self._starting += 1
+                try:
+                    desktop = await self._launcher.start()
+                except Exception:
+                    logger.exception("Could not start a warm desktop")
+                    break
+                else:
+                    self._idle.append(desktop)
+                finally:
+                    self._starting -= 1
+                    # leases waiting on this start take the desktop or its room
+                    async with self._started:
+                        self._started.notify_all()
+            self._replenish.clear()
+            try:
+                await asyncio.wait_for(self._replenish.wait(), timeout=self._health_interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+display_pool = DisplayPool()
@@ -0,0 +1,212 @@
+"""Delivery of session events to every worker process."""
+
+import asyncio
+import json
+import logging
+import uuid
+from abc import ABCMeta, abstractmethod
+from typing import Awaitable, Callable
+
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+Dispatch = Callable[[dict], Awaitable[None]]
+
+NOTIFY_CHANNEL = "session_events"
+# postgres rejects NOTIFY payloads of 8000 bytes or more
+MAX_NOTIFY_PAYLOAD = 7900
+LISTENER_HEALTH_CHECK_SECONDS = 30.0
+LISTENER_RECONNECT_DELAY = 1.0
+
+
+class EventRelay(metaclass=ABCMeta):
+    """
+    Carries committed session events (new message, status change, end of session)
+    from the worker that wrote them to the notifier and live streams of every worker.
+    """
+
+    def __init__(self, dispatch: Dispatch):
+        self._dispatch = dispatch
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    @abstractmethod
+    async def publish(self, conn: AsyncConnection, event: dict) -> None:
+        ...
+
+    async def publish_many(self, conn: AsyncConnection, events: list[dict]) -> None:
+        """Publish a batch of events, in order."""
+        for event in events:
+            await self.publish(conn, event)
+
+
+class LocalEventRelay(EventRelay):
+    """Single process deployments, e.g. SQLite: events go straight to this worker's viewers."""
+
+    async def publish(self, conn: AsyncConnection, event: dict) -> None:
+        await self._dispatch(event)
+
+
+class QueueEventRelay(EventRelay):
+    """
+    Session worker processes without postgres: events are handed to the supervising
+    API process over a multiprocessing queue, where the viewers are.
+    """
+
+    def __init__(self, queue):
+        super().__init__(dispatch=None)
+        self._queue = queue
+
+    async def publish(self, conn: AsyncConnection, event: dict) -> None:
+        # returns at once, a feeder thread does the pickling and the pipe write
+        self._queue.put(event)
+
+
+class PostgresEventRelay(EventRelay):
+    """
+    Publishes with NOTIFY on the writer's own connection and fans out from a single
+    LISTEN connection per worker, so viewers can be on any worker behind the load
+    balancer.
+    """
+
+    def __init__(self, dispatch: Dispatch, dsn: str, on_reconnect: Callable[[], None] | None = None):
+        super().__init__(dispatch)
+        self.origin = uuid.uuid4().hex
+        self._dsn = dsn
+        self._on_reconnect = on_reconnect
+        self._queue: asyncio.Queue[dict] | None = None
+        self._tasks: list[asyncio.Task] = []
+
+    async def publish(self, conn: AsyncConnection, event: dict) -> None:
+        # viewers on this worker don't wait for the round trip through postgres
+        await self._dispatch(event)
+        await conn.execute(text("SELECT pg_notify(:channel, :payload)"),
+                           {"channel": NOTIFY_CHANNEL, "payload": self.encode(event)})
+        # notifications are delivered when the transaction commits
+        await conn.commit()
+
+    async def publish_many(self, conn: AsyncConnection, events: list[dict]) -> None:
+        for event in events:
+            await self._dispatch(event)
+        # as few notifications as fit the payload limit, usually one for the whole batch
+        for payload in self.encode_batch(events):
+            await conn.execute(text("SELECT pg_notify(:channel, :payload)"),
+                               {"channel": NOTIFY_CHANNEL, "payload": payload})
+        await conn.commit()
+
+    def encode(self, event: dict) -> str:
+        payload = json.dumps({**event, "origin": self.origin}, default=str)
+        if len(payload.encode()) > MAX_NOTIFY_PAYLOAD and "message" in event:
+            # too big to inline; listeners load the row if anyone there is watching
+            payload = json.dumps({**self._reference(event), "origin": self.origin})
+        return payload
+
+    def encode_batch(self, events: list[dict]) -> list[str]:
+        """Payloads carrying the events in order, each under the NOTIFY limit."""
+        envelope = '{"origin": %s, "events": [%s]}'
+        overhead = len(envelope % (json.dumps(self.origin), ""))
+        payloads: list[str] = []
+        chunk: list[str] = []
+        size = overhead
+        for event in events:
+            item = json.dumps(event, default=str)
+            if overhead + len(item.encode()) > MAX_NOTIFY_PAYLOAD and "message" in event:
+                item = json.dumps(self._reference(event))
+            if chunk and size + len(item.encode()) + 1 > MAX_NOTIFY_PAYLOAD:
+                payloads.append(envelope % (json.dumps(self.origin), ",".join(chunk)))
+                chunk, size = [], overhead
+            chunk.append(item)
+            size += len(item.encode()) + 1
+        if chunk:
+            payloads.append(envelope % (json.dumps(self.origin), ",".join(chunk)))
+        return payloads
+
+    @staticmethod
+    def _reference(event: dict) -> dict:
+        return {key: value for key, value in event.items() if key != "message"}
+
+    def _on_notification(self, connection, pid, channel, payload):
+        event = json.loads(payload)
+        if event.pop("origin", None) == self.origin:
+            # already dispatched when it was published
+            return
+        for single in event.get("events") or [event]:
+            self._queue.put_nowait(single)
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._listen()),
+                       asyncio.create_task(self._drain())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _drain(self):
+        # a single consumer keeps each session's events in order
+        while True:
+            event = await self._queue.get()
+            try:
+                await self._dispatch(event)
+            except Exception:
+                logger.exception("Failed to dispatch session event %s", event)
+
+    async def _listen(self):
+        import asyncpg
+
+        connected_before = False
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self._dsn)
+                lost = asyncio.Event()
+                connection.add_termination_listener(lambda _: lost.set())
+                await connection.add_listener(NOTIFY_CHANNEL, self._on_notification)
+                if connected_before and self._on_reconnect:
+                    # anything published while we were away was missed
+                    self._on_reconnect()
+                connected_before = True
+                while not lost.is_set():
+                    try:
+                        await asyncio.wait_for(lost.wait(), timeout=LISTENER_HEALTH_CHECK_SECONDS)
+                    except asyncio.TimeoutError:
+                        # a silently dropped TCP connection only shows up when used
+                        await connection.execute("SELECT 1")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Session event listener lost its connection: %s", e)
+            finally:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(LISTENER_RECONNECT_DELAY)
+
+
+def listen_dsn(database_url: str) -> str:
+    """asyncpg DSN for a SQLAlchemy URL such as postgresql+asyncpg://..."""
+    return make_url(database_url).set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+def create_event_relay(dispatch: Dispatch, on_reconnect: Callable[[], None] | None = None) -> EventRelay:
+    backend = settings.EVENT_RELAY_BACKEND
+    if backend == "auto":
+        is_postgres = make_url(
+            settings.DATABASE_URL).get_backend_name() == "postgresql"
+        backend = "postgres" if is_postgres else "local"
+    if backend == "postgres":
+        return PostgresEventRelay(dispatch, listen_dsn(settings.DATABASE_URL), on_reconnect)
+    if backend == "local":
+        return LocalEventRelay(dispatch)
+    raise ValueError(
+        f"Unknown event relay backend: {settings.EVENT_RELAY_BACKEND}")
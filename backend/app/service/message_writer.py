@@ -0,0 +1,175 @@
+"""Write-behind persistence of agent messages."""
+
+import asyncio
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+
+from app.api.schemas import MessageCreate
+from app.core.config import settings
+from app.db import crud
+from app.db.database import db_connection
+from app.service.session_events import publish_messages
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _PendingMessage:
+    message: MessageCreate
+    future: asyncio.Future
+
+
+class MessageWriter:
+    """
+    Queues messages from every session on this worker and writes them in batches:
+    one multi-row INSERT and one commit every few milliseconds, on a connection
+    checked out for that batch only. The agent hands a message over and carries on.
+
+    A single task drains the queue in FIFO order, so each session's messages are
+    committed, and announced to viewers, in the order they were submitted. Call
+    `flush(session_id)` before anything that must come after them, e.g. a status
+    change.
+
+    If a batch fails, its messages are retried one at a time, so a row the
+    database rejects fails only its own message.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = settings.MESSAGE_WRITE_INTERVAL_MS / 1000,
+        max_batch: int = settings.MESSAGE_WRITE_BATCH_SIZE,
+        max_pending: int = settings.MESSAGE_WRITE_QUEUE_SIZE,
+    ):
+        self._flush_interval = flush_interval
+        self._max_batch = max_batch
+        self._max_pending = max_pending
+        self._queue: asyncio.Queue[_PendingMessage] | None = None
+        self._task: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        # unwritten messages per session, for flush()
+        self._unwritten: dict[int, set[asyncio.Future]] = defaultdict(set)
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            if self._loop is not loop:
+                self._queue = asyncio.Queue(maxsize=self._max_pending)
+                self._unwritten.clear()
+            self._loop = loop
+            self._task = loop.create_task(self._run())
+
+    async def submit(self, message: MessageCreate) -> asyncio.Future:
+        """
+        Queue a message and return a future for its `CreatedMessage`. Only waits if the queue is
+        full, i.e. the database has fallen far behind.
+        """
+        self._ensure_started()
+        future = self._loop.create_future()
+        unwritten = self._unwritten[message.session_id]
+        unwritten.add(future)
+        future.add_done_callback(
+            lambda f, session_id=message.session_id: self._written(session_id, f))
+        await self._queue.put(_PendingMessage(message=message, future=future))
+        return future
+
+    def _written(self, session_id: int, future: asyncio.Future):
+        if not future.cancelled():
+            # write errors are logged in _write; flush() still raises them
+            future.exception()
+        unwritten = self._unwritten.get(session_id)
+        if unwritten is not None:
+            unwritten.discard(future)
+            if not unwritten:
+                del self._unwritten[session_id]
+
+    async def flush(self, session_id: int | None = None):
+        """Wait until the session's (or every) queued message is committed. Raises the first write error."""
+        if session_id is None:
+            futures = [f for unwritten in self._unwritten.values()
+                       for f in unwritten]
+        else:
+            futures = list(self._unwritten.get(session_id, ()))
+        if futures:
+            await asyncio.gather(*futures)
+
+    async def close(self):
+        """Write out everything still queued and stop."""
+        if self._task is None:
+            return
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Queued messages were lost on shutdown")
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            # group commit: give other sessions a moment to add to this batch
+            await asyncio.sleep(self._flush_interval)
+            while len(batch) < self._max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            await self._write(batch)
+
+    async def _write(self, batch: list[_PendingMessage]):
+        rows = None
+        try:
+            async with db_connection() as conn:
+                rows = await crud.create_messages(conn=conn, messages_data=[item.message for item in batch])
+                # once the batch is committed: one announcement for all of it
+                await self._announce(conn, rows)
+        except Exception as e:
+            if rows is None:
+                written = await self._write_each(batch, e)
+            else:
+                # committed; only giving the connection back failed
+                logger.warning("Error after writing %d messages: %s", len(rows), e)
+        if rows is not None:
+            written = list(zip(batch, rows))
+
+        for item, row in written:
+            if not item.future.done():
+                item.future.set_result(row)
+
+    async def _write_each(self, batch: list[_PendingMessage], error: Exception) -> list[tuple[_PendingMessage, crud.CreatedMessage]]:
+        """After a failed batch, write its messages one at a time so a bad row only fails its own message."""
+        if len(batch) == 1:
+            logger.error("Failed to write a message for session %s", batch[0].message.session_id, exc_info=error)
+            self._fail(batch[0], error)
+            return []
+        logger.warning("Failed to write a batch of %d messages, retrying them one at a time: %s", len(batch), error)
+        written = []
+        for item in batch:
+            try:
+                async with db_connection() as conn:
+                    rows = await crud.create_messages(conn=conn, messages_data=[item.message])
+            except Exception as e:
+                logger.exception("Failed to write a message for session %s", item.message.session_id)
+                self._fail(item, e)
+            else:
+                written.append((item, rows[0]))
+        if written:
+            try:
+                async with db_connection() as conn:
+                    await self._announce(conn, [row for _, row in written])
+            except Exception:
+                logger.exception("Failed to announce %d new messages", len(written))
+        return written
+
+    @staticmethod
+    async def _announce(conn, rows: list[crud.CreatedMessage]):
+        try:
+            await publish_messages(conn, rows)
+        except Exception:
+            # the rows are committed; viewers catch up on their next resync
+            logger.exception("Failed to announce %d new messages", len(rows))
+
+    @staticmethod
+    def _fail(item: _PendingMessage, error: Exception):
+        if not item.future.done():
+            item.future.set_exception(error)
+
+message_writer = MessageWriter()
@@ -0,0 +1,193 @@
+"""Agent sessions in worker processes, supervised by the API process."""
+
+import asyncio
+import logging
+import multiprocessing
+import multiprocessing.synchronize
+import queue
+import signal
+
+from app.core.config import settings
+from app.db.database import engine
+from app.service import session_events
+from app.service.blob_store import require_shared_blob_store
+from app.service.event_relay import LocalEventRelay, QueueEventRelay
+from app.service.message_writer import message_writer
+from app.service.worker_pool import RunJob, SessionWorkerPool, run_session_job
+
+logger = logging.getLogger(__name__)
+
+PROCESS_CHECK_SECONDS = 1.0
+PROCESS_SHUTDOWN_SECONDS = 30.0
+# how long a relay read blocks before checking whether the workers are gone
+EVENT_POLL_SECONDS = 0.5
+
+
+def run_worker_process(events, stop, size: int, run_job: RunJob):
+    """Entry point of a worker process: its own event loop, pool and tool state."""
+    # Ctrl+C reaches the whole process group; the supervisor decides when we stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_serve(events, stop, size, run_job))
+
+
+async def _serve(events, stop, size: int, run_job: RunJob):
+    if isinstance(session_events.event_relay, LocalEventRelay):
+        # nobody watches sessions here; send events to the API process instead
+        session_events.event_relay = QueueEventRelay(events)
+
+    pool = SessionWorkerPool(run_job=run_job, size=size)
+    await pool.start()
+    await asyncio.get_running_loop().run_in_executor(None, stop.wait)
+    await pool.stop()
+    await message_writer.close()
+    await engine.dispose()
+
+
+class SessionProcessSupervisor:
+    """
+    Runs `processes` worker processes that claim sessions from the job queue, so
+    screenshot encoding, serialization and blocking SDK calls never hold up the
+    API's event loop. Per-provider limits apply within each process.
+
+    Session events come back over a queue unless postgres LISTEN/NOTIFY already
+    carries them, and are applied to this process's viewers in arrival order. A
+    process that dies is replaced; its sessions are picked up again once their
+    lease expires.
+    """
+
+    def __init__(
+        self,
+        processes: int = settings.JOB_PROCESSES,
+        size: int = settings.JOB_WORKERS,
+        run_job: RunJob = run_session_job,
+        dispatch=session_events.dispatch,
+    ):
+        self._process_count = processes
+        self._size = size
+        self._run_job = run_job
+        self._dispatch = dispatch
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: list[multiprocessing.Process] = []
+        # one stop event per process: setting an event that a killed process
+        # was waiting on blocks forever
+        self._stop_events: dict[int, multiprocessing.synchronize.Event] = {}
+        self._stopping = False
+        self._events = None
+        self._stopped = False
+        self._relayer: asyncio.Task | None = None
+        self._watcher: asyncio.Task | None = None
+
+    @property
+    def pids(self) -> list[int]:
+        return [process.pid for process in self._processes if process.is_alive()]
+
+    def wake(self):
+        # worker processes find new jobs on their next poll
+        pass
+
+    async def start(self):
+        self._events = self._context.Queue()
+        self._stopping = False
+        self._stopped = False
+        self._processes = [self._spawn() for _ in range(self._process_count)]
+        self._relayer = asyncio.create_task(self._relay())
+        self._watcher = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        """Ask every worker to hand its sessions back, wait for them, then apply their last events."""
+        self._stopping = True
+        for process in self._processes:
+            if process.is_alive():
+                self._stop_events[process.pid].set()
+        self._watcher.cancel()
+        await asyncio.gather(self._watcher, return_exceptions=True)
+        await asyncio.get_running_loop().run_in_executor(None, self._join)
+        self._stopped = True
+        await self._relayer
+        self._processes = []
+        self._stop_events = {}
+
+    def _spawn(self) -> multiprocessing.Process:
+        stop = self._context.Event()
+        process = self._context.Process(
+            target=run_worker_process,
+            args=(self._events, stop, self._size, self._run_job),
+            name="session-worker",
+        )
+        process.start()
+        self._stop_events[process.pid] = stop
+        logger.info("Started session worker process %s", process.pid)
+        return process
+
+    def _join(self):
+        for process in self._processes:
+            process.join(PROCESS_SHUTDOWN_SECONDS)
+            if process.is_alive():
+                logger.warning("Session worker %s did not stop, terminating it", process.pid)
+                process.terminate()
+                process.join()
+
+    def _next_event(self) -> dict | None:
+        try:
+            return self._events.get(timeout=EVENT_POLL_SECONDS)
+        except queue.Empty:
+            return None
+
+    async def _relay(self):
+        # a single consumer keeps each session's events in order
+        loop = asyncio.get_running_loop()
+        while True:
+            event = await loop.run_in_executor(None, self._next_event)
+            if event is not None:
+                await self._apply(event)
+            elif self._stopped:
+                # the workers have exited and their queue is drained
+                return
+
+    async def _apply(self, event: dict):
+        try:
+            await self._dispatch(event)
+        except Exception:
+            logger.exception("Failed to dispatch session event %s", event)
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(PROCESS_CHECK_SECONDS)
+            for index, process in enumerate(self._processes):
+                if not process.is_alive() and not self._stopping:
+                    logger.warning("Session worker %s exited with code %s, replacing it",
+                                   process.pid, process.exitcode)
+                    self._stop_events.pop(process.pid, None)
+                    self._processes[index] = self._spawn()
+
+
+class ExternalWorkers:
+    """Sessions run on standalone workers (worker.py); the API only queues them."""
+
+    def wake(self):
+        pass
+
+    async def start(self):
+        require_shared_blob_store()
+        if not session_events.events_reach_this_process():
+            logger.warning(
+                "Standalone workers can't deliver session events to the API without postgres: "
+                "polls and ETags read the database on every request and live streams get no "
+                "new events. Use a postgres DATABASE_URL for live updates.")
+
+    async def stop(self):
+        pass
+
+
+def create_session_runner() -> SessionWorkerPool | SessionProcessSupervisor | ExternalWorkers:
+    mode = settings.JOB_EXECUTION_MODE
+    if mode == "inline":
+        return SessionWorkerPool()
+    if mode == "process":
+        return SessionProcessSupervisor()
+    if mode == "external":
+        return ExternalWorkers()
+    raise ValueError(f"Unknown job execution mode: {mode}")
+
+
+session_runner = create_session_runner()
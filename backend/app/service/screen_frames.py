@@ -0,0 +1,197 @@
+"""Cached captures of the screens of X displays, shared by everyone watching them."""
+
+import asyncio
+import base64
+import hashlib
+import io
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from functools import cached_property
+from typing import AsyncIterator, Callable
+
+from PIL import Image, ImageGrab
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+Capture = Callable[[str], Image.Image]
+# pause after a failed capture before the stream tries again
+STREAM_RETRY_SECONDS = 1.0
+
+
+def grab_display(display_name: str) -> Image.Image:
+    """Capture a whole X display; blocks, so it runs in a thread."""
+    return ImageGrab.grab(xdisplay=display_name)
+
+
+@dataclass
+class Frame:
+    """
+    One capture of a screen. Encodings are made once, by whoever asks first;
+    callers in other threads asking meanwhile wait for that encoding.
+    """
+
+    image: Image.Image = field(repr=False)
+    captured_at: datetime
+    # time.monotonic() of the capture, to judge freshness
+    taken: float
+    _png: bytes | None = field(default=None, repr=False)
+    _jpegs: dict[int, bytes] = field(default_factory=dict, repr=False)
+    _encoding: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.taken
+
+    @property
+    def png(self) -> bytes:
+        """The frame as PNG; blocks the first time, so call it in a thread."""
+        with self._encoding:
+            if self._png is None:
+                output = io.BytesIO()
+                self.image.save(output, format="PNG")
+                self._png = output.getvalue()
+            return self._png
+
+    @cached_property
+    def base64(self) -> str:
+        return base64.b64encode(self.png).decode()
+
+    @cached_property
+    def digest(self) -> bytes:
+        """Hash of the pixels: equal for two captures of an unchanged screen."""
+        return hashlib.blake2b(self.image.tobytes(), digest_size=16).digest()
+
+    def jpeg(self, quality: int) -> bytes:
+        """The frame as JPEG, encoded once per quality; blocks, so call it in a thread."""
+        with self._encoding:
+            if quality not in self._jpegs:
+                output = io.BytesIO()
+                self.image.convert("RGB").save(output, format="JPEG", quality=quality)
+                self._jpegs[quality] = output.getvalue()
+            return self._jpegs[quality]
+
+
+class FrameSource:
+    """
+    The screen of one display. A frame younger than `max_age` is handed to every
+    caller as is; otherwise one capture is started and callers that arrive while
+    it runs wait for that same capture instead of starting their own. Capturing
+    happens in a thread, off the event loop; encoding is left to whoever needs an
+    encoding, e.g. PNG for /vnc/screenshot and JPEG for /vnc/stream.
+
+    Live viewers share one capture loop, running at `fps` while anyone watches,
+    and are only handed a frame when the screen has changed.
+    """
+
+    def __init__(
+        self,
+        display_name: str,
+        capture: Capture = grab_display,
+        max_age: float = settings.SCREENSHOT_MAX_AGE_SECONDS,
+        fps: float = settings.STREAM_FPS,
+    ):
+        self.display_name = display_name
+        self.max_age = max_age
+        self.fps = fps
+        self._capture = capture
+        self._frame: Frame | None = None
+        self._in_flight: asyncio.Future | None = None
+        self.captures = 0
+        self.viewers = 0
+        self._watcher: asyncio.Task | None = None
+        self._changed: asyncio.Condition | None = None
+        # the last frame that differed from the one before, and how many there were
+        self._shown: Frame | None = None
+        self._version = 0
+
+    async def frame(self, max_age: float | None = None) -> Frame:
+        max_age = self.max_age if max_age is None else max_age
+        if self._frame is not None and self._frame.age <= max_age:
+            return self._frame
+        loop = asyncio.get_running_loop()
+        if self._in_flight is None or self._in_flight.get_loop() is not loop:
+            self._in_flight = loop.create_task(self._take())
+        # shielded: one caller going away doesn't cancel the capture for the others
+        return await asyncio.shield(self._in_flight)
+
+    async def _take(self) -> Frame:
+        try:
+            frame = await asyncio.get_running_loop().run_in_executor(None, self._capture_frame)
+            self._frame = frame
+            return frame
+        finally:
+            self._in_flight = None
+
+    def _capture_frame(self) -> Frame:
+        self.captures += 1
+        image = self._capture(self.display_name)
+        frame = Frame(image=image, captured_at=datetime.now(timezone.utc), taken=time.monotonic())
+        # worked out here, in the capture thread, since live viewers compare every frame
+        frame.digest
+        return frame
+
+    async def changes(self, fps: float | None = None) -> AsyncIterator[Frame]:
+        """
+        The current frame, then each new one as the screen changes, at most `fps`
+        a second; a viewer slower than the screen skips to the latest frame.
+        """
+        interval = 1 / min(fps or self.fps, self.fps)
+        loop = asyncio.get_running_loop()
+        if self._watcher is None or self._watcher.get_loop() is not loop:
+            self._changed = asyncio.Condition()
+            # whatever was on screen when the last viewer left is stale by now
+            self._shown = None
+            self._watcher = loop.create_task(self._watch())
+        self.viewers += 1
+        seen = None
+        try:
+            while True:
+                async with self._changed:
+                    await self._changed.wait_for(lambda: self._shown is not None and self._version != seen)
+                    seen = self._version
+                    frame = self._shown
+                yield frame
+                await asyncio.sleep(interval)
+        finally:
+            self.viewers -= 1
+            if self.viewers == 0 and self._watcher is not None:
+                self._watcher.cancel()
+                self._watcher = None
+
+    async def _watch(self):
+        interval = 1 / self.fps
+        while True:
+            started = time.monotonic()
+            try:
+                frame = await self.frame(max_age=interval)
+            except Exception:
+                logger.exception("Could not capture %s", self.display_name)
+                await asyncio.sleep(STREAM_RETRY_SECONDS)
+                continue
+            if self._shown is None or frame.digest != self._shown.digest:
+                async with self._changed:
+                    self._shown = frame
+                    self._version += 1
+                    self._changed.notify_all()
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+class ScreenFrames:
+    """One FrameSource per display, made on first use."""
+
+    def __init__(self, capture: Capture = grab_display):
+        self._capture = capture
+        self._sources: dict[str, FrameSource] = {}
+
+    def source(self, display_name: str) -> FrameSource:
+        if display_name not in self._sources:
+            self._sources[display_name] = FrameSource(display_name, capture=self._capture)
+        return self._sources[display_name]
+
+
+screen_frames = ScreenFrames()
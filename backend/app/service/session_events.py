@@ -0,0 +1,90 @@
+"""Single entry point for announcing persisted session changes to live viewers."""
+
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.api.schemas import Message
+from app.core.config import settings
+from app.db import crud
+from app.db.database import db_connection
+from app.service.event_relay import LocalEventRelay, create_event_relay
+from app.service.session_notifier import session_notifier
+from app.service.stream_manager import stream_manager
+
+
+def message_event_data(message: dict | crud.CreatedMessage) -> dict:
+    # screenshots travel as /images/{hash} references, never inline
+    return Message.model_validate(message, from_attributes=True).model_dump(mode="json", exclude={"base64_image"})
+
+
+async def _load_message(session_id: int, message_id: int) -> dict | None:
+    # only worth a query if someone on this worker is watching the session
+    stream = stream_manager.get_stream(session_id)
+    if stream is None or stream.subscriber_count == 0:
+        return None
+    async with db_connection() as conn:
+        message = await crud.get_message_by_id(conn=conn, message_id=message_id)
+    return message_event_data(message) if message else None
+
+
+async def dispatch(event: dict):
+    """Apply a session event, from this worker or another one, to this worker's viewers."""
+    session_id = event["session_id"]
+    if event["type"] == "message":
+        session_notifier.publish(session_id, message_id=event["message_id"])
+        message = event.get("message") or await _load_message(session_id, event["message_id"])
+        if message is not None:
+            stream_manager.publish(session_id, "message", message)
+    elif event["type"] == "status":
+        session_notifier.publish(session_id, status=event["status"])
+        # only the latest status matters to a viewer that has fallen behind
+        stream_manager.publish(session_id, "status", {
+                               "status": event["status"]}, coalesce_key="status")
+    elif event["type"] == "end":
+        stream_manager.close_stream(session_id)
+
+
+def _resync_after_outage():
+    # events may have been missed: parked long polls are woken to seed their
+    # session from the database again and live viewers are told they lagged
+    session_notifier.reset()
+    stream_manager.mark_all_lagged()
+
+
+event_relay = create_event_relay(dispatch, on_reconnect=_resync_after_outage)
+
+
+def events_reach_this_process() -> bool:
+    """
+    False when sessions run on standalone workers and the relay is local (SQLite):
+    their events never leave the worker, so this process's notifier and streams
+    don't hear of new messages and readers have to ask the database instead.
+    """
+    return not (settings.JOB_EXECUTION_MODE == "external" and isinstance(event_relay, LocalEventRelay))
+
+
+def _message_event(session_id: int, message: crud.CreatedMessage) -> dict:
+    return {
+        "session_id": session_id,
+        "type": "message",
+        "message_id": message.id,
+        "message": message_event_data(message),
+    }
+
+
+async def publish_message(conn: AsyncConnection, session_id: int, message: crud.CreatedMessage):
+    """Call after the message row is committed."""
+    await event_relay.publish(conn, _message_event(session_id, message))
+
+
+async def publish_messages(conn: AsyncConnection, messages: list[crud.CreatedMessage]):
+    """Call after the message rows are committed; the batch goes out in one notification where it fits."""
+    await event_relay.publish_many(conn, [_message_event(message.session_id, message) for message in messages])
+
+
+async def publish_status(conn: AsyncConnection, session_id: int, status: str):
+    """Call after the status update is committed."""
+    await event_relay.publish(conn, {"session_id": session_id, "type": "status", "status": status})
+
+
+async def end_session_stream(conn: AsyncConnection, session_id: int):
+    await event_relay.publish(conn, {"session_id": session_id, "type": "end"})
@@ -0,0 +1,109 @@
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+
+
+@dataclass(frozen=True)
+class SessionState:
+    last_message_id: int | None
+    status: str | None
+
+    def is_newer_than(self, after_id: int | None, status: str | None) -> bool:
+        """True if a client that has seen `after_id` and `status` is out of date."""
+        if self.status != status:
+            return True
+        if self.last_message_id is None:
+            return False
+        return after_id is None or self.last_message_id > after_id
+
+
+# returned by `wait` when the session's state was dropped while it waited, e.g. by
+# `reset`: the caller seeds it from the database again rather than waiting it out
+DROPPED = SessionState(last_message_id=None, status=None)
+
+
+class SessionNotifier:
+    """
+    In-process record of the newest message id and status of each session, with
+    waiters that are woken whenever the agent persists something new. Lets long-poll
+    requests park without touching the database while a session is idle.
+    """
+
+    def __init__(self, max_sessions: int = 1024):
+        self._states: OrderedDict[int, SessionState] = OrderedDict()
+        self._events: dict[int, asyncio.Event] = {}
+        self._max_sessions = max_sessions
+
+    def get(self, session_id: int) -> SessionState | None:
+        return self._states.get(session_id)
+
+    def seed(self, session_id: int, last_message_id: int | None, status: str | None) -> SessionState:
+        """Record state read from the database, unless a fresher publish already did."""
+        state = self._states.get(session_id)
+        if state is None:
+            state = SessionState(last_message_id=last_message_id, status=status)
+            self._store(session_id, state)
+        return state
+
+    def publish(self, session_id: int, *, message_id: int | None = None, status: str | None = None):
+        """Record a committed message and/or status change and wake the session's waiters."""
+        state = self._states.get(session_id) or SessionState(
+            last_message_id=None, status=None)
+        if message_id is not None and (state.last_message_id is None or message_id > state.last_message_id):
+            state = replace(state, last_message_id=message_id)
+        if status is not None:
+            state = replace(state, status=status)
+        self._store(session_id, state)
+
+        if event := self._events.pop(session_id, None):
+            event.set()
+
+    async def wait(
+        self, session_id: int, after_id: int | None, status: str | None, timeout: float
+    ) -> SessionState | None:
+        """
+        Wait until the session moves past (`after_id`, `status`). Returns None on
+        timeout and DROPPED if the session's state was dropped while waiting.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        woken = False
+        while True:
+            state = self._states.get(session_id)
+            if state is None and woken:
+                return DROPPED
+            if state is not None and state.is_newer_than(after_id, status):
+                return state
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+            event = self._events.setdefault(session_id, asyncio.Event())
+            try:
+                await asyncio.wait_for(event.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                return None
+            woken = True
+
+    def forget(self, session_id: int):
+        self._states.pop(session_id, None)
+        if event := self._events.pop(session_id, None):
+            event.set()
+
+    def reset(self):
+        """Drop every recorded state, e.g. after updates may have been missed."""
+        self._states.clear()
+        for event in self._events.values():
+            event.set()
+        self._events.clear()
+
+    def _store(self, session_id: int, state: SessionState):
+        self._states[session_id] = state
+        self._states.move_to_end(session_id)
+        while len(self._states) > self._max_sessions:
+            oldest, _ = self._states.popitem(last=False)
+            # a dropped session is re-seeded from the database on its next poll
+            if event := self._events.pop(oldest, None):
+                event.set()
+
+
+session_notifier = SessionNotifier()
@@ -1,92 +1,299 @@
 import asyncio
 import json
-from typing import Dict
+from collections import deque
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Dict
 from fastapi import HTTPException, Request
-from fastapi.responses import StreamingResponse
+
+from app.core.config import settings
+
+
+class SlowConsumerPolicy(str, Enum):
+    # a full queue loses its oldest events
+    DROP_OLDEST = "drop_oldest"
+    # a newer event replaces a queued one with the same coalesce key (e.g. status)
+    # before anything is dropped
+    COALESCE = "coalesce"
+
+
+@dataclass(frozen=True)
+class StreamEvent:
+    id: int | None
+    type: str
+    data: Any
+    coalesce_key: str | None = None
+
+    def to_sse(self) -> str:
+        payload = self.data if isinstance(
+            self.data, str) else json.dumps(self.data, default=str)
+        lines = [f"id: {self.id}"] if self.id is not None else []
+        lines.append(f"event: {self.type}")
+        lines.extend(f"data: {line}" for line in payload.split("\n"))
+        return "\n".join(lines) + "\n\n"
+
+
+@dataclass
+class StreamStats:
+    published: int = 0
+    delivered: int = 0
+    dropped: int = 0
+    coalesced: int = 0
+    max_queue_depth: int = 0
+
+
+class Subscriber:
+    """One viewer's bounded view of a session stream."""
+
+    def __init__(self, stats: StreamStats, max_queue: int, policy: SlowConsumerPolicy):
+        self._queue: deque[StreamEvent] = deque()
+        self._wakeup = asyncio.Event()
+        self._stats = stats
+        self._max_queue = max_queue
+        self._policy = policy
+        # events lost since the subscriber was last told about it
+        self._lagged = 0
+        self.closed = False
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def offer(self, event: StreamEvent):
+        if self.closed:
+            return
+        if self._policy is SlowConsumerPolicy.COALESCE and event.coalesce_key is not None:
+            for queued in self._queue:
+                if queued.coalesce_key == event.coalesce_key:
+                    self._queue.remove(queued)
+                    self._stats.coalesced += 1
+                    break
+        if len(self._queue) >= self._max_queue:
+            self._queue.popleft()
+            self._stats.dropped += 1
+            self._lagged += 1
+        self._queue.append(event)
+        self._stats.max_queue_depth = max(
+            self._stats.max_queue_depth, len(self._queue))
+        self._wakeup.set()
+
+    def mark_lagged(self, missed: int):
+        self._lagged += max(missed, 1)
+        self._wakeup.set()
+
+    def close(self):
+        self.closed = True
+        self._wakeup.set()
+
+    async def get(self, timeout: float | None = None) -> StreamEvent | None:
+        """
+        Next event, or None on timeout or once the stream is closed and drained. A
+        subscriber that lost events gets a `lagged` event first so it can resync.
+        """
+        while not self._queue and not self._lagged:
+            if self.closed:
+                return None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                return None
+
+        if self._lagged:
+            missed, self._lagged = self._lagged, 0
+            return StreamEvent(id=None, type="lagged", data={"dropped": missed})
+        self._stats.delivered += 1
+        return self._queue.popleft()
+
+
+class SessionStream:
+    """
+    Fan-out hub for a single session. Every subscriber has its own bounded queue, so
+    a slow viewer only loses its own events, and recent events are kept in a ring so
+    a reconnecting viewer can pick up from the last id it saw.
+    """
+
+    def __init__(self, session_id: int, max_queue: int, replay_size: int, policy: SlowConsumerPolicy):
+        self.session_id = session_id
+        self.stats = StreamStats()
+        self.closed = False
+        self._max_queue = max_queue
+        self._policy = policy
+        self._ring: deque[StreamEvent] = deque(maxlen=replay_size)
+        self._subscribers: set[Subscriber] = set()
+        self._next_id = 1
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, event_type: str, data: Any, coalesce_key: str | None = None) -> StreamEvent:
+        event = StreamEvent(id=self._next_id, type=event_type,
+                            data=data, coalesce_key=coalesce_key)
+        self._next_id += 1
+        self._ring.append(event)
+        self.stats.published += 1
+        for subscriber in self._subscribers:
+            subscriber.offer(event)
+        return event
+
+    def subscribe(self, last_event_id: int | None = None) -> Subscriber:
+        subscriber = Subscriber(self.stats, self._max_queue, self._policy)
+        if last_event_id is not None:
+            oldest = self._ring[0].id if self._ring else self._next_id
+            if last_event_id >= self._next_id or oldest > last_event_id + 1:
+                # the id is from another stream or older than the ring
+                subscriber.mark_lagged(oldest - last_event_id - 1)
+            for event in self._ring:
+                if event.id > last_event_id:
+                    subscriber.offer(event)
+        if self.closed:
+            subscriber.close()
+        else:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+        subscriber.close()
+
+    def mark_lagged(self):
+        for subscriber in self._subscribers:
+            subscriber.mark_lagged(0)
+
+    def close(self):
+        self.closed = True
+        for subscriber in self._subscribers:
+            subscriber.close()
+        self._subscribers.clear()
+
+    def metrics(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "queued": sum(subscriber.depth for subscriber in self._subscribers),
+            "replayable": len(self._ring),
+            "published": self.stats.published,
+            "delivered": self.stats.delivered,
+            "dropped": self.stats.dropped,
+            "coalesced": self.stats.coalesced,
+            "max_queue_depth": self.stats.max_queue_depth,
+        }
 
 
 class StreamManager:
-    def __init__(self):
-        self.streams: Dict[int, asyncio.Queue] = {}
+    def __init__(
+        self,
+        max_queue: int = settings.STREAM_QUEUE_SIZE,
+        replay_size: int = settings.STREAM_REPLAY_SIZE,
+        policy: str = settings.STREAM_SLOW_CONSUMER_POLICY,
+        max_streams: int = 1024,
+    ):
+        self.streams: Dict[int, SessionStream] = {}
+        self._max_queue = max_queue
+        self._replay_size = replay_size
+        self._policy = SlowConsumerPolicy(policy)
+        self._max_streams = max_streams
+
+    def _get_or_create(self, session_id: int) -> SessionStream:
+        stream = self.streams.get(session_id)
+        if stream is None:
+            stream = SessionStream(
+                session_id, self._max_queue, self._replay_size, self._policy)
+            self.streams[session_id] = stream
+            self._evict_idle()
+        return stream
 
-    def create_stream(self, session_id: int):
+    def _evict_idle(self):
+        # oldest streams nobody is watching go first
+        for session_id in list(self.streams):
+            if len(self.streams) <= self._max_streams:
+                break
+            if self.streams[session_id].subscriber_count == 0:
+                self.close_stream(session_id)
+
+    def create_stream(self, session_id: int) -> SessionStream:
         if session_id not in self.streams:
-            self.streams[session_id] = asyncio.Queue()
             print(f"Stream created for session_id: {session_id}")
         else:
             print(f"Stream already exists for session_id: {session_id}")
+        return self._get_or_create(session_id)
+
+    def publish(self, session_id: int, event_type: str, data: Any, coalesce_key: str | None = None) -> StreamEvent:
+        return self._get_or_create(session_id).publish(event_type, data, coalesce_key)
 
     async def send_message(self, session_id: int, message: str):
-        print(f"🔧 [STREAM] send_message called for session {session_id}")
-        if queue := self.streams.get(session_id):
-            print(
-                f"✅ [STREAM] Queue found for session {session_id}, putting message")
-            await queue.put(message)
-            print(f"✅ [STREAM] Message queued for session {session_id}")
+        if stream := self.streams.get(session_id):
+            stream.publish("message", message)
         else:
-            print(f"❌ [STREAM] No queue found for session {session_id}")
+            print(f"❌ [STREAM] No stream found for session {session_id}")
 
-    def get_stream(self, session_id: int) -> asyncio.Queue | None:
+    def get_stream(self, session_id: int) -> SessionStream | None:
         return self.streams.get(session_id)
 
+    def subscribe(self, session_id: int, last_event_id: int | None = None) -> Subscriber:
+        return self._get_or_create(session_id).subscribe(last_event_id)
+
+    def unsubscribe(self, session_id: int, subscriber: Subscriber):
+        if stream := self.streams.get(session_id):
+            stream.unsubscribe(subscriber)
+        else:
+            subscriber.close()
+
+    def mark_all_lagged(self):
+        """Tell every subscriber it may have missed events, so it resyncs."""
+        for stream in self.streams.values():
+            stream.mark_lagged()
+
     def close_stream(self, session_id: int):
-        # The main cleanup is to remove the queue from the dictionary
-        if session_id in self.streams:
-            del self.streams[session_id]
+        # subscribers drain what is already queued, then see the end of the stream
+        if stream := self.streams.pop(session_id, None):
+            stream.close()
             print(f"Stream closed for session_id: {session_id}")
 
+    def metrics(self) -> dict:
+        sessions = {session_id: stream.metrics()
+                    for session_id, stream in self.streams.items()}
+        return {
+            "streams": len(sessions),
+            "subscribers": sum(m["subscribers"] for m in sessions.values()),
+            "dropped": sum(m["dropped"] for m in sessions.values()),
+            "sessions": sessions,
+        }
+
 
 stream_manager = StreamManager()
 
 
-async def stream_generator(session_id: int, request: Request):
+def parse_last_event_id(value: str | None) -> int | None:
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+async def stream_generator(session_id: int, request: Request, last_event_id: int | None = None):
     print(f"🔗 [STREAM] Starting stream generator for session {session_id}")
-    queue = stream_manager.get_stream(session_id)
+    stream = stream_manager.get_stream(session_id)
 
-    if not queue:
+    if not stream:
         print(f"❌ [STREAM] No stream found for session {session_id}")
         raise HTTPException(status_code=404, detail="Stream not found")
 
-    print(f"✅ [STREAM] Stream found for session {session_id}, starting loop")
+    subscriber = stream.subscribe(last_event_id)
     try:
         while True:
-            # Check if the client has closed the connection
-            # Note: request.client.is_connected may not be available in all FastAPI versions
-            try:
-                if hasattr(request.client, 'is_connected') and not request.client.is_connected:
-                    break
-            except AttributeError:
-                # If is_connected is not available, we'll rely on the timeout mechanism
-                pass
-
-            try:
-                # Use a shorter timeout and proper SSE format
-                print(
-                    f"🔧 [STREAM] Waiting for message from queue for session {session_id}")
-                message = await asyncio.wait_for(queue.get(), timeout=1.0)
-                print(f"✅ [STREAM] Received message from queue: {message}")
-
-                if message is None:
-                    print(f"🔧 [STREAM] Received None message, breaking")
-                    break
-
-                # Proper SSE format with proper line endings
-                print(f"🔧 [STREAM] Yielding message to client: {message}")
-                yield f"data: {message}\n\n"
-
-            except asyncio.TimeoutError:
-                # Send a keep-alive ping to maintain connection
-                ping_data = {"type": "ping",
-                             "timestamp": asyncio.get_event_loop().time()}
-                yield f"data: {json.dumps(ping_data)}\n\n"
-            except Exception as e:
-                print(f"Stream error for session {session_id}: {e}")
-                error_data = {"type": "error", "message": str(e)}
-                yield f"data: {json.dumps(error_data)}\n\n"
+            event = await subscriber.get(timeout=settings.STREAM_KEEPALIVE_SECONDS)
+            if event is not None:
+                yield event.to_sse()
+                continue
+            if subscriber.closed:
+                break
+            if await request.is_disconnected():
                 break
-    except asyncio.CancelledError:
-        print(f"Stream cancelled for session {session_id}")
+            # SSE comment line, ignored by EventSource but keeps proxies from timing out
+            yield ": keepalive\n\n"
     except Exception as e:
         print(f"Stream generator error for session {session_id}: {e}")
     finally:
-        stream_manager.close_stream(session_id)
+        # only this viewer goes away; the session stream stays up for the others
+        stream.unsubscribe(subscriber)
@@ -0,0 +1,37 @@
+"""Small JPEG previews of stored screenshots, for live viewers."""
+
+import io
+from functools import lru_cache
+
+from PIL import Image
+
+from app.service.blob_store import blob_store
+
+THUMBNAIL_SIZE = (320, 240)
+THUMBNAIL_QUALITY = 70
+
+
+def make_thumbnail(data: bytes, size: tuple[int, int] = THUMBNAIL_SIZE, quality: int = THUMBNAIL_QUALITY) -> bytes:
+    with Image.open(io.BytesIO(data)) as image:
+        image.thumbnail(size)
+        output = io.BytesIO()
+        image.convert("RGB").save(output, format="JPEG", quality=quality)
+    return output.getvalue()
+
+
+# blobs are content addressed, so a thumbnail never goes stale and every viewer
+# of a session shares the same one. A missing blob raises rather than caching
+# None, as it may still be written, e.g. by a worker or a backfill.
+@lru_cache(maxsize=256)
+def _cached_thumbnail(image_hash: str) -> bytes:
+    data = blob_store.get(image_hash)
+    if data is None:
+        raise KeyError(image_hash)
+    return make_thumbnail(data)
+
+
+def get_thumbnail(image_hash: str) -> bytes | None:
+    try:
+        return _cached_thumbnail(image_hash)
+    except KeyError:
+        return None
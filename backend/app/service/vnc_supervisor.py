@@ -0,0 +1,210 @@
+"""Supervisor of the VNC server and noVNC proxy for the shared display."""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+RESTART_DELAY_SECONDS = 1.0
+MAX_RESTART_DELAY_SECONDS = 30.0
+# a process that stayed up this long is restarted without backing off
+STABLE_SECONDS = 60.0
+STOP_TIMEOUT_SECONDS = 5.0
+
+
+async def wait_for_port(port: int, timeout: float) -> bool:
+    """Wait until something accepts connections on a local port."""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            if asyncio.get_running_loop().time() > deadline:
+                return False
+            await asyncio.sleep(0.1)
+            continue
+        writer.close()
+        return True
+
+
+async def port_in_use(port: int) -> bool:
+    return await wait_for_port(port, timeout=0)
+
+
+@dataclass
+class Service:
+    """One supervised program and what we know about it, kept current so status is a lookup."""
+
+    name: str
+    command: list[str]
+    port: int
+    process: asyncio.subprocess.Process | None = None
+    # something we did not start already serves the port, e.g. the container's scripts
+    external: bool = False
+    restarts: int = 0
+    started_at: float | None = None
+    error: str | None = None
+    watcher: asyncio.Task | None = field(default=None, repr=False)
+
+    @property
+    def running(self) -> bool:
+        return self.external or (self.process is not None and self.process.returncode is None)
+
+    @property
+    def pid(self) -> int | None:
+        return self.process.pid if self.running and self.process is not None else None
+
+    def status(self) -> dict:
+        return {"running": self.running, "pid": self.pid, "port": self.port,
+                "external": self.external, "restarts": self.restarts, "error": self.error}
+
+
+class VNCSupervisor:
+    """
+    Owns x11vnc and the noVNC proxy: starts them once, restarts them when they exit
+    and answers status from the processes it holds, without scanning the process
+    table. Starting again while they run does nothing. A port that is already
+    served by a process we did not start is left to its owner.
+    """
+
+    def __init__(
+        self,
+        display: str = f":{settings.DISPLAY_NUM}",
+        vnc_port: int = settings.VNC_PORT,
+        novnc_port: int = settings.NOVNC_PORT,
+        novnc_path: str = settings.NOVNC_PATH,
+        start_timeout: float = settings.DISPLAY_START_TIMEOUT_SECONDS,
+    ):
+        self.x11vnc = Service(
+            name="x11vnc",
+            command=["x11vnc", "-display", display, "-forever", "-shared",
+                     "-wait", "50", "-rfbport", str(vnc_port), "-nopw"],
+            port=vnc_port,
+        )
+        self.novnc = Service(
+            name="noVNC",
+            command=[f"{novnc_path}/utils/novnc_proxy", "--vnc", f"localhost:{vnc_port}",
+                     "--listen", str(novnc_port), "--web", novnc_path],
+            port=novnc_port,
+        )
+        self._start_timeout = start_timeout
+        self._lock: asyncio.Lock | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._stopping = False
+
+    @property
+    def services(self) -> list[Service]:
+        # in start order: the proxy needs the VNC server
+        return [self.x11vnc, self.novnc]
+
+    @property
+    def is_running(self) -> bool:
+        return all(service.running for service in self.services)
+
+    def status(self) -> dict:
+        return {service.name: service.status() for service in self.services}
+
+    def _guard(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def start(self) -> bool:
+        """Start whatever is not running. True once both services are up."""
+        async with self._guard():
+            self._stopping = False
+            for service in self.services:
+                if service.external and not await port_in_use(service.port):
+                    # its owner went away, so it is ours to run now
+                    service.external = False
+                if service.running:
+                    continue
+                watcher = service.watcher
+                if watcher is not None and not watcher.done() and watcher.get_loop() is asyncio.get_running_loop():
+                    # it is waiting out its restart delay; start the service now
+                    # instead, so there is only ever one owner spawning it
+                    watcher.cancel()
+                    await asyncio.gather(watcher, return_exceptions=True)
+                service.watcher = None
+                if await port_in_use(service.port):
+                    logger.info("%s port %s is already served, leaving it to its owner",
+                                service.name, service.port)
+                    service.external = True
+                    continue
+                if not await self._spawn(service):
+                    return False
+                service.watcher = asyncio.create_task(self._watch(service))
+            return self.is_running
+
+    async def _spawn(self, service: Service) -> bool:
+        try:
+            service.process = await asyncio.create_subprocess_exec(
+                *service.command,
+                stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+        except OSError as e:
+            service.error = str(e)
+            logger.error("Could not start %s: %s", service.name, e)
+            return False
+        service.started_at = time.monotonic()
+        if not await wait_for_port(service.port, self._start_timeout):
+            service.error = f"not listening on port {service.port}"
+            logger.warning("%s did not come up on port %s", service.name, service.port)
+        else:
+            service.error = None
+        logger.info("Started %s (pid %s, port %s)", service.name, service.process.pid, service.port)
+        return True
+
+    async def _watch(self, service: Service):
+        delay = RESTART_DELAY_SECONDS
+        while True:
+            returncode = await service.process.wait()
+            if self._stopping:
+                return
+            if time.monotonic() - service.started_at >= STABLE_SECONDS:
+                delay = RESTART_DELAY_SECONDS
+            logger.warning("%s exited with code %s, restarting in %.0fs",
+                           service.name, returncode, delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RESTART_DELAY_SECONDS)
+            if self._stopping:
+                return
+            async with self._guard():
+                service.restarts += 1
+                if not await self._spawn(service):
+                    return
+
+    async def stop(self) -> list[str]:
+        """Stop the services this supervisor started. Returns their names."""
+        async with self._guard():
+            self._stopping = True
+            stopped = []
+            for service in reversed(self.services):
+                service.external = False
+                if service.watcher is not None:
+                    service.watcher.cancel()
+                    await asyncio.gather(service.watcher, return_exceptions=True)
+                    service.watcher = None
+                process = service.process
+                if process is None or process.returncode is not None:
+                    continue
+                process.terminate()
+                try:
+                    await asyncio.wait_for(process.wait(), STOP_TIMEOUT_SECONDS)
+                except asyncio.TimeoutError:
+                    process.kill()
+                    await process.wait()
+                stopped.append(service.name)
+            return stopped
+
+    async def restart(self) -> bool:
+        await self.stop()
+        return await self.start()
+
+
+vnc_supervisor = VNCSupervisor()
@@ -0,0 +1,82 @@
+"""A standalone agent worker that shares the session queue with other machines."""
+
+import asyncio
+import logging
+import os
+import socket
+
+from app.core.config import settings
+from app.db import jobs
+from app.db.database import db_connection
+from app.service import session_events
+from app.service.blob_store import require_shared_blob_store
+from app.service.display_pool import display_pool
+from app.service.event_relay import LocalEventRelay
+from app.service.worker_pool import RunJob, SessionWorkerPool, default_worker_id, run_session_job
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerNode:
+    """
+    Registers this worker in the `workers` table with the number of desktops it can
+    offer, runs that many sessions at once from the shared queue and heartbeats
+    while it is up. The desktops are the display pool's, or the one shared display
+    when pooling is off. If the worker dies its row goes stale and its sessions are
+    claimed by another worker once their lease expires.
+    """
+
+    def __init__(
+        self,
+        run_job: RunJob = run_session_job,
+        heartbeat_interval: float = settings.WORKER_HEARTBEAT_SECONDS,
+        stale_after: float = settings.WORKER_STALE_SECONDS,
+        worker_id: str | None = None,
+    ):
+        self.worker_id = worker_id or default_worker_id()
+        self.display_capacity = max(display_pool.size, 1)
+        self._heartbeat_interval = heartbeat_interval
+        self._stale_after = stale_after
+        # one session per desktop
+        self.pool = SessionWorkerPool(run_job=run_job, size=self.display_capacity,
+                                      worker_id=self.worker_id)
+        self._heartbeat_task: asyncio.Task | None = None
+
+    async def start(self):
+        require_shared_blob_store()
+        if isinstance(session_events.event_relay, LocalEventRelay):
+            logger.warning("Session events stay in this worker; use a postgres DATABASE_URL "
+                           "for live updates in the API")
+        await self._register()
+        await self.pool.start()
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        logger.info("Worker %s is up with %s displays", self.worker_id, self.display_capacity)
+
+    async def stop(self):
+        """Hand running sessions back to the queue and deregister."""
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            await asyncio.gather(self._heartbeat_task, return_exceptions=True)
+            self._heartbeat_task = None
+        await self.pool.stop()
+        async with db_connection() as conn:
+            await jobs.unregister_worker(conn, self.worker_id)
+        logger.info("Worker %s stopped", self.worker_id)
+
+    async def _register(self):
+        async with db_connection() as conn:
+            await jobs.register_worker(conn, self.worker_id, socket.gethostname(),
+                                       os.getpid(), self.display_capacity)
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self._heartbeat_interval)
+            try:
+                async with db_connection() as conn:
+                    if not await jobs.heartbeat_worker(conn, self.worker_id, self.pool.running):
+                        # pruned after a long stall; our leases were renewed separately
+                        logger.warning("Worker %s was pruned, registering again", self.worker_id)
+                        await self._register()
+                    await jobs.prune_workers(conn, self._stale_after)
+            except Exception:
+                logger.exception("Worker %s heartbeat failed", self.worker_id)
@@ -0,0 +1,186 @@
+"""Bounded pool that runs queued agent sessions."""
+
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from collections import Counter
+from typing import Awaitable, Callable, Dict
+
+from app.core.config import settings
+from app.db import crud, jobs
+from app.db.database import db_connection
+from app.db.jobs import SessionJob
+from app.service.display_pool import display_pool
+from app.service.session_events import publish_status
+
+logger = logging.getLogger(__name__)
+
+RunJob = Callable[[SessionJob], Awaitable[None]]
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+async def run_session_job(job: SessionJob):
+    # imported here so the pool can be built without the agent's dependencies
+    from app.service.agent_service import run_agent_session
+    # a retried or released job's prompt was saved by the run before it
+    async with db_connection() as conn:
+        save_prompt = not await crud.session_has_user_message(conn, job.session_id)
+    await run_agent_session(session_id=job.session_id, provider=job.provider,
+                            save_prompt=save_prompt, **job.payload)
+
+
+class SessionWorkerPool:
+    """
+    Claims jobs from the session queue and runs at most `size` of them at once, with
+    optional per-provider limits. While a job runs its lease is renewed; if the
+    process dies the lease lapses and another worker picks the job up again, until
+    it runs out of attempts.
+
+    Polls the queue every `poll_interval`, and straight away when `wake()` is called
+    after an enqueue in this process.
+    """
+
+    def __init__(
+        self,
+        run_job: RunJob = run_session_job,
+        size: int = settings.JOB_WORKERS,
+        provider_limits: Dict[str, int] | None = None,
+        visibility_timeout: float = settings.JOB_VISIBILITY_TIMEOUT_SECONDS,
+        poll_interval: float = settings.JOB_POLL_INTERVAL_SECONDS,
+        max_attempts: int = settings.JOB_MAX_ATTEMPTS,
+        worker_id: str | None = None,
+    ):
+        self.worker_id = worker_id or default_worker_id()
+        self._run_job = run_job
+        self._size = size
+        self._provider_limits = settings.JOB_PROVIDER_CONCURRENCY if provider_limits is None else provider_limits
+        self._visibility_timeout = visibility_timeout
+        self._poll_interval = poll_interval
+        self._max_attempts = max_attempts
+        self._running: Dict[int, asyncio.Task] = {}
+        self._running_providers: Counter[str] = Counter()
+        self._wakeup = asyncio.Event()
+        self._dispatcher: asyncio.Task | None = None
+
+    @property
+    def running(self) -> int:
+        return len(self._running)
+
+    def wake(self):
+        self._wakeup.set()
+
+    async def start(self):
+        # sessions run here, so their desktops are warmed here
+        await display_pool.start()
+        self._wakeup = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def stop(self):
+        """Stop claiming and hand unfinished jobs back to the queue."""
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+        tasks = list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await display_pool.stop()
+
+    def _saturated_providers(self) -> list[str]:
+        return [provider for provider, limit in self._provider_limits.items()
+                if self._running_providers[provider] >= limit]
+
+    async def _dispatch(self):
+        while True:
+            try:
+                if self.running < self._size and await self._claim_one():
+                    continue
+                await self._fail_exhausted()
+            except Exception:
+                logger.exception("Session queue poll failed")
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _claim_one(self) -> bool:
+        async with db_connection() as conn:
+            job = await jobs.claim_session_job(
+                conn, self.worker_id, self._visibility_timeout, self._max_attempts,
+                excluded_providers=self._saturated_providers())
+        if job is None:
+            return False
+        logger.info("Worker %s claimed session %s (attempt %s)",
+                    self.worker_id, job.session_id, job.attempts)
+        self._running_providers[job.provider] += 1
+        self._running[job.id] = asyncio.create_task(self._run(job))
+        return True
+
+    async def _run(self, job: SessionJob):
+        run = asyncio.create_task(self._run_job(job))
+        lease = asyncio.create_task(self._keep_lease(job))
+        state = "done"
+        try:
+            await asyncio.wait({run, lease}, return_when=asyncio.FIRST_COMPLETED)
+            if not run.done():
+                # the job may be running on another worker by now: stop this copy
+                # before it repeats tool actions and writes over the other's status
+                state = None
+                run.cancel()
+                await asyncio.gather(run, return_exceptions=True)
+            else:
+                run.result()
+        except asyncio.CancelledError:
+            state = "released"
+            raise
+        except Exception:
+            logger.exception("Session %s failed", job.session_id)
+            state = "failed"
+        finally:
+            run.cancel()
+            lease.cancel()
+            await asyncio.gather(run, lease, return_exceptions=True)
+            self._running.pop(job.id, None)
+            self._running_providers[job.provider] -= 1
+            if state is not None:
+                async with db_connection() as conn:
+                    if state == "released":
+                        if await jobs.release_job(conn, job.id, self.worker_id):
+                            await crud.update_session_status(
+                                conn=conn, session_id=job.session_id, status="queued")
+                            await publish_status(conn, job.session_id, "queued")
+                    else:
+                        await jobs.finish_job(conn, job.id, self.worker_id, state)
+            self.wake()
+
+    async def _keep_lease(self, job: SessionJob):
+        """Renew the job's lease while it runs. Returns once the lease is lost."""
+        while True:
+            await asyncio.sleep(self._visibility_timeout / 3)
+            try:
+                async with db_connection() as conn:
+                    if not await jobs.extend_lease(conn, job.id, self.worker_id, self._visibility_timeout):
+                        logger.warning(
+                            "Worker %s lost the lease on session %s, stopping its run",
+                            self.worker_id, job.session_id)
+                        return
+            except Exception:
+                logger.exception(
+                    "Could not renew the lease on session %s", job.session_id)
+
+    async def _fail_exhausted(self):
+        async with db_connection() as conn:
+            session_ids = await jobs.fail_exhausted_jobs(conn, self._max_attempts)
+            for session_id in session_ids:
+                logger.warning(
+                    "Session %s ran out of attempts, marking it as failed", session_id)
+                await crud.update_session_status(conn=conn, session_id=session_id, status="error")
+                await publish_status(conn, session_id, "error")
+
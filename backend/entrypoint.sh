@@ -6,12 +6,14 @@ set -e
 export AWS_PROFILE=default
 export AWS_DEFAULT_REGION=${AWS_REGION}
 
-# Start VNC services first
-./scripts/start_all.sh
-./scripts/novnc_startup.sh
+# Start the desktop first; the API starts and supervises x11vnc and noVNC
+export DISPLAY=:${DISPLAY_NUM}
+./scripts/xvfb_startup.sh
+./scripts/mutter_startup.sh
+./scripts/tint2_startup.sh
 
-echo "✨ VNC Desktop is ready!"
-echo "➡️  Open http://localhost:8080 in your browser to access the desktop"
+echo "✨ Desktop is ready!"
+echo "➡️  Open http://localhost:8080 in your browser to access the desktop once the API is up"
 
 # Start FastAPI in the background
 uvicorn main:app --host 0.0.0.0 --port 8000 --reload &
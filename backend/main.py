@@ -1,10 +1,35 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.api.sessions import router as sessions_router
 from app.api.messages import router as messages_router
+from app.api.images import router as images_router
 from app.routes.vnc import router as vnc_router
+from app.service.session_events import event_relay
+from app.service.message_writer import message_writer
+from app.service.process_pool import session_runner
+from app.service.vnc_supervisor import vnc_supervisor
+from app.db.database import pool_metrics, db_connection
+from app.db import jobs
+from app.core.config import settings
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # LISTEN connection that brings in session events from the other workers
+    await event_relay.start()
+    await session_runner.start()
+    # VNC server and noVNC proxy for the shared display, restarted if they exit
+    await vnc_supervisor.start()
+    yield
+    await vnc_supervisor.stop()
+    # running sessions go back to the queue for the next worker
+    await session_runner.stop()
+    # queued agent messages are written before the relay goes away
+    await message_writer.close()
+    await event_relay.stop()
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -15,9 +40,28 @@ app.add_middleware(
 
 app.include_router(sessions_router, prefix="/sessions", tags=["sessions"])
 app.include_router(messages_router, prefix="/messages", tags=["messages"])
+app.include_router(images_router, prefix="/images", tags=["images"])
 app.include_router(vnc_router)
 
 
 @app.get("/")
 def health_endpoint():
     return {"message": "the server is running"}
+
+
+@app.get("/metrics/db")
+def db_pool_metrics():
+    """Connection pool usage and how long requests and agent writes waited for a connection"""
+    return pool_metrics()
+
+
+@app.get("/metrics/workers")
+async def worker_metrics():
+    """Registered agent workers, their desktops and running sessions, and whether they still heartbeat"""
+    async with db_connection() as conn:
+        workers = await jobs.list_workers(conn, settings.WORKER_STALE_SECONDS)
+    return {
+        "workers": workers,
+        "display_capacity": sum(w["display_capacity"] for w in workers if w["alive"]),
+        "running": sum(w["running"] for w in workers if w["alive"]),
+    }
@@ -85,10 +85,7 @@ def test_vnc_interact():
     print("Testing VNC interaction endpoint...")
     try:
         response = requests.post(f"{API_BASE_URL}/vnc/interact", json={
-            "action": "click",
-            "x": 100,
-            "y": 100,
-            "button": 1
+            "events": [{"type": "click", "x": 100, "y": 100, "button": 1}]
         })
         if response.status_code == 200:
             data = response.json()
@@ -174,23 +174,51 @@ class TestMessagesEndpoints:
 class TestStreamingEndpoint:
     """Test the streaming endpoint."""
     
-    def test_stream_endpoint_creates_stream(self, client, mock_stream_manager):
-        """Test that the stream endpoint creates a stream."""
-        mock_queue = MagicMock()
-        mock_stream_manager.get_stream.return_value = mock_queue
-        
+    @patch('app.api.sessions.stream_generator')
+    @patch('app.api.sessions.stream_manager')
+    @patch('app.db.crud.get_session_poll_state', new_callable=AsyncMock)
+    def test_stream_endpoint_creates_stream(self, mock_poll_state, mock_stream_manager, mock_generator, client):
+        """Test that the stream endpoint creates a stream for a running session."""
+        async def events(*args):
+            yield "event: status\ndata: {}\n\n"
+
+        mock_poll_state.return_value = {"status": "running", "last_message_id": None}
+        mock_generator.side_effect = events
+
         response = client.get("/sessions/1/stream")
         assert response.status_code == 200
         assert response.headers["content-type"] == "text/event-stream; charset=utf-8"
         mock_stream_manager.create_stream.assert_called_once_with(1)
-    
-    def test_stream_endpoint_no_stream(self, client, mock_stream_manager):
-        """Test stream endpoint when no stream exists."""
-        mock_stream_manager.get_stream.return_value = None
-        
+
+    @patch('app.api.sessions.stream_manager')
+    @patch('app.db.crud.get_session_poll_state', new_callable=AsyncMock, return_value=None)
+    def test_stream_endpoint_no_session(self, _mock_poll_state, mock_stream_manager, client):
+        """Test that streaming an unknown session is a 404 and creates no stream."""
         response = client.get("/sessions/999/stream")
         assert response.status_code == 404
-        assert "Stream not found" in response.json()["detail"]
+        assert "Session not found" in response.json()["detail"]
+        mock_stream_manager.create_stream.assert_not_called()
+
+    @patch('app.api.sessions.stream_manager')
+    @patch('app.db.crud.get_messages_by_session_id', new_callable=AsyncMock)
+    @patch('app.db.crud.get_session_poll_state', new_callable=AsyncMock)
+    def test_finished_session_replays_and_closes(self, mock_poll_state, mock_messages, mock_stream_manager, client):
+        """Test that a completed session sends its messages and final status, then ends the stream."""
+        mock_poll_state.return_value = {"status": "completed", "last_message_id": 2}
+        mock_messages.side_effect = [
+            [{"id": i, "session_id": 1, "role": "assistant", "content": {"n": i},
+              "image_hash": None, "created_at": "2025-10-17T12:33:45Z"} for i in (1, 2)],
+            [],
+        ]
+
+        response = client.get("/sessions/1/stream")
+
+        assert response.status_code == 200
+        events = [event for event in response.text.split("\n\n") if event]
+        assert [event.split("\n")[0] for event in events] == ["event: message", "event: message", "event: status"]
+        assert '"completed"' in events[-1]
+        assert mock_messages.await_args_list[1].kwargs["after_id"] == 2
+        mock_stream_manager.create_stream.assert_not_called()
 
 
 class TestErrorHandling:
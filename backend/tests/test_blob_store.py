@@ -0,0 +1,77 @@
+import asyncio
+import base64
+import hashlib
+import io
+from PIL import Image
+
+from app.api.schemas import MessageCreate
+from app.db import crud
+from app.service.blob_store import BlobStore, LocalBlobBackend
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + b"pixels" * 100
+
+
+class TestBlobStore:
+    """Test the content-addressed screenshot store."""
+
+    def test_identical_images_are_stored_once(self, tmp_path):
+        """Test that the same image gets the same key and a single file."""
+        store = BlobStore(LocalBlobBackend(tmp_path))
+        encoded = base64.b64encode(PNG_BYTES).decode()
+
+        first = store.put_base64(encoded)
+        second = store.put_base64(encoded)
+
+        assert first == second
+        assert first.content_type == "image/png"
+        assert first.size == len(PNG_BYTES)
+        assert len([p for p in tmp_path.rglob("*") if p.is_file()]) == 1
+        assert store.get(first.hash) == PNG_BYTES
+        assert store.get_base64(first.hash) == encoded
+
+    def test_missing_blob_returns_none(self, tmp_path):
+        """Test that unknown keys are reported as missing."""
+        store = BlobStore(LocalBlobBackend(tmp_path))
+
+        assert store.get("0" * 64) is None
+
+
+class TestThumbnails:
+    """Test the cached previews of stored screenshots."""
+
+    def test_missing_blob_is_not_cached(self, tmp_path, monkeypatch):
+        """Test that a thumbnail asked for before its blob exists is made once the blob is written."""
+        from app.service import thumbnails
+
+        store = BlobStore(LocalBlobBackend(tmp_path))
+        monkeypatch.setattr(thumbnails, "blob_store", store)
+        thumbnails._cached_thumbnail.cache_clear()
+        buffer = io.BytesIO()
+        Image.new("RGB", (640, 480), "navy").save(buffer, format="PNG")
+        image_hash = hashlib.sha256(buffer.getvalue()).hexdigest()
+
+        missing = thumbnails.get_thumbnail(image_hash)
+        store.put(buffer.getvalue())
+        found = thumbnails.get_thumbnail(image_hash)
+
+        assert missing is None
+        assert found.startswith(b"\xff\xd8\xff")
+        assert thumbnails._cached_thumbnail.cache_info().currsize == 1
+        thumbnails._cached_thumbnail.cache_clear()
+
+
+class TestCreateMessageWithImage:
+    """Test that message writes keep only a reference to the screenshot."""
+
+    def test_image_is_moved_out_of_the_row(self, tmp_path, monkeypatch):
+        """Test that create_message inserts an image_hash instead of base64 text."""
+        store = BlobStore(LocalBlobBackend(tmp_path))
+        monkeypatch.setattr(crud, "blob_store", store)
+        encoded = base64.b64encode(PNG_BYTES).decode()
+
+        values = asyncio.run(crud._message_values(MessageCreate(
+            session_id=1, role="tool", content={"type": "tool_result"}, base64_image=encoded)))
+
+        assert "base64_image" not in values
+        assert values["image_content_type"] == "image/png"
+        assert store.get(values["image_hash"]) == PNG_BYTES
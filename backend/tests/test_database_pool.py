@@ -0,0 +1,80 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+from fastapi.testclient import TestClient
+
+from main import app
+from app.db import database
+from app.service.agent_service import run_agent_session
+from app.service.session_notifier import session_notifier
+
+
+class TestPoolOptions:
+    """Test connection pool configuration."""
+
+    def test_postgres_gets_pool_sizing(self):
+        """Test that pool size, overflow and timeout come from settings."""
+        options = database.pool_options("postgresql+asyncpg://db/app")
+        assert options["pool_size"] == database.settings.DB_POOL_SIZE
+        assert options["max_overflow"] == database.settings.DB_MAX_OVERFLOW
+        assert options["pool_pre_ping"] is database.settings.DB_POOL_PRE_PING
+
+    def test_sqlite_keeps_default_pool(self):
+        """Test that SQLite only gets pre-ping and recycle."""
+        options = database.pool_options("sqlite+aiosqlite:///./app.db")
+        assert "pool_size" not in options
+        assert options["pool_recycle"] == database.settings.DB_POOL_RECYCLE_SECONDS
+
+
+class TestCheckoutMetrics:
+    """Test connection checkout metrics."""
+
+    def test_checkout_is_recorded(self):
+        """Test that scoped connections count checkouts and are released."""
+        async def run():
+            before = database.checkout_metrics.checkouts
+            async with database.db_connection():
+                in_use = database.checkout_metrics.in_use
+            await database.engine.dispose()
+            return database.checkout_metrics.checkouts - before, in_use
+
+        checkouts, in_use = asyncio.run(run())
+        assert checkouts == 1
+        assert in_use >= 1
+        assert database.checkout_metrics.in_use == 0
+
+    def test_metrics_endpoint(self):
+        """Test that pool metrics are served."""
+        response = TestClient(app).get("/metrics/db")
+        assert response.status_code == 200
+        assert {"pool", "checkouts", "avg_wait_ms", "max_wait_ms"} <= response.json().keys()
+
+
+class TestAgentSessionConnections:
+    """Test that agent sessions don't pin a connection."""
+
+    def test_no_connection_is_held_during_the_model_loop(self):
+        """Test that no connection is checked out while the agent runs."""
+        held_during_loop = []
+
+        async def sampling_loop(**kwargs):
+            held_during_loop.append(database.checkout_metrics.in_use)
+
+        async def run():
+            with patch('app.service.agent_service.sampling_loop', side_effect=sampling_loop), \
+                    patch('app.service.agent_service.start_vnc_services', new_callable=AsyncMock), \
+                    patch('app.service.agent_service.message_writer') as mock_writer, \
+                    patch('app.db.crud.update_session_status', new_callable=AsyncMock) as mock_update, \
+                    patch('app.service.agent_service.settings.ANTHROPIC_API_KEY', "test-key"):
+                mock_writer.submit = AsyncMock()
+                mock_writer.flush = AsyncMock()
+                await run_agent_session(session_id=9100, initial_prompt="hi",
+                                        model="claude-3-haiku-20240307")
+            await database.engine.dispose()
+            return mock_update
+
+        mock_update = asyncio.run(run())
+        session_notifier.forget(9100)
+
+        assert held_during_loop == [0]
+        statuses = [call.kwargs["status"] for call in mock_update.await_args_list]
+        assert statuses == ["running", "completed"]
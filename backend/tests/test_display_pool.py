@@ -0,0 +1,308 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from app.service.computer_use.tools import Display, ToolCollection
+from app.service.computer_use.tools.groups import TOOL_GROUPS_BY_VERSION
+from app.core.config import settings
+from app.service.display_pool import VNC_BASE_PORT, Desktop, DesktopLauncher, DisplayPool, free_display_number
+
+
+def _fake_desktop_programs(tmp_path, monkeypatch, overrides):
+    """Put stand-ins for the desktop's programs on PATH; returns a display number whose VNC port is free."""
+    fakes = {
+        # reports the display it was asked for, like Xvfb -displayfd
+        "Xvfb": f"#!{sys.executable}\nimport os, sys, time\n"
+                "fd = int(sys.argv[sys.argv.index('-displayfd') + 1])\n"
+                "os.write(fd, sys.argv[1][1:].encode() + b'\\n')\ntime.sleep(30)\n",
+        "mutter": "#!/bin/sh\nexec sleep 30\n",
+        "tint2": "#!/bin/sh\nexec sleep 30\n",
+        **overrides,
+    }
+    for name, script in fakes.items():
+        (tmp_path / name).write_text(script)
+        (tmp_path / name).chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1] - VNC_BASE_PORT
+
+
+class FakeLauncher:
+    """Hands out numbered desktops without starting X."""
+
+    def __init__(self):
+        self.next_number = 10
+        self.running = set()
+        self.stopped = []
+        self.resets = []
+        self.dead = set()
+        self.reset_works = True
+
+    async def start(self):
+        number = self.next_number
+        self.next_number += 1
+        self.running.add(number)
+        return Desktop(display=Display(number=number, width=1024, height=768, vnc_port=5900 + number))
+
+    def is_healthy(self, desktop):
+        return desktop.display.number not in self.dead
+
+    async def reset(self, desktop):
+        self.resets.append(desktop.display.number)
+        return self.reset_works
+
+    async def stop(self, desktop):
+        self.running.discard(desktop.display.number)
+        self.stopped.append(desktop.display.number)
+
+
+class TestDisplayPool:
+    """Test leasing a desktop to each session."""
+
+    def test_concurrent_sessions_get_their_own_display(self):
+        """Test that sessions never share a display and wait when the pool is full."""
+        launcher = FakeLauncher()
+        pool = DisplayPool(size=2, launcher=launcher)
+        seen = {}
+        peak = []
+
+        async def session(session_id):
+            async with pool.lease(session_id) as display:
+                seen[session_id] = display
+                peak.append(len(launcher.running))
+                await asyncio.sleep(0.01)
+
+        async def run():
+            await asyncio.gather(*(session(i) for i in range(5)))
+
+        asyncio.run(run())
+        assert len({display.number for display in seen.values()}) == 5
+        assert max(peak) == 2
+        assert launcher.running == set()
+        assert pool.leases == {}
+
+    def test_failed_session_releases_its_display(self):
+        """Test that the desktop is torn down when the session raises."""
+        launcher = FakeLauncher()
+        pool = DisplayPool(size=1, launcher=launcher)
+
+        async def run():
+            with pytest.raises(RuntimeError):
+                async with pool.lease(1) as display:
+                    assert pool.leases == {1: display}
+                    raise RuntimeError("agent failed")
+            async with pool.lease(2) as display:
+                return display
+
+        display = asyncio.run(run())
+        assert launcher.stopped == [10, 11]
+        assert display.vnc_port == 5911
+
+    def test_size_zero_shares_the_container_display(self):
+        """Test that no desktop is started when the pool is disabled."""
+        launcher = FakeLauncher()
+        pool = DisplayPool(size=0, launcher=launcher)
+
+        async def run():
+            async with pool.lease(1) as display:
+                return display
+
+        assert asyncio.run(run()) is None
+        assert launcher.stopped == []
+
+    def test_launcher_reports_xvfb_that_dies(self, tmp_path, monkeypatch):
+        """Test that a desktop whose X server exits fails to start instead of hanging."""
+        xvfb = tmp_path / "Xvfb"
+        xvfb.write_text("#!/bin/sh\nexit 1\n")
+        xvfb.chmod(0o755)
+        monkeypatch.setenv("PATH", str(tmp_path))
+
+        with pytest.raises(RuntimeError, match="before reporting"):
+            asyncio.run(DesktopLauncher(start_timeout=5).start())
+
+    def test_display_numbers_skip_the_shared_display_and_taken_ports(self, monkeypatch):
+        """Test that a desktop never gets the shared display or a VNC port someone holds."""
+        monkeypatch.setattr(settings, "DISPLAY_NUM", 300)
+        monkeypatch.setattr(settings, "VNC_PORT", VNC_BASE_PORT + 301)
+        with socket.socket() as holder:
+            holder.bind(("127.0.0.1", VNC_BASE_PORT + 302))
+            holder.listen()
+            assert free_display_number(300) == 303
+            assert free_display_number(300, taken={303}) == 304
+
+    def test_vnc_port_answered_by_another_process_is_refused(self, tmp_path, monkeypatch):
+        """Test that a desktop whose x11vnc does not hold its own port fails to start."""
+        first_display = _fake_desktop_programs(tmp_path, monkeypatch, {
+            # hands the port to a child, so someone else answers on it
+            "x11vnc": f"#!/bin/sh\n{sys.executable} -c \"import socket, sys, time; s = socket.socket(); "
+                      "s.bind(('127.0.0.1', int(sys.argv[1]))); s.listen(); time.sleep(5)\" "
+                      "\"$(echo \"$@\" | sed 's/.*-rfbport \\([0-9]*\\).*/\\1/')\" &\nexec sleep 30\n",
+        })
+
+        with pytest.raises(RuntimeError, match="not served by the desktop's x11vnc"):
+            asyncio.run(DesktopLauncher(start_timeout=5, first_display=first_display).start())
+
+    def test_desktop_has_its_own_home_wiped_on_reset(self, tmp_path, monkeypatch):
+        """Test that a desktop's HOME and TMPDIR are its own, emptied on reset and removed on stop."""
+        first_display = _fake_desktop_programs(tmp_path, monkeypatch, {
+            "x11vnc": f"#!{sys.executable}\nimport socket, sys\n"
+                      "s = socket.socket()\n"
+                      "s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)\n"
+                      "s.bind(('127.0.0.1', int(sys.argv[sys.argv.index('-rfbport') + 1])))\n"
+                      "s.listen()\n"
+                      "while True:\n    s.accept()[0].close()\n",
+        })
+        launcher = DesktopLauncher(start_timeout=5, first_display=first_display)
+
+        async def run():
+            desktop = await launcher.start()
+            home = desktop.display.home
+            env = desktop.display.env()
+            (Path(env["TMPDIR"]) / "download.part").write_text("x")
+            (Path(home) / ".mozilla" / "profile").mkdir(parents=True)
+            first_vnc = desktop.vnc.pid
+            try:
+                reusable = await launcher.reset(desktop)
+                left = sorted(os.listdir(home))
+                restarted = desktop.vnc.pid != first_vnc and desktop.vnc in desktop.processes
+            finally:
+                await launcher.stop(desktop)
+            return home, env, reusable, left, restarted
+
+        home, env, reusable, left, restarted = asyncio.run(run())
+        assert env["HOME"] == home and env["TMPDIR"] == os.path.join(home, "tmp")
+        assert reusable is True
+        assert left == ["tmp"]
+        assert restarted
+        assert not os.path.exists(home)
+
+
+class TestWarmPool:
+    """Test keeping desktops started ahead of sessions."""
+
+    def test_sessions_get_a_warm_desktop_and_return_it_clean(self):
+        """Test that a lease takes an idle desktop, which is reset and reused afterwards."""
+        launcher = FakeLauncher()
+        pool = DisplayPool(size=2, launcher=launcher, warm=1, health_interval=0.01)
+
+        async def run():
+            await pool.start()
+            await asyncio.sleep(0.05)
+            warmed = pool.idle
+            async with pool.lease(1) as first:
+                pass
+            async with pool.lease(2) as second:
+                pass
+            await pool.stop()
+            return warmed, first, second
+
+        warmed, first, second = asyncio.run(run())
+        assert warmed == 1
+        assert first == second
+        assert launcher.resets == [first.number, first.number]
+        # nothing left running after stop
+        assert launcher.running == set()
+
+    def test_dead_idle_desktop_is_replaced(self):
+        """Test that a desktop that died while idle is never leased."""
+        launcher = FakeLauncher()
+        pool = DisplayPool(size=2, launcher=launcher, warm=1, health_interval=0.01)
+
+        async def run():
+            await pool.start()
+            await asyncio.sleep(0.05)
+            launcher.dead.add(10)
+            async with pool.lease(1) as display:
+                pass
+            await pool.stop()
+            return display
+
+        display = asyncio.run(run())
+        assert display.number != 10
+        assert 10 in launcher.stopped
+
+    def test_lease_waits_for_the_warm_desktop_being_started(self):
+        """Test that a lease during a warm start takes that desktop instead of going over size."""
+        launcher = FakeLauncher()
+        pool = DisplayPool(size=1, launcher=launcher, warm=1, health_interval=0.01)
+        peak = [0]
+        start = launcher.start
+
+        async def slow_start():
+            await asyncio.sleep(0.05)
+            desktop = await start()
+            peak[0] = max(peak[0], len(launcher.running))
+            return desktop
+
+        launcher.start = slow_start
+
+        async def run():
+            await pool.start()
+            await asyncio.sleep(0.01)
+            async with pool.lease(1) as display:
+                pass
+            await pool.stop()
+            return display
+
+        display = asyncio.run(run())
+        assert display.number == 10
+        assert peak[0] == 1
+
+    def test_desktop_that_fails_reset_is_torn_down(self):
+        """Test that an unusable desktop is replaced instead of handed to the next session."""
+        launcher = FakeLauncher()
+        launcher.reset_works = False
+        pool = DisplayPool(size=1, launcher=launcher, warm=1, health_interval=0.01)
+
+        async def run():
+            await pool.start()
+            await asyncio.sleep(0.05)
+            async with pool.lease(1) as first:
+                pass
+            await asyncio.sleep(0.05)
+            async with pool.lease(2) as second:
+                pass
+            await pool.stop()
+            return first, second
+
+        first, second = asyncio.run(run())
+        assert first != second
+        assert first.number in launcher.stopped
+
+    def test_reset_closes_programs_left_on_the_display(self):
+        """Test that processes the session started on its display are terminated."""
+        left_behind = subprocess.Popen(["sleep", "30"], env={**os.environ, "DISPLAY": ":87"})
+        bystander = subprocess.Popen(["sleep", "30"], env={**os.environ, "DISPLAY": ":88"})
+        desktop = Desktop(display=Display(number=87, width=1024, height=768))
+        try:
+            reusable = asyncio.run(DesktopLauncher().reset(desktop))
+            left_behind.wait(timeout=5)
+            assert reusable is True
+            assert bystander.poll() is None
+        finally:
+            for process in (left_behind, bystander):
+                process.kill()
+                process.wait()
+
+
+class TestToolsOnADisplay:
+    """Test handing the leased display to the tools."""
+
+    def test_desktop_tools_use_the_leased_display(self):
+        """Test that the computer and bash tools target the session's display."""
+        display = Display(number=12, width=1280, height=800, vnc_port=5912)
+        group = TOOL_GROUPS_BY_VERSION["computer_use_20250124"]
+
+        collection = ToolCollection.for_display(group.tools, display)
+
+        computer = collection.tool_map["computer"]
+        assert (computer.width, computer.height, computer.display_num) == (1280, 800, 12)
+        assert computer.xdotool == "DISPLAY=:12 xdotool"
+        assert collection.tool_map["bash"]._display == display
+        assert display.env()["DISPLAY"] == ":12"
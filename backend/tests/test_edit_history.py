@@ -0,0 +1,83 @@
+import asyncio
+import pytest
+from pathlib import Path
+
+from app.service.computer_use.tools.base import ToolError
+from app.service.computer_use.tools.edit import EditTool20250124
+from app.service.computer_use.tools.history import FileHistory
+
+
+class TestFileHistory:
+    """Test the delta-based undo history."""
+
+    def test_pop_returns_versions_in_reverse_order(self):
+        """Test that versions come back newest first."""
+        history = FileHistory()
+        path = Path("/tmp/a.txt")
+        versions = ["one\ntwo\nthree\n", "one\n2\nthree\n", "one\n2\nthree\nfour\n", ""]
+        for version in versions:
+            history.push(path, version)
+
+        assert history.depth(path) == len(versions)
+        for version in reversed(versions):
+            assert history.pop(path) == version
+        assert history.pop(path) is None
+
+    def test_large_file_is_stored_compactly(self):
+        """Test that repeated edits of a big file do not keep full copies."""
+        history = FileHistory()
+        path = Path("/tmp/big.txt")
+        text = "".join(f"line {i}\n" for i in range(200_000))
+        for i in range(50):
+            history.push(path, text)
+            text = text.replace(f"line {i * 1000}\n", f"edited {i}\n", 1)
+
+        assert history.size < len(text)
+        assert history.pop(path).startswith("edited 0\nline 1\n")
+
+    def test_evicts_least_recently_edited_path_first(self):
+        """Test that the memory cap drops old entries of idle paths."""
+        history = FileHistory(max_bytes=2_000)
+        idle, busy = Path("/tmp/idle.txt"), Path("/tmp/busy.txt")
+        history.push(idle, "idle")
+        for i in range(40):
+            history.push(busy, f"busy {i}")
+
+        assert history.size <= 2_000
+        assert history.depth(idle) == 0
+        assert history.pop(busy) == "busy 39"
+
+    def test_keeps_latest_entry_over_budget(self):
+        """Test that the entry just recorded survives even when it exceeds the cap."""
+        history = FileHistory(max_bytes=10)
+        path = Path("/tmp/a.txt")
+        history.push(path, "some text that is over budget")
+
+        assert history.pop(path) == "some text that is over budget"
+
+
+class TestEditToolUndo:
+    """Test undo_edit on top of the new history."""
+
+    def test_undo_restores_each_edit(self, tmp_path):
+        """Test that undo walks back create, str_replace and insert."""
+        tool = EditTool20250124()
+        path = tmp_path / "file.txt"
+
+        async def scenario():
+            await tool(command="create", path=str(path), file_text="alpha\nbeta\n")
+            await tool(command="str_replace", path=str(path), old_str="beta", new_str="gamma")
+            await tool(command="insert", path=str(path), insert_line=0, new_str="zero")
+            assert path.read_text() == "zero\nalpha\ngamma\n"
+
+            await tool(command="undo_edit", path=str(path))
+            assert path.read_text() == "alpha\ngamma\n"
+            await tool(command="undo_edit", path=str(path))
+            assert path.read_text() == "alpha\nbeta\n"
+            await tool(command="undo_edit", path=str(path))
+            assert path.read_text() == "alpha\nbeta\n"
+
+            with pytest.raises(ToolError, match="No edit history found"):
+                await tool(command="undo_edit", path=str(path))
+
+        asyncio.run(scenario())
@@ -0,0 +1,189 @@
+import asyncio
+import pytest
+
+from app.service.computer_use.tools import TOOL_GROUPS_BY_VERSION, Display, ToolCollection
+from app.service.computer_use.tools.base import CLIResult, ToolError
+from app.service.computer_use.tools.edit import EditTool20250124, EditTool20250429
+from app.service.computer_use.tools import listing
+from app.service.computer_use.tools.run import TRUNCATED_MESSAGE
+
+
+@pytest.fixture(params=[EditTool20250124, EditTool20250429])
+def edit_tool(request):
+    return request.param()
+
+
+class TestMultiStrReplace:
+    """Test the batched multi_str_replace command."""
+
+    def test_applies_all_edits_with_one_write(self, edit_tool, tmp_path):
+        """Test that every replacement lands and the snippets cover them."""
+        path = tmp_path / "module.py"
+        path.write_text("".join(f"value_{i} = {i}\n" for i in range(40)))
+
+        result = asyncio.run(edit_tool(
+            command="multi_str_replace",
+            path=str(path),
+            edits=[
+                {"old_str": "value_30 = 30", "new_str": "value_30 = 'thirty'"},
+                {"old_str": "value_2 = 2", "new_str": "value_2 = 'two'\nvalue_2b = 2"},
+                {"old_str": "value_3 = 3\n"},
+            ],
+        ))
+
+        content = path.read_text()
+        assert isinstance(result, CLIResult)
+        assert "value_30 = 'thirty'" in content
+        assert "value_2 = 'two'\nvalue_2b = 2\nvalue_4 = 4" in content
+        assert "value_3 = 3" not in content
+        assert "3 replacements" in result.output
+        assert "value_2b = 2" in result.output
+        assert "value_30 = 'thirty'" in result.output
+        # the two nearby edits share one snippet
+        assert result.output.count("Here's the result of running `cat -n`") == 2
+
+    def test_rejects_batch_atomically(self, edit_tool, tmp_path):
+        """Test that one bad edit leaves the file untouched."""
+        path = tmp_path / "module.py"
+        original = "a = 1\nb = 2\nb = 2\n"
+        path.write_text(original)
+
+        with pytest.raises(ToolError, match="Multiple occurrences"):
+            asyncio.run(edit_tool(
+                command="multi_str_replace",
+                path=str(path),
+                edits=[
+                    {"old_str": "a = 1", "new_str": "a = 10"},
+                    {"old_str": "b = 2", "new_str": "b = 20"},
+                ],
+            ))
+        with pytest.raises(ToolError, match="overlaps another edit"):
+            asyncio.run(edit_tool(
+                command="multi_str_replace",
+                path=str(path),
+                edits=[
+                    {"old_str": "a = 1\nb", "new_str": "x"},
+                    {"old_str": "1\nb = 2\nb", "new_str": "y"},
+                ],
+            ))
+        assert path.read_text() == original
+
+    def test_single_undo_reverts_batch(self, tmp_path):
+        """Test that undo_edit restores the file as it was before the batch."""
+        tool = EditTool20250124()
+        path = tmp_path / "module.py"
+        path.write_text("a = 1\nb = 2\n")
+
+        async def scenario():
+            await tool(
+                command="multi_str_replace",
+                path=str(path),
+                edits=[
+                    {"old_str": "a = 1", "new_str": "a = 10"},
+                    {"old_str": "b = 2", "new_str": "b = 20"},
+                ],
+            )
+            await tool(command="undo_edit", path=str(path))
+
+        asyncio.run(scenario())
+        assert path.read_text() == "a = 1\nb = 2\n"
+
+    def test_non_string_edit_is_a_tool_error(self, edit_tool, tmp_path):
+        """Test that an old_str or new_str that isn't a string is reported to the model."""
+        path = tmp_path / "module.py"
+        path.write_text("a = 1\n")
+
+        for edit in ({"old_str": 1, "new_str": "2"}, {"old_str": "a = 1", "new_str": ["b"]}):
+            with pytest.raises(ToolError, match="Invalid `edits`"):
+                asyncio.run(edit_tool(command="multi_str_replace", path=str(path), edits=[edit]))
+        assert path.read_text() == "a = 1\n"
+
+    @pytest.mark.parametrize("version", ["computer_use_20250124", "computer_use_20250429"])
+    def test_offered_to_the_model(self, version, tmp_path):
+        """Test that each tool group advertises multi_str_replace and runs it on its own editor."""
+        display = Display(number=9, width=1024, height=768)
+        tools = ToolCollection.for_display(TOOL_GROUPS_BY_VERSION[version].tools, display)
+        params = {param["name"]: param for param in tools.to_params()}
+        assert params["multi_str_replace"]["input_schema"]["required"] == ["path", "edits"]
+        path = tmp_path / "module.py"
+        path.write_text("a = 1\nb = 2\n")
+
+        async def scenario():
+            result = await tools.run(name="multi_str_replace", tool_input={
+                "path": str(path),
+                "edits": [{"old_str": "a = 1", "new_str": "a = 10"}, {"old_str": "b = 2", "new_str": "b = 20"}],
+            })
+            failure = await tools.run(name="multi_str_replace", tool_input={
+                "path": str(path), "edits": [{"old_str": None}],
+            })
+            return result, failure
+
+        result, failure = asyncio.run(scenario())
+        assert "2 replacements" in result.output
+        assert path.read_text() == "a = 10\nb = 20\n"
+        assert "Invalid `edits`" in failure.error
+        editor = tools.tool_map["multi_str_replace"].editor
+        assert editor is next(tool for name, tool in tools.tool_map.items() if "edit" in name)
+
+
+class TestDirectoryListing:
+    """Test the in-process directory listing used by `view`."""
+
+    @pytest.fixture(autouse=True)
+    def clear_listing_cache(self):
+        listing.clear_cache()
+        yield
+        listing.clear_cache()
+
+    def test_view_directory_two_levels_without_hidden(self, edit_tool, tmp_path):
+        """Test that view lists two levels and skips hidden items."""
+        (tmp_path / "pkg" / "sub").mkdir(parents=True)
+        (tmp_path / "pkg" / "sub" / "deep.txt").write_text("")
+        (tmp_path / "pkg" / "mod.py").write_text("")
+        (tmp_path / ".git").mkdir()
+        (tmp_path / "readme.md").write_text("")
+
+        result = asyncio.run(edit_tool(command="view", path=str(tmp_path)))
+
+        assert "up to 2 levels deep" in result.output
+        assert f"{tmp_path}/pkg/mod.py" in result.output
+        assert f"{tmp_path}/pkg/sub\n" in result.output
+        assert f"{tmp_path}/readme.md" in result.output
+        assert "deep.txt" not in result.output
+        assert ".git" not in result.output
+
+    def test_listing_is_bounded(self, tmp_path):
+        """Test that the walk stops at the entry cap and output budget."""
+        for i in range(50):
+            (tmp_path / f"file_{i:03}.txt").write_text("")
+
+        capped = listing.list_directory(str(tmp_path), max_entries=10)
+        assert capped.output.count("file_") == 10
+        assert "Listing stopped after 10 entries" in capped.output
+
+        clipped = listing.list_directory(str(tmp_path), truncate_after=100)
+        assert clipped.output.endswith(TRUNCATED_MESSAGE)
+
+    def test_capped_directory_lists_first_names(self, tmp_path):
+        """Test that a directory over the cap shows its first names in order, and one at the cap isn't flagged."""
+        for i in reversed(range(30)):
+            (tmp_path / f"file_{i:03}.txt").write_text("")
+
+        capped = listing.list_directory(str(tmp_path), max_entries=5)
+        assert capped.output.splitlines()[1:6] == [f"{tmp_path}/file_{i:03}.txt" for i in range(5)]
+        assert "Listing stopped after 5 entries" in capped.output
+
+        exact = listing.list_directory(str(tmp_path), max_entries=30)
+        assert exact.output.count("file_") == 30
+        assert "Listing stopped" not in exact.output
+
+    def test_cache_invalidated_by_directory_change(self, tmp_path):
+        """Test that a cached listing is reused until a listed directory changes."""
+        (tmp_path / "sub").mkdir()
+        first = listing.list_directory(str(tmp_path))
+        assert listing.list_directory(str(tmp_path)) is first
+
+        (tmp_path / "sub" / "new.txt").write_text("")
+        second = listing.list_directory(str(tmp_path))
+        assert second is not first
+        assert "new.txt" in second.output
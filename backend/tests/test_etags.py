@@ -0,0 +1,87 @@
+from unittest.mock import AsyncMock, patch
+from fastapi.testclient import TestClient
+
+from main import app
+from app.service.session_notifier import session_notifier
+
+
+class TestPollingETags:
+    """Test conditional requests on the polling endpoints."""
+
+    def setup_method(self):
+        session_notifier.forget(1)
+        session_notifier.seed(1, last_message_id=7, status="completed")
+
+    def teardown_method(self):
+        session_notifier.forget(1)
+
+    @patch('app.db.crud.get_messages_by_session_id', new_callable=AsyncMock)
+    def test_unchanged_session_returns_304_without_loading_rows(self, mock_get_messages):
+        """Test that a matching If-None-Match skips the message query."""
+        mock_get_messages.return_value = []
+        client = TestClient(app)
+
+        first = client.get("/sessions/1/messages?after_id=7")
+        etag = first.headers["etag"]
+        second = client.get("/sessions/1/messages?after_id=7",
+                            headers={"If-None-Match": etag})
+
+        assert first.status_code == 200
+        assert first.headers["cache-control"] == "no-cache"
+        assert second.status_code == 304
+        assert second.headers["etag"] == etag
+        assert mock_get_messages.call_count == 1
+
+    @patch('app.db.crud.get_messages_by_session_id', new_callable=AsyncMock)
+    def test_new_message_changes_etag(self, mock_get_messages):
+        """Test that publishing a message invalidates the previous tag."""
+        mock_get_messages.return_value = []
+        client = TestClient(app)
+
+        etag = client.get("/sessions/1/messages").headers["etag"]
+        session_notifier.publish(1, message_id=8)
+        response = client.get("/sessions/1/messages", headers={"If-None-Match": etag})
+
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+
+    @patch('app.db.crud.get_messages_by_session_id', new_callable=AsyncMock)
+    def test_etag_depends_on_query(self, mock_get_messages):
+        """Test that different pages of the same session get different tags."""
+        mock_get_messages.return_value = []
+        client = TestClient(app)
+
+        first_page = client.get("/sessions/1/messages").headers["etag"]
+        next_page = client.get("/sessions/1/messages?after_id=3").headers["etag"]
+
+        assert first_page != next_page
+
+    @patch('app.db.crud.get_session_by_id', new_callable=AsyncMock)
+    def test_status_endpoint_supports_etags(self, mock_get_session):
+        """Test that /status answers 304 for an unchanged session."""
+        mock_get_session.return_value = {
+            "id": 1, "status": "completed", "created_at": "2025-10-17T12:33:45.638595Z"}
+        client = TestClient(app)
+
+        etag = client.get("/sessions/1/status").headers["etag"]
+        response = client.get("/sessions/1/status", headers={"If-None-Match": etag})
+
+        assert response.status_code == 304
+        assert mock_get_session.call_count == 1
+
+    @patch('app.db.crud.get_session_poll_state', new_callable=AsyncMock)
+    @patch('app.db.crud.get_messages_by_session_id', new_callable=AsyncMock)
+    def test_standalone_workers_on_sqlite_read_the_database(self, mock_get_messages, mock_poll_state, monkeypatch):
+        """Test that ETags follow the database when session events can't reach the API."""
+        monkeypatch.setattr('app.service.session_events.settings.JOB_EXECUTION_MODE', "external")
+        mock_get_messages.return_value = []
+        mock_poll_state.return_value = {"last_message_id": 7, "status": "completed"}
+        client = TestClient(app)
+
+        etag = client.get("/sessions/1/messages").headers["etag"]
+        # a worker wrote a message; the notifier never hears of it
+        mock_poll_state.return_value = {"last_message_id": 8, "status": "completed"}
+        response = client.get("/sessions/1/messages", headers={"If-None-Match": etag})
+
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
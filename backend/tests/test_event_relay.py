@@ -0,0 +1,157 @@
+import asyncio
+import json
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+
+from app.service import event_relay as relay_module
+from app.service.event_relay import (
+    LocalEventRelay, PostgresEventRelay, create_event_relay, listen_dsn, MAX_NOTIFY_PAYLOAD)
+from app.service.session_events import dispatch
+from app.service.session_notifier import session_notifier
+from app.service.stream_manager import stream_manager
+
+
+def _message(message_id, text="hi"):
+    return {"id": message_id, "session_id": 9001, "role": "assistant", "content": {"text": text},
+            "base64_image": None, "image_hash": None, "created_at": datetime(2026, 1, 1)}
+
+
+class TestDispatch:
+    """Test applying relayed session events to this worker."""
+
+    def teardown_method(self):
+        stream_manager.close_stream(9001)
+        session_notifier.forget(9001)
+
+    def test_message_event_reaches_notifier_and_stream(self):
+        """Test that a relayed message wakes long polls and live viewers."""
+        async def run():
+            subscriber = stream_manager.subscribe(9001)
+            await dispatch({"session_id": 9001, "type": "message", "message_id": 5,
+                            "message": {"id": 5}})
+            return await subscriber.get(timeout=0)
+
+        event = asyncio.run(run())
+        assert event.data == {"id": 5}
+        assert session_notifier.get(9001).last_message_id == 5
+
+    @patch('app.db.crud.get_message_by_id')
+    def test_oversized_message_is_loaded_for_viewers(self, mock_get_message):
+        """Test that a message sent by reference is read back only when someone is watching."""
+        mock_get_message.return_value = _message(6)
+
+        async def run():
+            await dispatch({"session_id": 9001, "type": "message", "message_id": 6})
+            unwatched_calls = mock_get_message.call_count
+            subscriber = stream_manager.subscribe(9001)
+            await dispatch({"session_id": 9001, "type": "message", "message_id": 6})
+            return unwatched_calls, await subscriber.get(timeout=0)
+
+        unwatched_calls, event = asyncio.run(run())
+        assert unwatched_calls == 0
+        assert event.data["id"] == 6
+
+    def test_end_event_closes_stream(self):
+        """Test that the end of a session closes its stream on every worker."""
+        stream_manager.create_stream(9001)
+        asyncio.run(dispatch({"session_id": 9001, "type": "end"}))
+        assert stream_manager.get_stream(9001) is None
+
+
+class TestPostgresEventRelay:
+    """Test the LISTEN/NOTIFY relay without a database."""
+
+    def test_publish_dispatches_locally_and_notifies(self):
+        """Test that publishing reaches local viewers and issues pg_notify on the writer's connection."""
+        dispatched = []
+
+        async def record(event):
+            dispatched.append(event)
+
+        relay = PostgresEventRelay(record, "postgresql://db/app")
+        conn = AsyncMock()
+        event = {"session_id": 1, "type": "status", "status": "running"}
+        asyncio.run(relay.publish(conn, event))
+
+        assert dispatched == [event]
+        params = conn.execute.call_args.args[1]
+        assert params["channel"] == "session_events"
+        assert json.loads(params["payload"])["status"] == "running"
+        conn.commit.assert_awaited_once()
+
+    def test_oversized_message_is_sent_by_reference(self):
+        """Test that payloads over the NOTIFY limit drop the inline message."""
+        relay = PostgresEventRelay(AsyncMock(), "postgresql://db/app")
+        event = {"session_id": 1, "type": "message", "message_id": 3,
+                 "message": {"text": "x" * MAX_NOTIFY_PAYLOAD}}
+
+        payload = json.loads(relay.encode(event))
+
+        assert "message" not in payload
+        assert payload["message_id"] == 3
+
+    def test_batch_is_one_notification(self):
+        """Test that a batch of events is dispatched locally and notified in one payload."""
+        dispatched = []
+
+        async def record(event):
+            dispatched.append(event)
+
+        relay = PostgresEventRelay(record, "postgresql://db/app")
+        conn = AsyncMock()
+        events = [{"session_id": 1, "type": "message", "message_id": i, "message": {"n": i}}
+                  for i in range(3)]
+        asyncio.run(relay.publish_many(conn, events))
+
+        assert dispatched == events
+        assert conn.execute.await_count == 1
+        conn.commit.assert_awaited_once()
+        other = PostgresEventRelay(AsyncMock(), "postgresql://db/app")
+        other._queue = asyncio.Queue()
+        other._on_notification(None, 1, "session_events", conn.execute.call_args.args[1]["payload"])
+        assert [other._queue.get_nowait() for _ in range(3)] == events
+
+    def test_large_batch_is_split_under_the_limit(self):
+        """Test that a batch too big for one NOTIFY is split, and oversized messages go by reference."""
+        relay = PostgresEventRelay(AsyncMock(), "postgresql://db/app")
+        events = [{"session_id": 1, "type": "message", "message_id": i, "message": {"text": "x" * 3000}}
+                  for i in range(4)]
+        events.append({"session_id": 1, "type": "message", "message_id": 4,
+                       "message": {"text": "x" * MAX_NOTIFY_PAYLOAD}})
+
+        payloads = relay.encode_batch(events)
+
+        assert len(payloads) == 2
+        assert all(len(payload.encode()) <= MAX_NOTIFY_PAYLOAD for payload in payloads)
+        decoded = [event for payload in payloads for event in json.loads(payload)["events"]]
+        assert [event["message_id"] for event in decoded] == [0, 1, 2, 3, 4]
+        assert "message" not in decoded[4]
+
+    def test_own_notifications_are_ignored(self):
+        """Test that a worker does not dispatch its own events twice."""
+        relay = PostgresEventRelay(AsyncMock(), "postgresql://db/app")
+        relay._queue = asyncio.Queue()
+        event = {"session_id": 1, "type": "end"}
+
+        relay._on_notification(None, 1, "session_events", relay.encode(event))
+        relay._on_notification(None, 1, "session_events",
+                               json.dumps({**event, "origin": "other-worker"}))
+
+        assert relay._queue.qsize() == 1
+        assert relay._queue.get_nowait() == event
+
+
+class TestCreateEventRelay:
+    """Test choosing the relay from settings."""
+
+    def test_sqlite_uses_in_process_relay(self):
+        """Test that SQLite deployments fall back to the in-process relay."""
+        with patch.object(relay_module.settings, "DATABASE_URL", "sqlite+aiosqlite:///./app.db"):
+            assert isinstance(create_event_relay(AsyncMock()), LocalEventRelay)
+
+    def test_postgres_uses_listen_notify(self):
+        """Test that postgres deployments relay through LISTEN/NOTIFY."""
+        url = "postgresql+asyncpg://user:secret@db:5432/app"
+        with patch.object(relay_module.settings, "DATABASE_URL", url):
+            assert isinstance(create_event_relay(AsyncMock()), PostgresEventRelay)
+        assert listen_dsn(url) == "postgresql://user:secret@db:5432/app"
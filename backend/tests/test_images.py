@@ -0,0 +1,63 @@
+from unittest.mock import AsyncMock, patch
+from fastapi.testclient import TestClient
+from main import app
+
+from app.service.blob_store import BlobStore, LocalBlobBackend
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + b"pixels" * 100
+
+
+class TestImagesEndpoint:
+    """Test serving screenshots by content hash."""
+
+    def test_serves_raw_bytes_with_cache_headers(self, tmp_path):
+        """Test that an image is returned as binary with immutable caching."""
+        store = BlobStore(LocalBlobBackend(tmp_path))
+        image_ref = store.put(PNG_BYTES)
+
+        with patch('app.api.images.blob_store', store):
+            client = TestClient(app)
+            response = client.get(f"/images/{image_ref.hash}")
+            cached = client.get(f"/images/{image_ref.hash}",
+                                headers={"If-None-Match": f'"{image_ref.hash}"'})
+
+        assert response.status_code == 200
+        assert response.content == PNG_BYTES
+        assert response.headers["content-type"] == "image/png"
+        assert response.headers["etag"] == f'"{image_ref.hash}"'
+        assert "immutable" in response.headers["cache-control"]
+        assert cached.status_code == 304
+        assert cached.content == b""
+
+    def test_unknown_or_malformed_hash(self, tmp_path):
+        """Test that missing and malformed hashes return 404."""
+        store = BlobStore(LocalBlobBackend(tmp_path))
+
+        with patch('app.api.images.blob_store', store):
+            client = TestClient(app)
+            assert client.get(f"/images/{'0' * 64}").status_code == 404
+            assert client.get("/images/..%2Fetc%2Fpasswd").status_code == 404
+
+    # no session row to version the response by, so no ETag check
+    @patch('app.db.crud.get_session_poll_state', new_callable=AsyncMock, return_value=None)
+    @patch('app.db.crud.get_messages_by_session_id')
+    def test_message_listing_returns_image_reference(self, mock_get_messages, _mock_poll_state):
+        """Test that polled messages carry an image URL instead of inline base64."""
+        mock_get_messages.return_value = [
+            {
+                "id": 1,
+                "session_id": 1,
+                "role": "tool",
+                "content": {"type": "tool_result"},
+                "base64_image": None,
+                "image_hash": "a" * 64,
+                "created_at": "2025-10-17T12:33:45.638595Z"
+            }
+        ]
+
+        client = TestClient(app)
+        response = client.get("/sessions/1/messages")
+
+        assert response.status_code == 200
+        assert response.json()[0]["image_url"] == f"/images/{'a' * 64}"
+        assert response.json()[0]["base64_image"] is None
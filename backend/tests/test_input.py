@@ -0,0 +1,154 @@
+import asyncio
+import os
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.service.computer_use.tools import ComputerTool20250124, Display, XdotoolInput
+from app.service.computer_use.tools.base import ToolResult
+
+# stands in for xdotool: logs when each command starts and ends, fails on "key -- fail"
+FAKE_XDOTOOL = """#!/bin/sh
+echo "start $DISPLAY $*" >> "$XDOTOOL_LOG"
+sleep 0.05
+echo "end $DISPLAY $*" >> "$XDOTOOL_LOG"
+[ "$3" = "fail" ] && { echo "no such key" >&2; exit 1; }
+exit 0
+"""
+
+
+@pytest.fixture
+def xdotool_log(tmp_path, monkeypatch):
+    xdotool = tmp_path / "xdotool"
+    xdotool.write_text(FAKE_XDOTOOL)
+    xdotool.chmod(0o755)
+    log = tmp_path / "xdotool.log"
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("XDOTOOL_LOG", str(log))
+    return log
+
+
+def _lines(log):
+    return log.read_text().splitlines()
+
+
+class TestXdotoolInput:
+    """Test sending batches of input events to a display."""
+
+    def test_batch_runs_in_order_with_latency(self, xdotool_log):
+        """Test that events run in order, a click at a point is one command, and each reports its latency."""
+        backend = XdotoolInput("DISPLAY=:5 ")
+        events = [
+            {"type": "click", "x": 10, "y": 20},
+            {"type": "type", "text": "hi there"},
+            {"type": "key", "key": "Return"},
+        ]
+
+        results = asyncio.run(backend.send(events))
+
+        assert [line for line in _lines(xdotool_log) if line.startswith("start")] == [
+            "start :5 mousemove --sync 10 20 click --repeat 1 --delay 10 1",
+            "start :5 type --delay 12 -- hi there",
+            "start :5 key -- Return",
+        ]
+        assert [result.ok for result in results] == [True, True, True]
+        assert all(result.latency_ms >= 50 for result in results)
+
+    def test_batch_stops_at_failed_event(self, xdotool_log):
+        """Test that events after one xdotool rejects are not sent."""
+        backend = XdotoolInput("DISPLAY=:5 ")
+
+        results = asyncio.run(backend.send([
+            {"type": "key", "key": "fail"},
+            {"type": "type", "text": "never"},
+        ]))
+
+        assert len(results) == 1
+        assert results[0].ok is False
+        assert "no such key" in results[0].error
+        assert not any("never" in line for line in _lines(xdotool_log))
+
+    def test_invalid_batch_sends_nothing(self, xdotool_log):
+        """Test that a batch with an invalid event is rejected before any input is sent."""
+        backend = XdotoolInput("DISPLAY=:5 ")
+
+        with pytest.raises(ValueError, match="needs both x and y"):
+            asyncio.run(backend.send([{"type": "key", "key": "a"}, {"type": "click", "x": 3}]))
+        assert not xdotool_log.exists()
+
+    def test_tool_and_operator_input_do_not_interleave(self, xdotool_log):
+        """Test that the computer tool and an operator batch on one display run one command at a time."""
+        tool = ComputerTool20250124(display=Display(number=6, width=1024, height=768))
+        operator = XdotoolInput.shared("DISPLAY=:6 ")
+        assert tool.input is operator
+
+        async def run():
+            await asyncio.gather(
+                tool.input_shell("key -- a", take_screenshot=False),
+                operator.send([{"type": "key", "key": "b"}, {"type": "key", "key": "c"}]),
+                tool.input_shell("key -- d", take_screenshot=False),
+            )
+
+        asyncio.run(run())
+        lines = _lines(xdotool_log)
+        # every start is directly followed by its own end
+        assert all(end == start.replace("start", "end", 1)
+                   for start, end in zip(lines[::2], lines[1::2]))
+        assert len(lines) == 8
+
+    def test_typed_text_is_not_split_by_operator_input(self, xdotool_log):
+        """Test that an operator batch waits until every chunk of the tool's typed text is sent."""
+        tool = ComputerTool20250124(display=Display(number=8, width=1024, height=768))
+        operator = XdotoolInput.shared("DISPLAY=:8 ")
+
+        async def run():
+            with patch.object(tool, "screenshot", AsyncMock(return_value=ToolResult(base64_image="png"))):
+                typing = asyncio.create_task(tool(action="type", text="x" * 120))
+                await asyncio.sleep(0.02)
+                await operator.send([{"type": "key", "key": "b"}])
+                return await typing
+
+        result = asyncio.run(run())
+        starts = [line for line in _lines(xdotool_log) if line.startswith("start")]
+        # three chunks of typing, then the operator's key
+        assert [line.split(" -- ")[0] for line in starts] == ["start :8 type --delay 12"] * 3 + ["start :8 key"]
+        assert result.base64_image == "png"
+
+
+class TestInteractRoute:
+    """Test the operator input endpoint."""
+
+    def test_interact_returns_per_event_results(self, xdotool_log, monkeypatch):
+        """Test that /vnc/interact runs the batch on the requested display."""
+        from main import app
+
+        monkeypatch.setattr("app.routes.vnc.display_pool.leases", {1: Display(number=7, width=1024, height=768)})
+        response = TestClient(app).post("/vnc/interact", json={
+            "display": 7,
+            "events": [{"type": "move", "x": 1, "y": 2}, {"type": "scroll", "direction": "down", "amount": 3}],
+        })
+
+        assert response.status_code == 200
+        body = response.json()
+        assert (body["completed"], body["total"]) == (2, 2)
+        assert [result["type"] for result in body["results"]] == ["move", "scroll"]
+        assert "start :7 click --repeat 3 5" in _lines(xdotool_log)
+
+    def test_invalid_event_is_rejected(self, xdotool_log):
+        """Test that an event missing its parameters is a client error."""
+        from main import app
+
+        response = TestClient(app).post("/vnc/interact", json={"events": [{"type": "move"}]})
+
+        assert response.status_code == 422
+
+    def test_display_not_in_use_is_404(self, xdotool_log):
+        """Test that input to a display that is neither shared nor leased is refused before anything is sent."""
+        from main import app
+
+        response = TestClient(app).post("/vnc/interact", json={
+            "display": 77, "events": [{"type": "key", "key": "a"}]})
+
+        assert response.status_code == 404
+        assert not xdotool_log.exists()
@@ -0,0 +1,264 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import timedelta
+from unittest.mock import AsyncMock, patch
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db import jobs
+from app.db.models import meta, sessions, session_jobs
+from app.service.worker_pool import SessionWorkerPool
+
+
+async def _queue(db_path, queued):
+    """Create a database with one session per (provider, priority) in `queued`."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(meta.create_all)
+    async with engine.connect() as conn:
+        for session_id, (provider, priority) in enumerate(queued, start=1):
+            await conn.execute(insert(sessions).values(
+                id=session_id, initial_prompt="hi", provider=provider))
+            await jobs.enqueue_session(conn, session_id, provider,
+                                       {"initial_prompt": "hi"}, priority)
+    return engine
+
+
+class TestClaim:
+    """Test leasing jobs from the session queue."""
+
+    def test_claims_by_priority_then_age(self, tmp_path):
+        """Test that higher priority jobs go first and ties go oldest first."""
+        async def run():
+            engine = await _queue(tmp_path / "q.db", [("anthropic", 0), ("anthropic", 5), ("anthropic", 5)])
+            claimed = []
+            async with engine.connect() as conn:
+                while job := await jobs.claim_session_job(conn, "w1", 60, 2):
+                    claimed.append(job.session_id)
+            await engine.dispose()
+            return claimed
+
+        assert asyncio.run(run()) == [2, 3, 1]
+
+    def test_saturated_providers_are_skipped(self, tmp_path):
+        """Test that jobs of excluded providers stay queued."""
+        async def run():
+            engine = await _queue(tmp_path / "q.db", [("anthropic", 9), ("openai", 0)])
+            async with engine.connect() as conn:
+                job = await jobs.claim_session_job(conn, "w1", 60, 2, excluded_providers=["anthropic"])
+            await engine.dispose()
+            return job
+
+        job = asyncio.run(run())
+        assert job.provider == "openai"
+        assert job.attempts == 1
+
+    def test_expired_lease_is_reclaimed(self, tmp_path):
+        """Test that a job whose worker stopped renewing is claimed by another worker."""
+        async def run():
+            engine = await _queue(tmp_path / "q.db", [("anthropic", 0)])
+            async with engine.connect() as conn:
+                first = await jobs.claim_session_job(conn, "w1", 60, 2)
+                while_leased = await jobs.claim_session_job(conn, "w2", 60, 2)
+                await conn.execute(update(session_jobs).values(
+                    locked_until=jobs._now() - timedelta(seconds=1)))
+                await conn.commit()
+                second = await jobs.claim_session_job(conn, "w2", 60, 2)
+                renewed = await jobs.extend_lease(conn, first.id, "w1", 60)
+            await engine.dispose()
+            return first, while_leased, second, renewed
+
+        first, while_leased, second, renewed = asyncio.run(run())
+        assert while_leased is None
+        assert second.id == first.id
+        assert second.attempts == 2
+        # the old worker finds out its lease is gone
+        assert renewed is False
+
+    def test_exhausted_jobs_fail(self, tmp_path):
+        """Test that an abandoned job out of attempts is failed instead of retried."""
+        async def run():
+            engine = await _queue(tmp_path / "q.db", [("anthropic", 0)])
+            async with engine.connect() as conn:
+                await jobs.claim_session_job(conn, "w1", 0, 1)
+                retried = await jobs.claim_session_job(conn, "w2", 60, 1)
+                failed = await jobs.fail_exhausted_jobs(conn, 1)
+                state = (await conn.execute(select(session_jobs.c.state))).scalar()
+            await engine.dispose()
+            return retried, failed, state
+
+        retried, failed, state = asyncio.run(run())
+        assert retried is None
+        assert failed == [1]
+        assert state == "failed"
+
+
+async def _run_pool(db_path, queued, run_job, **pool_options):
+    engine = await _queue(db_path, queued)
+
+    @asynccontextmanager
+    async def connection():
+        async with engine.connect() as conn:
+            yield conn
+
+    with patch('app.service.worker_pool.db_connection', connection), \
+            patch('app.service.worker_pool.publish_status', new_callable=AsyncMock):
+        pool = SessionWorkerPool(run_job=run_job, poll_interval=0.01, worker_id="w1", **pool_options)
+        await pool.start()
+        for _ in range(200):
+            async with engine.connect() as conn:
+                states = (await conn.execute(
+                    select(session_jobs.c.state).order_by(session_jobs.c.id))).scalars().all()
+            if all(state in ("done", "failed") for state in states):
+                break
+            await asyncio.sleep(0.01)
+        await pool.stop()
+    await engine.dispose()
+    return states
+
+
+class TestWorkerPool:
+    """Test the bounded pool that runs queued sessions."""
+
+    def test_runs_queued_sessions_within_limits(self, tmp_path):
+        """Test that every job runs and per-provider limits hold."""
+        running = {"anthropic": 0, "openai": 0}
+        peak = {"anthropic": 0, "openai": 0}
+
+        async def run_job(job):
+            running[job.provider] += 1
+            peak[job.provider] = max(peak[job.provider], running[job.provider])
+            await asyncio.sleep(0.02)
+            running[job.provider] -= 1
+
+        queued = [("anthropic", 0)] * 4 + [("openai", 0)] * 2
+        states = asyncio.run(_run_pool(tmp_path / "q.db", queued, run_job,
+                                       size=4, provider_limits={"anthropic": 1}))
+
+        assert states == ["done"] * 6
+        assert peak["anthropic"] == 1
+        assert peak["openai"] == 2
+
+    def test_failed_run_marks_the_job_failed(self, tmp_path):
+        """Test that an exception from the agent ends the job as failed."""
+        async def run_job(job):
+            raise RuntimeError("boom")
+
+        states = asyncio.run(_run_pool(tmp_path / "q.db", [("anthropic", 0)], run_job))
+        assert states == ["failed"]
+
+    def test_lost_lease_cancels_the_run(self, tmp_path):
+        """Test that a run stops as soon as its lease is lost, so a session never runs twice at once."""
+        running, peak, cancelled = [0], [0], []
+
+        async def run_job(job):
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            try:
+                await asyncio.sleep(3600)
+            except asyncio.CancelledError:
+                cancelled.append(job.attempts)
+                raise
+            finally:
+                running[0] -= 1
+
+        with patch('app.service.worker_pool.jobs.extend_lease', new=AsyncMock(return_value=False)):
+            states = asyncio.run(_run_pool(tmp_path / "q.db", [("anthropic", 0)], run_job,
+                                           visibility_timeout=0.03, max_attempts=2))
+
+        # each attempt was stopped when its lease went, then the job ran out of attempts
+        assert cancelled == [1, 2]
+        assert peak[0] == 1
+        assert states == ["failed"]
+
+    def test_rerun_does_not_save_the_prompt_again(self):
+        """Test that a session's initial prompt is only saved when it has no user message yet."""
+        from app.service.worker_pool import run_session_job
+
+        @asynccontextmanager
+        async def connection():
+            yield None
+
+        with patch('app.service.agent_service.run_agent_session', new_callable=AsyncMock) as agent, \
+                patch('app.service.worker_pool.db_connection', connection), \
+                patch('app.db.crud.session_has_user_message', new_callable=AsyncMock,
+                      side_effect=[False, True]):
+            for _ in range(2):
+                asyncio.run(run_session_job(jobs.SessionJob(
+                    id=1, session_id=7, provider="anthropic", priority=0,
+                    payload={"initial_prompt": "hi"}, attempts=1)))
+
+        assert [call.kwargs["save_prompt"] for call in agent.call_args_list] == [True, False]
+
+
+class TestRelease:
+    """Test handing running sessions back to the queue on shutdown."""
+
+    def test_released_job_is_queued_without_using_an_attempt(self, tmp_path):
+        """Test that a stopped pool requeues its job, attempts unchanged, and marks the session queued."""
+        started = asyncio.Event()
+
+        async def run_job(job):
+            started.set()
+            await asyncio.sleep(3600)
+
+        async def run():
+            engine = await _queue(tmp_path / "q.db", [("anthropic", 0)])
+
+            @asynccontextmanager
+            async def connection():
+                async with engine.connect() as conn:
+                    yield conn
+
+            with patch('app.service.worker_pool.db_connection', connection), \
+                    patch('app.service.worker_pool.publish_status', new_callable=AsyncMock) as publish:
+                pool = SessionWorkerPool(run_job=run_job, poll_interval=0.01, worker_id="w1")
+                await pool.start()
+                await asyncio.wait_for(started.wait(), 5)
+                await pool.stop()
+            async with engine.connect() as conn:
+                job = (await conn.execute(select(session_jobs))).first()
+                status = (await conn.execute(select(sessions.c.status))).scalar()
+            await engine.dispose()
+            return job, status, publish
+
+        job, status, publish = asyncio.run(run())
+        assert (job.state, job.attempts, job.locked_by) == ("queued", 0, None)
+        assert status == "queued"
+        assert publish.await_args.args[1:] == (1, "queued")
+
+    def test_cancelled_session_leaves_its_stream_open(self):
+        """Test that a run cancelled for release neither ends the stream nor sets a final status."""
+        from app.service import agent_service
+
+        sampling = asyncio.Event()
+
+        async def sampling_loop(**kwargs):
+            sampling.set()
+            await asyncio.sleep(3600)
+
+        @asynccontextmanager
+        async def connection():
+            yield None
+
+        async def run():
+            task = asyncio.create_task(agent_service.run_agent_session(session_id=7, initial_prompt="hi"))
+            await asyncio.wait_for(sampling.wait(), 5)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            return task
+
+        with patch('app.service.agent_service.sampling_loop', sampling_loop), \
+                patch('app.service.agent_service.settings.ANTHROPIC_API_KEY', "key"), \
+                patch('app.service.agent_service.start_vnc_services', new_callable=AsyncMock), \
+                patch('app.service.agent_service._update_status', new_callable=AsyncMock) as update_status, \
+                patch('app.service.agent_service._save_message', new_callable=AsyncMock), \
+                patch('app.service.agent_service.message_writer.flush', new_callable=AsyncMock) as flush, \
+                patch('app.service.agent_service.db_connection', connection), \
+                patch('app.service.agent_service.end_session_stream', new_callable=AsyncMock) as end_stream:
+            task = asyncio.run(run())
+
+        assert task.cancelled()
+        assert [call.kwargs["status"] for call in update_status.await_args_list] == ["running"]
+        flush.assert_awaited_with(7)
+        end_stream.assert_not_awaited()
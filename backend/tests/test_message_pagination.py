@@ -0,0 +1,111 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from main import app
+from app.db import crud
+from app.db.models import meta, sessions, messages
+
+
+async def _seed_and_query(db_path, **kwargs):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(meta.create_all)
+        await conn.execute(insert(sessions).values(id=1, initial_prompt="hi", provider="anthropic"))
+        await conn.execute(insert(sessions).values(id=2, initial_prompt="hi", provider="anthropic"))
+        for i in range(1, 13):
+            await conn.execute(insert(messages).values(
+                id=i, session_id=1 if i != 5 else 2, role="assistant", content={"n": i}))
+    async with engine.connect() as conn:
+        rows = await crud.get_messages_by_session_id(conn=conn, session_id=1, **kwargs)
+    await engine.dispose()
+    return [row["id"] for row in rows]
+
+
+class TestMessagePagination:
+    """Test keyset pagination of a session's messages."""
+
+    def test_first_page_is_oldest_first(self, tmp_path):
+        """Test that without a cursor the oldest messages come first."""
+        ids = asyncio.run(_seed_and_query(tmp_path / "t.db", limit=3))
+        assert ids == [1, 2, 3]
+
+    def test_after_id_returns_only_newer_messages(self, tmp_path):
+        """Test that after_id pages forward from the cursor."""
+        ids = asyncio.run(_seed_and_query(tmp_path / "t.db", after_id=4))
+        assert ids == [6, 7, 8, 9, 10, 11, 12]
+
+    def test_before_id_returns_the_latest_older_page(self, tmp_path):
+        """Test that before_id pages backward but still returns ascending ids."""
+        ids = asyncio.run(_seed_and_query(tmp_path / "t.db", before_id=10, limit=3))
+        assert ids == [7, 8, 9]
+
+    # no session row to version the response by, so no ETag check
+    @patch('app.db.crud.get_session_poll_state', new_callable=AsyncMock, return_value=None)
+    @patch('app.db.crud.get_messages_by_session_id')
+    def test_endpoint_passes_cursor(self, mock_get_messages, _mock_poll_state):
+        """Test that the polling endpoint forwards after_id and validates limit."""
+        mock_get_messages.return_value = []
+
+        client = TestClient(app)
+        response = client.get("/sessions/1/messages?after_id=41&limit=50")
+
+        assert response.status_code == 200
+        assert mock_get_messages.call_args.kwargs["after_id"] == 41
+        assert mock_get_messages.call_args.kwargs["limit"] == 50
+        assert client.get("/sessions/1/messages?limit=100000").status_code == 422
+
+
+async def _seed_and_snapshot(db_path, session_id, **kwargs):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(meta.create_all)
+        await conn.execute(insert(sessions).values(
+            id=1, initial_prompt="hi", provider="anthropic", status="running"))
+        for i in range(1, 6):
+            await conn.execute(insert(messages).values(
+                id=i, session_id=1, role="tool", content={"n": i}, base64_image="aGk="))
+    async with engine.connect() as conn:
+        snapshot = await crud.get_session_snapshot(conn=conn, session_id=session_id, **kwargs)
+    await engine.dispose()
+    return snapshot
+
+
+class TestSessionSnapshot:
+    """Test the combined status and messages snapshot."""
+
+    def test_snapshot_has_status_count_and_new_messages(self, tmp_path):
+        """Test that one query returns status, count and lean new messages."""
+        snapshot = asyncio.run(_seed_and_snapshot(tmp_path / "t.db", 1, after_id=3))
+
+        assert snapshot["status"] == "running"
+        assert snapshot["message_count"] == 5
+        assert [message["id"] for message in snapshot["messages"]] == [4, 5]
+        assert "base64_image" not in snapshot["messages"][0]
+
+    def test_snapshot_without_new_messages(self, tmp_path):
+        """Test that an up-to-date cursor still returns the status."""
+        snapshot = asyncio.run(_seed_and_snapshot(tmp_path / "t.db", 1, after_id=5))
+
+        assert snapshot["status"] == "running"
+        assert snapshot["messages"] == []
+
+    def test_snapshot_of_missing_session(self, tmp_path):
+        """Test that an unknown session yields no snapshot."""
+        assert asyncio.run(_seed_and_snapshot(tmp_path / "t.db", 2)) is None
+
+    # no session row to version the response by, so no ETag check
+    @patch('app.db.crud.get_session_poll_state', new_callable=AsyncMock, return_value=None)
+    @patch('app.db.crud.get_session_snapshot')
+    def test_endpoint_suggests_next_poll(self, mock_snapshot, _mock_poll_state):
+        """Test that the endpoint backs off for finished sessions."""
+        mock_snapshot.return_value = {"status": "completed", "message_count": 3, "messages": []}
+
+        client = TestClient(app)
+        response = client.get("/sessions/1/snapshot?after_id=3")
+
+        assert response.status_code == 200
+        assert response.json()["last_message_id"] == 3
+        assert response.json()["next_poll_ms"] is None
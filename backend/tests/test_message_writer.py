@@ -0,0 +1,143 @@
+import asyncio
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, patch
+import pytest
+from sqlalchemy import event, insert, select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.api.schemas import MessageCreate
+from app.db import crud
+from app.db.models import meta, sessions, messages
+from app.service.message_writer import MessageWriter
+
+
+async def _run_writer(db_path, submit, create_messages=None):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(meta.create_all)
+        for session_id in (1, 2):
+            await conn.execute(insert(sessions).values(
+                id=session_id, initial_prompt="hi", provider="anthropic"))
+
+    @asynccontextmanager
+    async def connection():
+        async with engine.connect() as conn:
+            yield conn
+
+    create_messages = create_messages or AsyncMock(side_effect=crud.create_messages)
+    publish_messages = AsyncMock()
+    with patch('app.service.message_writer.db_connection', connection), \
+            patch('app.db.crud.create_messages', create_messages), \
+            patch('app.service.message_writer.publish_messages', publish_messages):
+        writer = MessageWriter(flush_interval=0.01)
+        await submit(writer)
+        await writer.close()
+
+    async with engine.connect() as conn:
+        rows = (await conn.execute(select(messages.c.session_id, messages.c.content)
+                                   .order_by(messages.c.id))).fetchall()
+    await engine.dispose()
+    return rows, create_messages, publish_messages
+
+
+class TestMessageWriter:
+    """Test group-committed message persistence."""
+
+    def test_messages_from_all_sessions_share_one_insert(self, tmp_path):
+        """Test that messages queued together are written with one statement, in order."""
+        async def submit(writer):
+            for i in range(3):
+                for session_id in (1, 2):
+                    await writer.submit(MessageCreate(
+                        session_id=session_id, role="assistant", content={"n": i}))
+            await writer.flush(1)
+
+        rows, create_messages, publish_messages = asyncio.run(_run_writer(tmp_path / "t.db", submit))
+
+        assert create_messages.await_count == 1
+        assert [row.content["n"] for row in rows if row.session_id == 1] == [0, 1, 2]
+        # the whole batch is announced at once, after it is committed
+        publish_messages.assert_awaited_once()
+        published = [row.content["n"] for row in publish_messages.await_args.args[1] if row.session_id == 2]
+        assert published == [0, 1, 2]
+
+    def test_submit_does_not_wait_for_the_write(self, tmp_path):
+        """Test that the agent gets a future back before the row is committed."""
+        async def submit(writer):
+            future = await writer.submit(MessageCreate(
+                session_id=1, role="user", content={"text": "hi"}))
+            assert not future.done()
+            await writer.flush(1)
+            assert future.result().id == 1
+
+        rows, _, _ = asyncio.run(_run_writer(tmp_path / "t.db", submit))
+        assert len(rows) == 1
+
+    def test_bad_row_fails_only_its_own_message(self, tmp_path):
+        """Test that a batch the database rejects is retried row by row."""
+        insert = crud.create_messages
+
+        async def create_messages(conn, messages_data):
+            if any(message.content.get("bad") for message in messages_data):
+                raise ValueError("rejected row")
+            return await insert(conn=conn, messages_data=messages_data)
+
+        async def submit(writer):
+            futures = [await writer.submit(MessageCreate(session_id=1, role="assistant", content=content))
+                       for content in ({"n": 0}, {"bad": True}, {"n": 2})]
+            await asyncio.gather(*futures, return_exceptions=True)
+            assert [future.exception() is None for future in futures] == [True, False, True]
+            with pytest.raises(ValueError):
+                await futures[1]
+
+        rows, _, publish_messages = asyncio.run(_run_writer(
+            tmp_path / "t.db", submit, AsyncMock(side_effect=create_messages)))
+
+        assert [row.content for row in rows] == [{"n": 0}, {"n": 2}]
+        announced = [row.content for call in publish_messages.await_args_list for row in call.args[1]]
+        assert announced == [{"n": 0}, {"n": 2}]
+
+    def test_flush_raises_write_errors(self):
+        """Test that a failed batch surfaces on the next flush of its session."""
+        async def run():
+            writer = MessageWriter(flush_interval=0)
+            with patch('app.service.message_writer.db_connection', side_effect=RuntimeError("db down")):
+                await writer.submit(MessageCreate(session_id=1, role="user", content={}))
+                with pytest.raises(RuntimeError):
+                    await writer.flush(1)
+                # the failure is reported once, later flushes don't raise
+                await writer.flush(1)
+            await writer.close()
+
+        asyncio.run(run())
+
+
+async def _create_and_capture(db_path, message_data):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(meta.create_all)
+        await conn.execute(insert(sessions).values(id=1, initial_prompt="hi", provider="anthropic"))
+
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+    async with engine.connect() as conn:
+        created = await crud.create_message(conn=conn, message_data=message_data)
+    await engine.dispose()
+    return created, statements
+
+
+class TestCreatedMessage:
+    """Test that message INSERTs only read back generated columns."""
+
+    def test_insert_returns_only_key_and_timestamp(self, tmp_path):
+        """Test that the row is not shipped back and the result is typed."""
+        created, statements = asyncio.run(_create_and_capture(
+            tmp_path / "t.db", MessageCreate(session_id=1, role="user", content={"text": "hi"})))
+
+        insert_sql = next(s for s in statements if s.startswith("INSERT"))
+        assert insert_sql.endswith("RETURNING id, created_at")
+        assert isinstance(created, crud.CreatedMessage)
+        assert created.id == 1
+        assert created.content == {"text": "hi"}
+        assert created.created_at is not None
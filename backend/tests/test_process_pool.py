@@ -0,0 +1,76 @@
+import asyncio
+import os
+import queue
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db import jobs
+from app.db.models import meta, sessions, session_jobs
+from app.service import session_events
+from app.service.event_relay import QueueEventRelay
+from app.service.process_pool import SessionProcessSupervisor
+
+
+async def report_worker_pid(job):
+    """Runs in the worker process: announce which process ran the session."""
+    await session_events.publish_status(None, job.session_id, f"ran in {os.getpid()}")
+
+
+class TestQueueEventRelay:
+    """Test handing session events to the supervising process."""
+
+    def test_events_go_to_the_queue(self):
+        """Test that published events are queued in order, not dispatched locally."""
+        events = queue.Queue()
+        relay = QueueEventRelay(events)
+
+        async def run():
+            await relay.publish(None, {"session_id": 1, "type": "status", "status": "running"})
+            await relay.publish(None, {"session_id": 1, "type": "end"})
+
+        asyncio.run(run())
+        assert events.get_nowait()["type"] == "status"
+        assert events.get_nowait()["type"] == "end"
+
+
+class TestSessionProcessSupervisor:
+    """Test running queued sessions in worker processes."""
+
+    def test_session_runs_in_a_worker_process(self, tmp_path, monkeypatch):
+        """Test that a worker process runs the job and its events reach this process."""
+        db_path = tmp_path / "q.db"
+        # read by the spawned worker's settings
+        monkeypatch.setenv("DATABASE_URL", f"sqlite+aiosqlite:///{db_path}")
+        monkeypatch.setenv("JOB_POLL_INTERVAL_SECONDS", "0.05")
+        dispatched = []
+
+        async def dispatch(event):
+            dispatched.append(event)
+
+        async def run():
+            engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+            async with engine.begin() as conn:
+                await conn.run_sync(meta.create_all)
+                await conn.execute(insert(sessions).values(id=1, initial_prompt="hi", provider="anthropic"))
+            async with engine.connect() as conn:
+                await jobs.enqueue_session(conn, 1, "anthropic", {})
+
+            supervisor = SessionProcessSupervisor(
+                processes=1, size=1, run_job=report_worker_pid, dispatch=dispatch)
+            await supervisor.start()
+            worker_pids = supervisor.pids
+            for _ in range(300):
+                async with engine.connect() as conn:
+                    state = (await conn.execute(select(session_jobs.c.state))).scalar()
+                if state == "done":
+                    break
+                await asyncio.sleep(0.05)
+            await supervisor.stop()
+            await engine.dispose()
+            return state, worker_pids
+
+        state, worker_pids = asyncio.run(run())
+
+        assert state == "done"
+        assert len(worker_pids) == 1 and worker_pids[0] != os.getpid()
+        assert dispatched == [{"session_id": 1, "type": "status", "status": f"ran in {worker_pids[0]}"}]
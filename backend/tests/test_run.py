@@ -0,0 +1,31 @@
+import asyncio
+import pytest
+
+from app.service.computer_use.tools.run import TRUNCATED_MESSAGE, run
+
+
+class TestRun:
+    """Test the shell command runner."""
+
+    def test_small_output_is_returned_verbatim(self):
+        """Test that short output and the return code come back unchanged."""
+        code, stdout, stderr = asyncio.run(run("echo hello; echo oops >&2; exit 3"))
+
+        assert code == 3
+        assert stdout == "hello\n"
+        assert stderr == "oops\n"
+
+    def test_large_output_is_clipped_while_streaming(self):
+        """Test that huge output is bounded and reports its full size."""
+        code, stdout, _ = asyncio.run(
+            run("head -c 5000000 /dev/zero | tr '\\0' 'x'", truncate_after=1000)
+        )
+
+        assert code == 0
+        assert stdout.startswith("x" * 1000 + TRUNCATED_MESSAGE)
+        assert "The full output was 5000000 bytes." in stdout
+
+    def test_timeout_raises(self):
+        """Test that a command exceeding the timeout is killed."""
+        with pytest.raises(TimeoutError, match="timed out"):
+            asyncio.run(run("sleep 5", timeout=0.2))
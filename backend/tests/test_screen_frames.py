@@ -0,0 +1,227 @@
+import asyncio
+import base64
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.service.computer_use.tools import Display
+from app.service.screen_frames import FrameSource, ScreenFrames
+
+
+class SlowScreen:
+    """Captures a solid colour after a delay, counting captures and the threads they ran on."""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.displays = []
+        self.threads = set()
+        self.fail = False
+
+    def __call__(self, display_name):
+        self.displays.append(display_name)
+        self.threads.add(threading.get_ident())
+        time.sleep(self.delay)
+        if self.fail:
+            raise OSError("X connection failed")
+        return Image.new("RGB", (64, 48), "navy")
+
+
+class TestFrameSource:
+    """Test sharing captures of a display between viewers."""
+
+    def test_concurrent_viewers_share_one_capture(self):
+        """Test that requests arriving during a capture wait for it instead of starting their own."""
+        screen = SlowScreen()
+        source = FrameSource(":3", capture=screen, max_age=10)
+
+        async def run():
+            return await asyncio.gather(*(source.frame() for _ in range(20)))
+
+        frames = asyncio.run(run())
+        assert screen.displays == [":3"]
+        assert all(frame is frames[0] for frame in frames)
+        # captured in a worker thread, not on the event loop's
+        assert threading.get_ident() not in screen.threads
+
+    def test_stale_frame_is_captured_again(self):
+        """Test that a frame is reused within the freshness window and replaced after it."""
+        screen = SlowScreen(delay=0)
+        source = FrameSource(":3", capture=screen, max_age=0.05)
+
+        async def run():
+            first = await source.frame()
+            again = await source.frame()
+            await asyncio.sleep(0.1)
+            later = await source.frame()
+            forced = await source.frame(max_age=0)
+            return first, again, later, forced
+
+        first, again, later, forced = asyncio.run(run())
+        assert first is again
+        assert later is not first and forced is not later
+        assert len(screen.displays) == 3
+
+    def test_failed_capture_is_not_cached(self):
+        """Test that every waiter sees a failed capture and the next request tries again."""
+        screen = SlowScreen()
+        screen.fail = True
+        source = FrameSource(":3", capture=screen, max_age=10)
+
+        async def run():
+            results = await asyncio.gather(*(source.frame() for _ in range(3)), return_exceptions=True)
+            screen.fail = False
+            return results, await source.frame()
+
+        results, frame = asyncio.run(run())
+        assert all(isinstance(result, OSError) for result in results)
+        assert frame.image.size == (64, 48)
+        assert len(screen.displays) == 2
+
+    def test_encodings_are_made_once(self):
+        """Test that the PNG and base64 of a frame are computed once and agree."""
+        source = FrameSource(":3", capture=SlowScreen(delay=0))
+        frame = asyncio.run(source.frame())
+
+        assert frame._png is None
+        assert frame.png is frame.png
+        assert base64.b64decode(frame.base64) == frame.png
+        assert frame.png.startswith(b"\x89PNG")
+
+    def test_concurrent_encodings_run_once(self, monkeypatch):
+        """Test that threads asking for the same encoding at once share one encoding."""
+        frame = asyncio.run(FrameSource(":3", capture=SlowScreen(delay=0)).frame())
+        saves = []
+        save = Image.Image.save
+
+        def slow_save(image, output, format=None, **params):
+            saves.append(format)
+            time.sleep(0.05)
+            return save(image, output, format=format, **params)
+
+        monkeypatch.setattr(Image.Image, "save", slow_save)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            jpegs = list(pool.map(lambda _: frame.jpeg(70), range(4)))
+            pngs = list(pool.map(lambda _: frame.png, range(4)))
+
+        assert saves == ["JPEG", "PNG"]
+        assert all(jpeg is jpegs[0] for jpeg in jpegs)
+        assert all(png is pngs[0] for png in pngs)
+
+
+class TestScreenshotRoute:
+    """Test GET /vnc/screenshot."""
+
+    @pytest.fixture
+    def screen(self, monkeypatch):
+        screen = SlowScreen(delay=0)
+        monkeypatch.setattr("app.routes.vnc.screen_frames", ScreenFrames(capture=screen))
+        return screen
+
+    def test_base64_by_default(self, screen):
+        """Test that the default response is the PNG as a data URL."""
+        from main import app
+
+        body = TestClient(app).get("/vnc/screenshot").json()
+
+        assert body["screenshot"].startswith("data:image/png;base64,")
+        assert body["timestamp"]
+
+    def test_binary_png_for_a_display(self, screen, monkeypatch):
+        """Test that format=png returns the image itself, captured from the requested display."""
+        from main import app
+
+        monkeypatch.setattr("app.routes.vnc.display_pool.leases", {1: Display(number=9, width=1024, height=768)})
+        response = TestClient(app).get("/vnc/screenshot", params={"format": "png", "display": 9})
+
+        assert response.headers["content-type"] == "image/png"
+        assert response.content.startswith(b"\x89PNG")
+        assert screen.displays == [":9"]
+
+    def test_display_not_in_use_is_404(self, screen):
+        """Test that a display that is neither shared nor leased gets no capture loop."""
+        from main import app
+
+        client = TestClient(app)
+        screenshot = client.get("/vnc/screenshot", params={"display": 99})
+        stream = client.get("/vnc/stream", params={"display": 99})
+
+        assert (screenshot.status_code, stream.status_code) == (404, 404)
+        assert screen.displays == []
+
+
+class ChangingScreen(SlowScreen):
+    """A screen whose colour only changes when the test says so."""
+
+    def __init__(self):
+        super().__init__(delay=0)
+        self.colour = "navy"
+
+    def __call__(self, display_name):
+        super().__call__(display_name)
+        return Image.new("RGB", (64, 48), self.colour)
+
+
+class TestFrameStream:
+    """Test the live stream of a display."""
+
+    def test_viewers_share_one_loop_and_only_see_changes(self):
+        """Test that an unchanged screen sends nothing new and captures don't grow with viewers."""
+        screen = ChangingScreen()
+        source = FrameSource(":4", capture=screen, fps=50)
+
+        async def watch(seen):
+            async for frame in source.changes():
+                seen.append(frame)
+
+        async def run():
+            views = [[] for _ in range(10)]
+            tasks = [asyncio.create_task(watch(seen)) for seen in views]
+            await asyncio.sleep(0.2)
+            unchanged = [len(seen) for seen in views]
+            screen.colour = "red"
+            await asyncio.sleep(0.2)
+            watching = source.viewers
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            return views, unchanged, watching
+
+        views, unchanged, watching = asyncio.run(run())
+        assert watching == 10 and source.viewers == 0
+        assert unchanged == [1] * 10
+        assert all([frame.image.getpixel((0, 0)) for frame in seen] == [(0, 0, 128), (255, 0, 0)]
+                   for seen in views)
+        # one loop at 50 fps for 0.4s, not one per viewer
+        assert len(screen.displays) <= 25
+
+    def test_mjpeg_parts(self):
+        """Test that each part is a JPEG of the frame at the requested quality."""
+        from app.routes.vnc import MJPEG_BOUNDARY, mjpeg_parts
+
+        source = FrameSource(":4", capture=ChangingScreen(), fps=50)
+
+        async def run():
+            parts = mjpeg_parts(source, fps=50, quality=40)
+            part = await anext(parts)
+            await parts.aclose()
+            return part
+
+        part = asyncio.run(run())
+        headers, body = part.split(b"\r\n\r\n", 1)
+        assert headers.startswith(f"--{MJPEG_BOUNDARY}\r\nContent-Type: image/jpeg".encode())
+        assert body.startswith(b"\xff\xd8") and body.endswith(b"\r\n")
+        assert f"Content-Length: {len(body) - 2}".encode() in headers
+        assert source.viewers == 0
+
+    def test_stream_rejects_fps_above_the_limit(self):
+        """Test that viewers can't ask for more frames than the capture loop makes."""
+        from app.core.config import settings
+        from main import app
+
+        response = TestClient(app).get("/vnc/stream", params={"fps": settings.STREAM_FPS + 1})
+
+        assert response.status_code == 422
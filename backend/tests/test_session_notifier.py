@@ -0,0 +1,173 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+from fastapi.testclient import TestClient
+
+from main import app
+from app.service.session_notifier import DROPPED, SessionNotifier, SessionState, session_notifier
+
+
+class TestSessionNotifier:
+    """Test the in-process notifier behind long-polling."""
+
+    def test_wait_returns_immediately_when_client_is_behind(self):
+        """Test that known newer state is returned without waiting."""
+        notifier = SessionNotifier()
+        notifier.seed(1, last_message_id=5, status="running")
+
+        async def scenario():
+            return await notifier.wait(1, after_id=3, status="running", timeout=5)
+
+        assert asyncio.run(scenario()).last_message_id == 5
+
+    def test_publish_wakes_waiter(self):
+        """Test that a parked waiter is woken by a new message."""
+        notifier = SessionNotifier()
+        notifier.seed(1, last_message_id=5, status="running")
+
+        async def scenario():
+            waiter = asyncio.create_task(
+                notifier.wait(1, after_id=5, status="running", timeout=5))
+            await asyncio.sleep(0.01)
+            assert not waiter.done()
+            notifier.publish(1, message_id=6)
+            return await asyncio.wait_for(waiter, timeout=1)
+
+        state = asyncio.run(scenario())
+        assert state.last_message_id == 6
+        assert state.status == "running"
+
+    def test_wait_times_out_when_idle(self):
+        """Test that an idle session returns None after the timeout."""
+        notifier = SessionNotifier()
+        notifier.seed(1, last_message_id=5, status="completed")
+
+        async def scenario():
+            return await notifier.wait(1, after_id=5, status="completed", timeout=0.05)
+
+        assert asyncio.run(scenario()) is None
+
+    def test_reset_wakes_waiter_with_dropped(self):
+        """Test that a parked waiter learns at once that its session's state was dropped."""
+        notifier = SessionNotifier()
+        notifier.seed(1, last_message_id=5, status="running")
+
+        async def scenario():
+            waiter = asyncio.create_task(
+                notifier.wait(1, after_id=5, status="running", timeout=5))
+            await asyncio.sleep(0.01)
+            notifier.reset()
+            return await asyncio.wait_for(waiter, timeout=1)
+
+        assert asyncio.run(scenario()) is DROPPED
+
+    def test_seed_does_not_overwrite_published_state(self):
+        """Test that a stale database read cannot roll back fresher state."""
+        notifier = SessionNotifier()
+        notifier.publish(1, message_id=9, status="running")
+        notifier.seed(1, last_message_id=4, status="queued")
+
+        assert notifier.get(1).last_message_id == 9
+        assert notifier.get(1).status == "running"
+
+
+class TestUpdatesEndpoint:
+    """Test the long-poll endpoint."""
+
+    def setup_method(self):
+        session_notifier.forget(1)
+
+    def teardown_method(self):
+        session_notifier.forget(1)
+
+    @patch('app.db.crud.get_messages_by_session_id', new_callable=AsyncMock)
+    def test_returns_new_messages_and_status(self, mock_get_messages):
+        """Test that a behind client gets the missing messages at once."""
+        session_notifier.seed(1, last_message_id=2, status="running")
+        mock_get_messages.return_value = [{
+            "id": 2, "session_id": 1, "role": "assistant", "content": {"text": "hi"},
+            "created_at": "2025-10-17T12:33:45.638595Z"
+        }]
+
+        client = TestClient(app)
+        response = client.get("/sessions/1/updates?after_id=1&status=queued")
+
+        assert response.status_code == 200
+        assert response.json()["status"] == "running"
+        assert response.json()["last_message_id"] == 2
+        assert response.json()["timed_out"] is False
+        assert mock_get_messages.call_args.kwargs["after_id"] == 1
+
+    @patch('app.db.crud.get_messages_by_session_id', new_callable=AsyncMock)
+    def test_idle_session_times_out_without_queries(self, mock_get_messages):
+        """Test that an up-to-date client parks and never reads messages."""
+        session_notifier.seed(1, last_message_id=2, status="completed")
+
+        client = TestClient(app)
+        response = client.get("/sessions/1/updates?after_id=2&status=completed&timeout=0.05")
+
+        assert response.status_code == 200
+        assert response.json()["timed_out"] is True
+        assert response.json()["messages"] == []
+        mock_get_messages.assert_not_called()
+
+    @patch('app.db.crud.get_messages_by_session_id', new_callable=AsyncMock)
+    @patch('app.db.crud.get_session_poll_state', new_callable=AsyncMock)
+    def test_reset_reseeds_parked_poll_from_the_database(self, mock_poll_state, mock_get_messages):
+        """Test that a long poll parked through a reset re-reads the session instead of waiting out its timeout."""
+        from app.api.sessions import wait_for_session_updates
+
+        mock_poll_state.side_effect = [
+            {"last_message_id": 2, "status": "running"},
+            # written while events were missed
+            {"last_message_id": 3, "status": "running"},
+        ]
+        mock_get_messages.return_value = [{
+            "id": 3, "session_id": 1, "role": "assistant", "content": {"text": "hi"},
+            "created_at": "2025-10-17T12:33:45.638595Z"
+        }]
+
+        async def scenario():
+            poll = asyncio.create_task(wait_for_session_updates(
+                session_id=1, after_id=2, last_status="running", timeout=5))
+            await asyncio.sleep(0.05)
+            session_notifier.reset()
+            return await asyncio.wait_for(poll, timeout=1)
+
+        updates = asyncio.run(scenario())
+        assert updates.timed_out is False
+        assert updates.last_message_id == 3
+        assert mock_poll_state.await_count == 2
+
+    @patch('app.db.crud.get_session_poll_state', new_callable=AsyncMock)
+    def test_unknown_session_is_404(self, mock_poll_state):
+        """Test that the first poll of a missing session is rejected."""
+        mock_poll_state.return_value = None
+
+        client = TestClient(app)
+        response = client.get("/sessions/1/updates")
+
+        assert response.status_code == 404
+
+    @patch('app.db.crud.get_messages_by_session_id', new_callable=AsyncMock)
+    @patch('app.api.sessions.read_session_state', new_callable=AsyncMock)
+    def test_standalone_workers_on_sqlite_poll_the_database(self, mock_state, mock_get_messages, monkeypatch):
+        """Test that a long poll sees messages written by a worker whose events stay in it."""
+        monkeypatch.setattr('app.service.session_events.settings.JOB_EXECUTION_MODE', "external")
+        monkeypatch.setattr('app.api.sessions.DATABASE_POLL_INTERVAL', 0.01)
+        # stale cache from before: must not be trusted
+        session_notifier.seed(1, last_message_id=2, status="running")
+        mock_state.side_effect = [
+            SessionState(last_message_id=2, status="running"),
+            SessionState(last_message_id=3, status="running"),
+        ]
+        mock_get_messages.return_value = [{
+            "id": 3, "session_id": 1, "role": "assistant", "content": {"text": "hi"},
+            "created_at": "2025-10-17T12:33:45.638595Z"
+        }]
+
+        client = TestClient(app)
+        response = client.get("/sessions/1/updates?after_id=2&status=running&timeout=5")
+
+        assert response.json()["timed_out"] is False
+        assert response.json()["last_message_id"] == 3
+        assert mock_state.call_count == 2
@@ -0,0 +1,96 @@
+import io
+from datetime import datetime
+from unittest.mock import patch
+import pytest
+from fastapi.testclient import TestClient
+from fastapi.websockets import WebSocketDisconnect
+from PIL import Image
+
+from main import app
+from app.service.session_events import message_event_data
+from app.service.stream_manager import stream_manager
+from app.service.thumbnails import make_thumbnail
+
+
+def _message(message_id, image_hash=None):
+    return {"id": message_id, "session_id": 1, "role": "tool", "content": {"n": message_id},
+            "base64_image": None, "image_hash": image_hash, "created_at": datetime(2026, 1, 1)}
+
+
+class TestSessionSocket:
+    """Test the live session WebSocket."""
+
+    @patch('app.db.crud.get_messages_by_session_id')
+    @patch('app.db.crud.get_session_poll_state')
+    def test_replays_from_after_id_and_closes_when_finished(self, mock_poll_state, mock_get_messages):
+        """Test that a reconnecting viewer gets the messages after its cursor, then the status."""
+        mock_poll_state.return_value = {"status": "completed", "last_message_id": 3}
+        mock_get_messages.return_value = [_message(2), _message(3)]
+
+        client = TestClient(app)
+        with client.websocket_connect("/sessions/1/ws?after_id=1") as websocket:
+            events = [websocket.receive_json() for _ in range(3)]
+            with pytest.raises(WebSocketDisconnect):
+                websocket.receive_json()
+
+        assert mock_get_messages.call_args.kwargs["after_id"] == 1
+        assert [event["message"]["id"] for event in events[:2]] == [2, 3]
+        assert events[2] == {"type": "status", "status": "completed"}
+
+    @patch('app.db.crud.get_session_poll_state')
+    def test_unknown_session_is_closed(self, mock_poll_state):
+        """Test that the socket is closed with 4404 for a missing session."""
+        mock_poll_state.return_value = None
+
+        client = TestClient(app)
+        with client.websocket_connect("/sessions/999/ws") as websocket:
+            with pytest.raises(WebSocketDisconnect) as exc_info:
+                websocket.receive_json()
+
+        assert exc_info.value.code == 4404
+
+    @patch('app.api.session_channel.get_thumbnail')
+    @patch('app.db.crud.get_messages_by_session_id')
+    @patch('app.db.crud.get_session_poll_state')
+    def test_pushes_live_events_with_thumbnails(self, mock_poll_state, mock_get_messages, mock_thumbnail):
+        """Test that persisted messages, screenshots and status changes are pushed as they happen."""
+        mock_poll_state.return_value = {"status": "running", "last_message_id": None}
+        mock_get_messages.return_value = []
+        mock_thumbnail.return_value = b"jpeg"
+        image_hash = "ab" * 32
+
+        client = TestClient(app)
+        with client.websocket_connect("/sessions/7/ws?thumbnails=true") as websocket:
+            assert websocket.receive_json() == {"type": "status", "status": "running"}
+
+            websocket.portal.call(stream_manager.publish, 7, "message",
+                                  message_event_data(_message(4, image_hash)))
+            message_event = websocket.receive_json()
+            screenshot_event = websocket.receive_json()
+            thumbnail_frame = websocket.receive_bytes()
+
+            websocket.portal.call(stream_manager.publish, 7, "status", {"status": "completed"})
+            websocket.portal.call(stream_manager.close_stream, 7)
+            status_event = websocket.receive_json()
+            with pytest.raises(WebSocketDisconnect):
+                websocket.receive_json()
+
+        assert message_event["message"]["id"] == 4
+        assert screenshot_event["image_url"] == f"/images/{image_hash}"
+        assert thumbnail_frame == image_hash.encode() + b"jpeg"
+        assert status_event == {"type": "status", "status": "completed"}
+
+
+class TestThumbnails:
+    """Test screenshot thumbnails."""
+
+    def test_thumbnail_is_small_jpeg(self):
+        """Test that a thumbnail keeps the aspect ratio within the size limit."""
+        output = io.BytesIO()
+        Image.new("RGB", (1280, 800), "white").save(output, format="PNG")
+
+        thumbnail = make_thumbnail(output.getvalue())
+
+        with Image.open(io.BytesIO(thumbnail)) as image:
+            assert image.format == "JPEG"
+            assert image.size == (320, 200)
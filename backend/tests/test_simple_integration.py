@@ -1,8 +1,10 @@
 import pytest
 import asyncio
 from unittest.mock import AsyncMock, MagicMock, patch
+from datetime import datetime
 from fastapi.testclient import TestClient
 from main import app
+from app.db.crud import CreatedMessage
 
 
 class TestSimpleIntegration:
@@ -86,13 +88,15 @@ class TestSimpleIntegration:
     @patch('app.db.crud.create_message')
     def test_create_message_mocked(self, mock_create_message):
         """Test creating a message with mocked database."""
-        mock_message = {
-            "id": 1,
-            "session_id": 1,
-            "role": "user",
-            "content": {"text": "Hello, this is a test message"},
-            "created_at": "2025-10-17T12:33:57.382072Z"
-        }
+        mock_message = CreatedMessage(
+            id=1,
+            session_id=1,
+            role="user",
+            content={"text": "Hello, this is a test message"},
+            image_hash=None,
+            image_content_type=None,
+            created_at=datetime(2025, 10, 17, 12, 33, 57)
+        )
         mock_create_message.return_value = mock_message
         
         client = TestClient(app)
@@ -217,3 +217,94 @@ class TestStreamManagerIntegration:
         for i in range(3):
             manager.close_stream(i)
             assert i not in manager.streams
+
+
+class TestFanOut:
+    """Test fan-out of session events to multiple subscribers."""
+
+    def test_every_subscriber_gets_every_event(self):
+        """Test that a second viewer does not steal events from the first."""
+        async def run():
+            manager = StreamManager()
+            first = manager.subscribe(1)
+            second = manager.subscribe(1)
+            manager.publish(1, "message", {"id": 10})
+            return await first.get(timeout=1), await second.get(timeout=1)
+
+        first_event, second_event = asyncio.run(run())
+        assert first_event.data == {"id": 10}
+        assert second_event.data == {"id": 10}
+
+    def test_disconnecting_subscriber_keeps_stream(self):
+        """Test that one viewer leaving does not close the stream for the others."""
+        manager = StreamManager()
+        first = manager.subscribe(1)
+        manager.subscribe(1)
+        manager.unsubscribe(1, first)
+        assert first.closed
+        assert manager.get_stream(1).subscriber_count == 1
+
+    def test_slow_consumer_drops_oldest(self):
+        """Test that a full queue drops its oldest events and reports the gap."""
+        async def run():
+            manager = StreamManager(max_queue=2, policy="drop_oldest")
+            subscriber = manager.subscribe(1)
+            for i in range(4):
+                manager.publish(1, "message", {"id": i})
+            return [await subscriber.get(timeout=0) for _ in range(3)], manager.metrics()
+
+        events, metrics = asyncio.run(run())
+        assert events[0].type == "lagged"
+        assert events[0].data == {"dropped": 2}
+        assert [event.data["id"] for event in events[1:]] == [2, 3]
+        assert metrics["dropped"] == 2
+
+    def test_status_events_coalesce(self):
+        """Test that a newer status replaces a queued one instead of piling up."""
+        async def run():
+            manager = StreamManager(max_queue=8, policy="coalesce")
+            subscriber = manager.subscribe(1)
+            manager.publish(1, "status", {"status": "running"}, coalesce_key="status")
+            manager.publish(1, "message", {"id": 1})
+            manager.publish(1, "status", {"status": "completed"}, coalesce_key="status")
+            manager.close_stream(1)
+            events = []
+            while (event := await subscriber.get(timeout=0)) is not None:
+                events.append(event)
+            return events
+
+        events = asyncio.run(run())
+        assert [event.type for event in events] == ["message", "status"]
+        assert events[1].data == {"status": "completed"}
+
+    def test_replay_from_last_event_id(self):
+        """Test that a reconnecting viewer gets the events after its last id."""
+        async def run():
+            manager = StreamManager()
+            for i in range(3):
+                manager.publish(1, "message", {"id": i})
+            subscriber = manager.subscribe(1, last_event_id=1)
+            return [await subscriber.get(timeout=0) for _ in range(2)]
+
+        events = asyncio.run(run())
+        assert [event.id for event in events] == [2, 3]
+
+    def test_replay_gap_reports_lag(self):
+        """Test that an id older than the replay ring is reported as lagged."""
+        async def run():
+            manager = StreamManager(replay_size=2)
+            for i in range(5):
+                manager.publish(1, "message", {"id": i})
+            subscriber = manager.subscribe(1, last_event_id=1)
+            return [await subscriber.get(timeout=0) for _ in range(3)]
+
+        events = asyncio.run(run())
+        assert events[0].type == "lagged"
+        assert events[0].data == {"dropped": 2}
+        assert [event.id for event in events[1:]] == [4, 5]
+
+    def test_sse_format(self):
+        """Test the server-sent event encoding."""
+        manager = StreamManager()
+        event = manager.publish(1, "status", {"status": "running"})
+        assert event.to_sse() == 'id: 1\nevent: status\ndata: {"status": "running"}\n\n'
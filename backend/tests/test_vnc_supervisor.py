@@ -0,0 +1,150 @@
+import asyncio
+import os
+import signal
+import socket
+import sys
+
+from app.service import vnc_supervisor as supervisor_module
+from app.service.vnc_supervisor import VNCSupervisor
+
+# stands in for x11vnc and novnc_proxy: logs its start and listens on the port it is given
+FAKE_SERVER = f"""#!{sys.executable}
+import os, socket, sys, pathlib
+args = sys.argv[1:]
+flag = "-rfbport" if "-rfbport" in args else "--listen"
+with open(os.environ["FAKE_VNC_LOG"], "a") as log:
+    log.write(pathlib.Path(__file__).name + "\\n")
+server = socket.socket()
+server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+server.bind(("127.0.0.1", int(args[args.index(flag) + 1])))
+server.listen()
+while True:
+    server.accept()[0].close()
+"""
+
+
+def _free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def _supervisor(tmp_path, monkeypatch):
+    (tmp_path / "utils").mkdir()
+    for path in (tmp_path / "x11vnc", tmp_path / "utils" / "novnc_proxy"):
+        path.write_text(FAKE_SERVER)
+        path.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("FAKE_VNC_LOG", str(tmp_path / "starts.log"))
+    return VNCSupervisor(display=":1", vnc_port=_free_port(), novnc_port=_free_port(),
+                         novnc_path=str(tmp_path), start_timeout=10)
+
+
+def _starts(tmp_path):
+    return (tmp_path / "starts.log").read_text().split()
+
+
+class TestVNCSupervisor:
+    """Test running x11vnc and noVNC once and keeping them up."""
+
+    def test_repeated_starts_spawn_once(self, tmp_path, monkeypatch):
+        """Test that starting again while the services run does not start more of them."""
+        supervisor = _supervisor(tmp_path, monkeypatch)
+
+        async def run():
+            results = await asyncio.gather(*(supervisor.start() for _ in range(3)))
+            results.append(await supervisor.start())
+            status = supervisor.status()
+            stopped = await supervisor.stop()
+            return results, status, stopped
+
+        results, status, stopped = asyncio.run(run())
+        assert results == [True] * 4
+        assert _starts(tmp_path) == ["x11vnc", "novnc_proxy"]
+        assert status["x11vnc"]["pid"] and status["noVNC"]["pid"]
+        assert stopped == ["noVNC", "x11vnc"]
+        assert supervisor.status()["x11vnc"]["running"] is False
+
+    def test_exited_service_is_restarted(self, tmp_path, monkeypatch):
+        """Test that a VNC server that dies is started again and status follows it."""
+        monkeypatch.setattr(supervisor_module, "RESTART_DELAY_SECONDS", 0.05)
+        supervisor = _supervisor(tmp_path, monkeypatch)
+
+        async def run():
+            await supervisor.start()
+            first_pid = supervisor.x11vnc.pid
+            os.kill(first_pid, signal.SIGKILL)
+            for _ in range(200):
+                if supervisor.x11vnc.restarts and supervisor.x11vnc.running:
+                    break
+                await asyncio.sleep(0.05)
+            status = supervisor.status()["x11vnc"]
+            await supervisor.stop()
+            return first_pid, status
+
+        first_pid, status = asyncio.run(run())
+        assert status["running"] is True
+        assert status["restarts"] == 1
+        assert status["pid"] != first_pid
+
+    def test_start_during_restart_delay_leaves_one_owner(self, tmp_path, monkeypatch):
+        """Test that starting while a dead service waits to be restarted spawns it once, and stop stops it."""
+        monkeypatch.setattr(supervisor_module, "RESTART_DELAY_SECONDS", 0.5)
+        supervisor = _supervisor(tmp_path, monkeypatch)
+
+        async def run():
+            await supervisor.start()
+            first = supervisor.x11vnc.process
+            old_watcher = supervisor.x11vnc.watcher
+            os.kill(first.pid, signal.SIGKILL)
+            await first.wait()
+            await asyncio.sleep(0.05)
+            started = await supervisor.start()
+            replacement = supervisor.x11vnc.process
+            # well past the old watcher's restart delay
+            await asyncio.sleep(1.0)
+            status = supervisor.status()["x11vnc"]
+            await supervisor.stop()
+            return started, old_watcher, replacement, status
+
+        started, old_watcher, replacement, status = asyncio.run(run())
+        assert started is True
+        assert old_watcher.cancelled()
+        assert _starts(tmp_path).count("x11vnc") == 2
+        assert status["running"] is True and status["pid"] == replacement.pid
+        assert replacement.returncode is not None
+
+    def test_port_served_by_someone_else_is_left_alone(self, tmp_path, monkeypatch):
+        """Test that a VNC server started outside the supervisor is used instead of a second one."""
+        supervisor = _supervisor(tmp_path, monkeypatch)
+        existing = socket.socket()
+        existing.bind(("127.0.0.1", supervisor.x11vnc.port))
+        existing.listen()
+
+        async def run():
+            started = await supervisor.start()
+            status = supervisor.status()
+            stopped = await supervisor.stop()
+            return started, status, stopped
+
+        try:
+            started, status, stopped = asyncio.run(run())
+        finally:
+            existing.close()
+        assert started is True
+        assert status["x11vnc"]["external"] is True
+        assert _starts(tmp_path) == ["novnc_proxy"]
+        # only what the supervisor started is stopped
+        assert stopped == ["noVNC"]
+
+    def test_missing_binary_is_reported(self, tmp_path, monkeypatch):
+        """Test that a missing x11vnc fails the start with an error in the status."""
+        supervisor = VNCSupervisor(vnc_port=_free_port(), novnc_port=_free_port(),
+                                   novnc_path=str(tmp_path), start_timeout=1)
+        monkeypatch.setenv("PATH", str(tmp_path))
+
+        assert asyncio.run(supervisor.start()) is False
+        status = supervisor.status()
+        assert status["x11vnc"]["running"] is False
+        assert status["x11vnc"]["error"]
+        assert status["noVNC"]["pid"] is None
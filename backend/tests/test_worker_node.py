@@ -0,0 +1,190 @@
+import asyncio
+import multiprocessing
+import threading
+import pytest
+from datetime import timedelta
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db import jobs
+from app.db.models import meta, sessions, session_jobs, workers
+
+
+async def quick_job(job):
+    await asyncio.sleep(0.3)
+
+
+async def hang_on_first_attempt(job):
+    if job.attempts == 1:
+        await asyncio.sleep(3600)
+
+
+def run_worker(stop, run_job):
+    """Worker process: what `python worker.py` runs, stopped through `stop`."""
+    from app.service.worker_node import WorkerNode
+    from worker import serve
+
+    async def run():
+        stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        threading.Thread(target=lambda: (stop.wait(), loop.call_soon_threadsafe(stopping.set)),
+                         daemon=True).start()
+        await serve(WorkerNode(run_job=run_job), stopping)
+
+    asyncio.run(run())
+
+
+async def _database(db_path, job_count):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(meta.create_all)
+    async with engine.connect() as conn:
+        for session_id in range(1, job_count + 1):
+            await conn.execute(insert(sessions).values(
+                id=session_id, initial_prompt="hi", provider="anthropic"))
+            await jobs.enqueue_session(conn, session_id, "anthropic", {})
+    return engine
+
+
+async def _wait_for(engine, query, done, timeout=15.0):
+    for _ in range(int(timeout / 0.05)):
+        async with engine.connect() as conn:
+            rows = (await conn.execute(query)).fetchall()
+        if done(rows):
+            return rows
+        await asyncio.sleep(0.05)
+    raise AssertionError(f"gave up waiting, last saw {rows}")
+
+
+def _worker_env(monkeypatch, db_path):
+    # read by the spawned workers' settings
+    monkeypatch.setenv("DATABASE_URL", f"sqlite+aiosqlite:///{db_path}")
+    monkeypatch.setenv("JOB_POLL_INTERVAL_SECONDS", "0.05")
+    monkeypatch.setenv("JOB_VISIBILITY_TIMEOUT_SECONDS", "1")
+    monkeypatch.setenv("WORKER_HEARTBEAT_SECONDS", "0.1")
+    monkeypatch.setenv("WORKER_STALE_SECONDS", "1")
+    monkeypatch.setenv("BLOB_STORE_SHARED", "true")
+
+
+class TestWorkerRegistry:
+    """Test the workers table."""
+
+    def test_register_heartbeat_and_prune(self, tmp_path):
+        """Test that live workers are listed and silent ones are pruned."""
+        async def run():
+            engine = await _database(tmp_path / "q.db", 0)
+            async with engine.connect() as conn:
+                await jobs.register_worker(conn, "a", "host-a", 1, 2)
+                await jobs.register_worker(conn, "b", "host-b", 2, 3)
+                assert await jobs.heartbeat_worker(conn, "a", running=1)
+                await conn.execute(update(workers).where(workers.c.id == "b").values(
+                    heartbeat_at=jobs._now() - timedelta(minutes=5)))
+                await conn.commit()
+                listed = await jobs.list_workers(conn, stale_after=60)
+                pruned = await jobs.prune_workers(conn, stale_after=60)
+                found = await jobs.heartbeat_worker(conn, "b", running=0)
+            await engine.dispose()
+            return listed, pruned, found
+
+        listed, pruned, found = asyncio.run(run())
+        assert [(w["id"], w["alive"], w["running"]) for w in listed] == [("a", True, 1), ("b", False, 0)]
+        assert pruned == 1
+        # a pruned worker finds out on its next heartbeat
+        assert found is False
+
+
+class TestWorkerNodeSetup:
+    """Test what a worker offers and refuses at startup."""
+
+    def test_capacity_follows_display_pool(self, monkeypatch):
+        """Test that a worker offers one session per pooled desktop, or one on the shared display."""
+        from app.service.display_pool import display_pool
+        from app.service.worker_node import WorkerNode
+
+        monkeypatch.setattr(display_pool, "size", 3)
+        pooled = WorkerNode(run_job=quick_job)
+        monkeypatch.setattr(display_pool, "size", 0)
+        shared = WorkerNode(run_job=quick_job)
+
+        assert (pooled.display_capacity, pooled.pool._size) == (3, 3)
+        assert (shared.display_capacity, shared.pool._size) == (1, 1)
+
+    def test_refuses_to_start_without_shared_blob_store(self, monkeypatch):
+        """Test that a worker and an external-mode API fail fast when screenshots would stay local."""
+        from app.service.process_pool import ExternalWorkers
+        from app.service.worker_node import WorkerNode
+
+        monkeypatch.setattr('app.service.blob_store.settings.BLOB_STORE_SHARED', False)
+        node = WorkerNode(run_job=quick_job)
+
+        with pytest.raises(RuntimeError, match="BLOB_STORE_SHARED"):
+            asyncio.run(node.start())
+        with pytest.raises(RuntimeError, match="BLOB_STORE_SHARED"):
+            asyncio.run(ExternalWorkers().start())
+        assert node._heartbeat_task is None
+
+
+class TestWorkerProcesses:
+    """Test standalone workers sharing one queue."""
+
+    def test_two_workers_share_the_queue(self, tmp_path, monkeypatch):
+        """Test that two worker processes both register and split the sessions."""
+        db_path = tmp_path / "q.db"
+        _worker_env(monkeypatch, db_path)
+        context = multiprocessing.get_context("spawn")
+        stop = context.Event()
+
+        async def run():
+            engine = await _database(db_path, 4)
+            processes = [context.Process(target=run_worker, args=(stop, quick_job)) for _ in range(2)]
+            for process in processes:
+                process.start()
+            registered = await _wait_for(engine, select(workers), lambda rows: len(rows) == 2)
+            finished = await _wait_for(
+                engine, select(session_jobs.c.state, session_jobs.c.locked_by),
+                lambda rows: all(row.state == "done" for row in rows))
+            stop.set()
+            for process in processes:
+                process.join(15)
+            remaining = await _wait_for(engine, select(workers), lambda rows: True)
+            await engine.dispose()
+            return registered, finished, remaining
+
+        registered, finished, remaining = asyncio.run(run())
+        assert [w.display_capacity for w in registered] == [1, 1]
+        assert {row.locked_by for row in finished} == {w.id for w in registered}
+        # clean shutdown deregisters
+        assert remaining == []
+
+    def test_crashed_worker_sessions_are_requeued(self, tmp_path, monkeypatch):
+        """Test that a killed worker's session is picked up by another after its lease expires."""
+        db_path = tmp_path / "q.db"
+        _worker_env(monkeypatch, db_path)
+        context = multiprocessing.get_context("spawn")
+        # separate events: one the killed worker was waiting on can't be set any more
+        stop, never = context.Event(), context.Event()
+
+        async def run():
+            engine = await _database(db_path, 1)
+            crashing = context.Process(target=run_worker, args=(never, hang_on_first_attempt))
+            crashing.start()
+            first = await _wait_for(engine, select(session_jobs),
+                                    lambda rows: rows[0].state == "running")
+            crashing.kill()
+            crashing.join()
+
+            survivor = context.Process(target=run_worker, args=(stop, hang_on_first_attempt))
+            survivor.start()
+            second = await _wait_for(engine, select(session_jobs),
+                                     lambda rows: rows[0].state == "done")
+            # the dead worker's row is pruned by the survivor's heartbeat
+            alive = await _wait_for(engine, select(workers), lambda rows: len(rows) == 1)
+            stop.set()
+            survivor.join(15)
+            await engine.dispose()
+            return first[0], second[0], alive
+
+        first, second, alive = asyncio.run(run())
+        assert second.attempts == 2
+        assert second.locked_by != first.locked_by
+        assert [w.id for w in alive] == [second.locked_by]
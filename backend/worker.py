@@ -0,0 +1,42 @@
+"""
+Standalone agent worker: runs queued sessions on this machine's desktops.
+
+    python worker.py
+
+Start one per machine (or several against the same database to try it locally)
+and set JOB_EXECUTION_MODE=external on the API so it only queues sessions.
+"""
+
+import asyncio
+import logging
+import signal
+
+from app.db.database import engine
+from app.service.message_writer import message_writer
+from app.service.worker_node import WorkerNode
+
+
+async def serve(node: WorkerNode, stop: asyncio.Event):
+    await node.start()
+    await stop.wait()
+    await node.stop()
+    # messages of sessions handed back are still written
+    await message_writer.close()
+    await engine.dispose()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+
+    async def run():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        await serve(WorkerNode(), stop)
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
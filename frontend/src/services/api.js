@@ -42,6 +42,28 @@ async function apiRequest(endpoint, options = {}) {
   }
 }
 
+// Message lists come a page at a time, oldest first: follow after_id until a short page
+const MESSAGE_PAGE_LIMIT = 500
+
+async function getAllMessages(endpoint, afterId = null) {
+  const messages = []
+  while (true) {
+    const params = new URLSearchParams({ limit: MESSAGE_PAGE_LIMIT })
+    if (afterId) params.set('after_id', afterId)
+    const page = await apiRequest(`${endpoint}?${params}`)
+    messages.push(...page)
+    if (page.length < MESSAGE_PAGE_LIMIT) return messages
+    afterId = page[page.length - 1].id
+  }
+}
+
+// Screenshots are served by reference from /images/{hash}; older messages may still inline base64
+export function messageImageSrc(message) {
+  if (message.image_url) return `${API_BASE_URL}${message.image_url}`
+  if (message.base64_image) return `data:image/png;base64,${message.base64_image}`
+  return null
+}
+
 export const healthApi = {
   async check() {
     return apiRequest('/')
@@ -64,13 +86,35 @@ export const sessionsApi = {
     return apiRequest(`/sessions/${sessionId}`)
   },
 
-  async getMessages(sessionId) {
-    return apiRequest(`/sessions/${sessionId}/messages`)
+  async getMessages(sessionId, afterId = null) {
+    const query = afterId ? `?after_id=${afterId}` : ''
+    return apiRequest(`/sessions/${sessionId}/messages${query}`)
+  },
+
+  // Every message after afterId, however many pages that takes
+  async getAllMessages(sessionId, afterId = null) {
+    return getAllMessages(`/sessions/${sessionId}/messages`, afterId)
   },
 
   async getStatus(sessionId) {
     return apiRequest(`/sessions/${sessionId}/status`)
   },
+
+  // Long-poll: resolves as soon as there are messages after afterId or the status changes
+  async waitForUpdates(sessionId, afterId = null, status = null, timeout = 25) {
+    const params = new URLSearchParams({ timeout })
+    if (afterId) params.set('after_id', afterId)
+    if (status) params.set('status', status)
+    return apiRequest(`/sessions/${sessionId}/updates?${params}`)
+  },
+
+  // Live channel: replays messages after afterId, then pushes message/status/screenshot events
+  openLiveSocket(sessionId, afterId = null) {
+    const url = new URL(`${API_BASE_URL}/sessions/${sessionId}/ws`)
+    url.protocol = url.protocol === 'https:' ? 'wss:' : 'ws:'
+    if (afterId) url.searchParams.set('after_id', afterId)
+    return new WebSocket(url)
+  },
 }
 
 export const messagesApi = {
@@ -82,7 +126,7 @@ export const messagesApi = {
   },
 
   async getBySessionId(sessionId) {
-    return apiRequest(`/messages/session/${sessionId}`)
+    return getAllMessages(`/messages/session/${sessionId}`)
   },
 }
 
@@ -130,10 +174,11 @@ export const vncApi = {
     return apiRequest('/vnc/screenshot')
   },
 
-  async interact(action, data) {
+  // events: [{ type: 'click', x, y, button, repeat }, { type: 'type', text }, ...]
+  async interact(events, display = null) {
     return apiRequest('/vnc/interact', {
       method: 'POST',
-      body: JSON.stringify({ action, ...data }),
+      body: JSON.stringify(display === null ? { events } : { events, display }),
     })
   },
 }
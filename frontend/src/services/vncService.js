@@ -84,13 +84,14 @@ class VNCService {
     }
   }
 
-  async interact(action, data = {}) {
+  // Sends a batch of input events, run in order on the display
+  async interact(events, display = null) {
     if (!this.connected) {
       throw new Error('VNC not connected')
     }
 
     try {
-      const response = await vncApi.interact(action, data)
+      const response = await vncApi.interact(events, display)
       return response
     } catch (err) {
       this.error = err.message
@@ -101,7 +102,7 @@ class VNCService {
 
   // Mouse interactions
   async click(x, y, button = 1) {
-    return this.interact('click', { x, y, button })
+    return this.interact([{ type: 'click', x, y, button }])
   }
 
   async rightClick(x, y) {
@@ -109,16 +110,16 @@ class VNCService {
   }
 
   async doubleClick(x, y) {
-    return this.interact('click', { x, y, button: '--repeat 2 --delay 10 1' })
+    return this.interact([{ type: 'click', x, y, button: 1, repeat: 2 }])
   }
 
   // Keyboard interactions
   async type(text) {
-    return this.interact('type', { text })
+    return this.interact([{ type: 'type', text }])
   }
 
   async key(key) {
-    return this.interact('key', { key })
+    return this.interact([{ type: 'key', key }])
   }
 
   // Utility methods
@@ -101,12 +101,12 @@ export const useMessagesPollingStore = defineStore('messagesPolling', () => {
 
   // Check if session has screenshots
   const hasScreenshots = computed(() => {
-    return messages.value.some((msg) => msg.base64_image)
+    return messages.value.some((msg) => msg.image_url || msg.base64_image)
   })
 
   // Get latest screenshot
   const latestScreenshot = computed(() => {
-    const messagesWithImages = messages.value.filter((msg) => msg.base64_image)
+    const messagesWithImages = messages.value.filter((msg) => msg.image_url || msg.base64_image)
     return messagesWithImages.length > 0 ? messagesWithImages[messagesWithImages.length - 1] : null
   })
 
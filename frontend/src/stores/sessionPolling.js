@@ -2,13 +2,17 @@ import { defineStore } from 'pinia'
 import { ref, computed } from 'vue'
 import { api } from '../services/api.js'
 
+const LONG_POLL_TIMEOUT_SECONDS = 25
+const POLL_ERROR_BACKOFF_MS = 1000
+
 export const useSessionPollingStore = defineStore('sessionPolling', () => {
   // State
   const currentSession = ref(null)
   const messages = ref([])
   const sessionStatus = ref(null)
   const isPolling = ref(false)
-  const pollingInterval = ref(null)
+  let pollGeneration = 0
+  let liveSocket = null
   const lastMessageCount = ref(0)
   const lastStatusUpdate = ref(null)
 
@@ -21,6 +25,11 @@ export const useSessionPollingStore = defineStore('sessionPolling', () => {
     return sessionStatus.value?.status === 'running' || sessionStatus.value?.status === 'processing'
   })
 
+  const lastMessageId = () => {
+    const last = messages.value[messages.value.length - 1]
+    return last ? last.id : null
+  }
+
   // Actions
   const startSession = async (initialPrompt, provider = 'bedrock', config = {}) => {
     try {
@@ -59,55 +68,113 @@ export const useSessionPollingStore = defineStore('sessionPolling', () => {
       stopPolling()
     }
 
-    console.log('🔄 [POLLING] Starting polling for session:', sessionId)
     isPolling.value = true
+    const generation = ++pollGeneration
 
-    // Poll immediately
-    pollSession(sessionId)
+    if (typeof WebSocket !== 'undefined') {
+      startSocket(sessionId, generation)
+    } else {
+      startLongPolling(sessionId, generation)
+    }
+  }
+
+  const isFinished = (status) => status === 'completed' || status === 'error'
 
-    // Set up interval polling (every 1 second)
-    pollingInterval.value = setInterval(() => {
-      pollSession(sessionId)
-    }, 1000)
+  const appendMessages = (newMessages) => {
+    const lastId = lastMessageId()
+    const fresh = newMessages.filter((message) => lastId === null || message.id > lastId)
+    if (fresh.length > 0) {
+      messages.value = [...messages.value, ...fresh]
+      lastMessageCount.value = messages.value.length
+    }
   }
 
-  const pollSession = async (sessionId) => {
-    try {
-      // Poll for messages and status in parallel
-      const [messagesResponse, statusResponse] = await Promise.all([
-        api.sessions.getMessages(sessionId),
-        api.sessions.getStatus(sessionId),
-      ])
+  // One socket replaces the poll loop; if it drops before the session finishes we
+  // fall back to long-polling from the last message we have
+  const startSocket = (sessionId, generation) => {
+    console.log('🔌 [POLLING] Opening live socket for session:', sessionId)
+    const socket = api.sessions.openLiveSocket(sessionId, lastMessageId())
+    liveSocket = socket
+
+    socket.onmessage = (event) => {
+      if (generation !== pollGeneration || typeof event.data !== 'string') return
+      const data = JSON.parse(event.data)
+      if (data.type === 'message') {
+        appendMessages([data.message])
+      } else if (data.type === 'status') {
+        sessionStatus.value = { ...sessionStatus.value, id: sessionId, status: data.status }
+      }
+    }
+
+    socket.onclose = () => {
+      if (liveSocket === socket) liveSocket = null
+      if (generation !== pollGeneration) return
+      if (isFinished(sessionStatus.value?.status)) {
+        console.log('🏁 [POLLING] Session completed, closing live socket')
+        stopPolling()
+      } else {
+        console.log('⚠️ [POLLING] Live socket closed, falling back to long-polling')
+        startLongPolling(sessionId, generation)
+      }
+    }
+  }
 
-      // Update messages if there are new ones
-      if (messagesResponse.length > lastMessageCount.value) {
-        console.log(
-          `📨 [POLLING] Found ${messagesResponse.length - lastMessageCount.value} new messages`,
-        )
-        messages.value = messagesResponse
-        lastMessageCount.value = messagesResponse.length
+  const startLongPolling = (sessionId, generation) => {
+    console.log('🔄 [POLLING] Starting long-polling for session:', sessionId)
+
+    // Each request parks on the server until something changes, so loop back-to-back
+    const loop = async () => {
+      while (isPolling.value && generation === pollGeneration) {
+        const ok = await pollSession(sessionId, LONG_POLL_TIMEOUT_SECONDS, generation)
+        if (!ok) {
+          await new Promise((resolve) => setTimeout(resolve, POLL_ERROR_BACKOFF_MS))
+        }
+      }
+    }
+    loop()
+  }
+
+  const pollSession = async (sessionId, timeout = 0, generation = pollGeneration) => {
+    try {
+      const update = await api.sessions.waitForUpdates(
+        sessionId,
+        lastMessageId(),
+        sessionStatus.value?.status,
+        timeout,
+      )
+      if (generation !== pollGeneration) return true
+
+      // Append new messages if there are any
+      if (update.messages.length > 0) {
+        console.log(`📨 [POLLING] Found ${update.messages.length} new messages`)
+        appendMessages(update.messages)
       }
 
       // Update status
-      sessionStatus.value = statusResponse
+      if (update.status) {
+        sessionStatus.value = { ...sessionStatus.value, id: sessionId, status: update.status }
+      }
 
       // Check if session is completed
-      if (statusResponse.status === 'completed' || statusResponse.status === 'error') {
+      if (isFinished(update.status)) {
         console.log('🏁 [POLLING] Session completed, stopping polling')
         stopPolling()
       }
+      return true
     } catch (error) {
       console.error('❌ [POLLING] Error polling session:', error)
       // Don't stop polling on error, just log it
+      return false
     }
   }
 
   const stopPolling = () => {
-    if (pollingInterval.value) {
-      clearInterval(pollingInterval.value)
-      pollingInterval.value = null
-    }
+    pollGeneration++
     isPolling.value = false
+    if (liveSocket) {
+      liveSocket.close()
+      liveSocket = null
+    }
     console.log('🛑 [POLLING] Stopped polling')
   }
 
@@ -127,7 +194,7 @@ export const useSessionPollingStore = defineStore('sessionPolling', () => {
 
       const [session, sessionMessages, status] = await Promise.all([
         api.sessions.getById(sessionId),
-        api.sessions.getMessages(sessionId),
+        api.sessions.getAllMessages(sessionId),
         api.sessions.getStatus(sessionId),
       ])
 
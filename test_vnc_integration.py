@@ -38,10 +38,7 @@ async def test_vnc_services():
         
         # Test VNC interaction
         interaction_data = {
-            "action": "click",
-            "x": 100,
-            "y": 100,
-            "button": 1
+            "events": [{"type": "click", "x": 100, "y": 100, "button": 1}]
         }
         response = requests.post(f"{BASE_URL}/vnc/interact", json=interaction_data)
         print(f"✅ VNC Interaction: {response.status_code}")